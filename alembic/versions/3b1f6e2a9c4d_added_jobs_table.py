@@ -0,0 +1,58 @@
+"""Added jobs table for background processing
+
+Revision ID: 3b1f6e2a9c4d
+Revises: 0c795a3606e5
+Create Date: 2026-10-17 18:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b1f6e2a9c4d'
+down_revision: Union[str, Sequence[str], None] = '0c795a3606e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'jobs',
+        sa.Column('job_id', sa.String(length=36), nullable=False),
+        sa.Column('job_type', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('exam_id', sa.String(length=36), nullable=True),
+        sa.Column('params', sa.JSON(), nullable=False),
+        sa.Column('progress', sa.Float(), nullable=False),
+        sa.Column('message', sa.String(length=255), nullable=True),
+        sa.Column('result', sa.JSON(), nullable=True),
+        sa.Column('result_path', sa.String(length=500), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('cancel_requested', sa.Boolean(), nullable=False),
+        sa.Column('worker', sa.String(length=100), nullable=True),
+        sa.Column('created_by', sa.String(length=36), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.CheckConstraint(
+            "status IN ('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', 'CANCELLED')",
+            name='valid_job_status'
+        ),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('job_id')
+    )
+    op.create_index('idx_job_status', 'jobs', ['status'], unique=False)
+    op.create_index('idx_job_type_status', 'jobs', ['job_type', 'status'], unique=False)
+    op.create_index('idx_job_created_by', 'jobs', ['created_by'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_job_created_by', table_name='jobs')
+    op.drop_index('idx_job_type_status', table_name='jobs')
+    op.drop_index('idx_job_status', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,28 @@
+"""Added change log to pipeline checkpoints for incremental re-ranking
+
+Revision ID: 5d2f9b8c4e17
+Revises: 8e4a2c7d5b91
+Create Date: 2026-10-17 20:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f9b8c4e17'
+down_revision: Union[str, Sequence[str], None] = '8e4a2c7d5b91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pipeline_checkpoints', sa.Column('change_log', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('pipeline_checkpoints', 'change_log')
@@ -0,0 +1,39 @@
+"""Added pipeline checkpoints for resumable exam processing
+
+Revision ID: 8e4a2c7d5b91
+Revises: 3b1f6e2a9c4d
+Create Date: 2026-10-17 19:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4a2c7d5b91'
+down_revision: Union[str, Sequence[str], None] = '3b1f6e2a9c4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'pipeline_checkpoints',
+        sa.Column('exam_id', sa.String(length=36), nullable=False),
+        sa.Column('fingerprint', sa.String(length=64), nullable=False),
+        sa.Column('completed_stages', sa.JSON(), nullable=False),
+        sa.Column('timings', sa.JSON(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.ForeignKeyConstraint(['exam_id'], ['exams.exam_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('exam_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('pipeline_checkpoints')
@@ -16,6 +16,8 @@ from .user import router as user_router
 from .user_exam import router as user_exam_router
 from .auth import router as auth_router
 from .isal import router as isal_router
+from .job import router as job_router
+from .metrics import router as metrics_router
 
 __all__ = [
     "region_router",
@@ -35,4 +37,6 @@ __all__ = [
     "user_exam_router",
     "auth_router",
     "isal_router",
+    "job_router",
+    "metrics_router",
 ]
@@ -3,8 +3,9 @@ from fastapi import Depends, HTTPException, Query,APIRouter
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
-from app.services.attendance_service import generate_attendance_pdf
+from app.services.attendance_service import generate_attendance_bundle
 from typing import Optional
+import json
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -32,7 +33,7 @@ async def generate_attendance_pdf_endpoint(
     db: AsyncSession = Depends(get_db)
 ) -> FileResponse:
     try:
-        file_path = await generate_attendance_pdf(
+        file_path, timings = await generate_attendance_bundle(
             exam_id=exam_id,
             centre_number=centre_number,
             ward_name=ward_name,
@@ -48,7 +49,11 @@ async def generate_attendance_pdf_endpoint(
             db=db
         )
         logger.info(f"Generated file: {file_path}")
-        return FileResponse(file_path, media_type="application/pdf" if not zip_output else "application/zip")
+        return FileResponse(
+            file_path,
+            media_type="application/zip" if file_path.endswith(".zip") else "application/pdf",
+            headers={"X-Stage-Timings": json.dumps({stage: round(seconds, 3) for stage, seconds in timings.items()})}
+        )
     except HTTPException as e:
         logger.error(f"HTTP error: {e.detail}")
         raise e
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_current_user, get_db
+from app.db.models.user import User
+from app.db.schemas.job import JobCreate, Job
+from app.services.job_service import job_runner, get_job, get_jobs
+from typing import List, Optional
+from pathlib import Path
+import mimetypes
+import os
+import shutil
+import uuid
+import zipfile
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@router.post("/", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_job_endpoint(job: JobCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    Queue a background job and return it at once; poll ``GET /jobs/{job_id}`` for progress.
+
+    Job types: ``process_subjects``, ``exam_pipeline``, ``export_excel``,
+    ``export_excel_schools`` and ``attendance_pdf``; ``params`` are the query
+    parameters of the matching endpoint (``exam_pipeline`` takes ``exam_id``,
+    ``resume``, ``strategy`` and ``incremental``). PDF ingest is queued through
+    ``POST /jobs/pdf-ingest``. Jobs are visible only to the user who created
+    them and to admins.
+    """
+    return await job_runner.submit(db, job.job_type, job.params, user_id=current_user.id)
+
+@router.post("/pdf-ingest", response_model=Job, status_code=status.HTTP_202_ACCEPTED)
+async def create_pdf_ingest_job_endpoint(
+    exam_id: str = Query(...),
+    files: List[UploadFile] = File(..., description="School result PDFs or ZIP files of them"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Save uploaded PDFs (or the PDFs inside uploaded ZIPs) and queue their ingest as a job."""
+    upload_dir = Path("uploads/school") / str(uuid.uuid4())
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    saved = 0
+    try:
+        for file in files:
+            name = os.path.basename(file.filename or "")
+            if name.lower().endswith(".zip"):
+                with zipfile.ZipFile(file.file) as archive:
+                    for member in archive.infolist():
+                        member_name = os.path.basename(member.filename)
+                        if member.is_dir() or member.filename.startswith("__MACOSX") or not member_name.lower().endswith(".pdf"):
+                            continue
+                        with archive.open(member) as src, open(upload_dir / f"{saved:05d}_{member_name}", "wb") as dst:
+                            shutil.copyfileobj(src, dst)
+                        saved += 1
+            elif name.lower().endswith(".pdf"):
+                with open(upload_dir / f"{saved:05d}_{name}", "wb") as buffer:
+                    buffer.write(await file.read())
+                saved += 1
+            else:
+                raise HTTPException(status_code=400, detail=f"File {file.filename} must be a PDF or ZIP")
+        if not saved:
+            raise HTTPException(status_code=400, detail="No PDFs found in the upload")
+        return await job_runner.submit(
+            db, "pdf_ingest", {"exam_id": exam_id, "upload_dir": str(upload_dir)},
+            user_id=current_user.id, uploads=True
+        )
+    except zipfile.BadZipFile as e:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"Invalid ZIP file: {str(e)}")
+    except Exception:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        raise
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job_endpoint(job_id: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return await get_job(db, job_id, current_user)
+
+@router.get("/", response_model=List[Job])
+async def get_jobs_endpoint(
+    skip: int = 0,
+    limit: int = 100,
+    job_status: Optional[str] = Query(None, alias="status"),
+    job_type: Optional[str] = None,
+    exam_id: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return await get_jobs(db, skip, limit, job_status, job_type, exam_id, current_user)
+
+@router.get("/{job_id}/result")
+async def get_job_result_endpoint(job_id: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Download the file produced by a finished job."""
+    job = await get_job(db, job_id, current_user)
+    if job.status != "SUCCEEDED":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    if not job.result_path or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=404, detail="Job has no result file")
+    return FileResponse(
+        path=job.result_path,
+        media_type=mimetypes.guess_type(job.result_path)[0] or "application/octet-stream",
+        filename=os.path.basename(job.result_path)
+    )
+
+@router.post("/{job_id}/cancel", response_model=Job)
+async def cancel_job_endpoint(job_id: str, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return await job_runner.cancel(db, job_id, current_user)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Depends
+from app.api.deps import get_current_user
+from app.db.database import db_pools
+from app.db.models.user import User
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+@router.get("/db-pool")
+async def db_pool_metrics_endpoint(current_user: User = Depends(get_current_user)):
+    """Checkout latency and saturation of the shared database pools."""
+    return db_pools.metrics()
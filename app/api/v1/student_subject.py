@@ -7,11 +7,15 @@ from app.db.models.user import User
 from app.db.schemas.student_subject import StudentSubjectCreate, StudentSubject
 from app.services.student_subject_service import create_student_subject, get_student_subject, get_student_subjects
 from typing import List
+import asyncio
 import os
+import shutil
 from fastapi.responses import FileResponse
-from utils.excel.excel import export_to_excel,import_marks_from_excel_old
+from utils.excel.excel import export_to_excel,export_schools_to_zip,import_marks_from_excel,import_marks_from_workbooks
 from typing import List, Optional
 import uuid
+import json
+import zipfile
 from datetime import datetime
 from utils.processor.subjects import SubjectProcessor
 from app.core.config import Settings
@@ -100,6 +104,52 @@ async def export_excel_endpoint(
 
 
 
+@router.get("/export/excel/schools", response_description="ZIP with one Excel file per school")
+async def export_excel_schools_endpoint(
+    exam_id: str = Query(..., description="Required exam identifier"),
+    ward_name: str = Query("", description="Filter by ward name"),
+    council_name: str = Query("", description="Filter by council name"),
+    region_name: str = Query("", description="Filter by region name"),
+    school_type: str = Query("", description="Filter by school type"),
+    practical_mode: int = Query(0, description="Practical exam mode flag (0 or 1)"),
+    marks_filler: str = Query("", description="Placeholder for missing marks"),
+    centre_number_list: Optional[List[str]] = Query(None, description="List of centre numbers"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export one Excel entry workbook per matching school, bundled in a ZIP.
+
+    The ``X-Export-Stats`` header carries the workbook/row counts, stage
+    timings and the workbooks-per-second throughput.
+    """
+    try:
+        zip_path, stats = await export_schools_to_zip(
+            exam_id=exam_id,
+            ward_name=ward_name,
+            council_name=council_name,
+            region_name=region_name,
+            school_type=school_type,
+            practical_mode=practical_mode,
+            marks_filler=marks_filler,
+            centre_number_list=centre_number_list or []
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Export failed: {str(e)}"
+        )
+
+    return FileResponse(
+        path=zip_path,
+        media_type="application/zip",
+        filename=os.path.basename(zip_path),
+        headers={"X-Export-Stats": json.dumps({key: round(value, 3) for key, value in stats.items()})}
+    )
+
+
 @router.post("/import/marks", response_description="Import marks from Excel file")
 async def import_marks_endpoint(
     file: UploadFile = File(..., description="Excel file containing marks data"),
@@ -134,12 +184,13 @@ async def import_marks_endpoint(
             buffer.write(await file.read())
         
         # Call import function
-        updated_count = await import_marks_from_excel_old(file_path=save_path)
+        import_stats = await import_marks_from_excel(file_path=save_path)
         
         return JSONResponse(
             content={
                 "status": "success",
-                "updated_records": updated_count,
+                "updated_records": import_stats["updated"],
+                "rows_per_second": round(import_stats["rows_per_second"], 1),
                 "saved_path": save_path,
                 "message": "File saved for future reference"
             }
@@ -153,6 +204,105 @@ async def import_marks_endpoint(
 
 
 
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+def _save_bulk_uploads(files: List[UploadFile], upload_dir: str) -> List[str]:
+    saved = []
+    for file in files:
+        name = os.path.basename(file.filename or "")
+        if name.lower().endswith(".zip"):
+            zip_path = os.path.join(upload_dir, f"{len(saved):04d}_{name}")
+            with open(zip_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer, 1024 * 1024)
+            with zipfile.ZipFile(zip_path) as archive:
+                for member in archive.infolist():
+                    # Flatten member paths; skip folders and macOS resource forks
+                    member_name = os.path.basename(member.filename)
+                    if member.is_dir() or member.filename.startswith("__MACOSX") \
+                            or not member_name.lower().endswith(WORKBOOK_EXTENSIONS):
+                        continue
+                    save_path = os.path.join(upload_dir, f"{len(saved):04d}_{member_name}")
+                    with archive.open(member) as src, open(save_path, "wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    saved.append(save_path)
+        elif name.lower().endswith(WORKBOOK_EXTENSIONS):
+            save_path = os.path.join(upload_dir, f"{len(saved):04d}_{name}")
+            with open(save_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer, 1024 * 1024)
+            saved.append(save_path)
+    return saved
+
+
+async def save_bulk_uploads(files: List[UploadFile], upload_dir: str) -> List[str]:
+    """
+    Save uploaded workbooks, and the workbooks inside uploaded ZIPs, into ``upload_dir``.
+
+    Uploads are copied from their spooled temporary files in chunks and ZIPs
+    are extracted in a worker thread, so large archives neither sit in memory
+    nor block the event loop.
+    """
+    return await asyncio.to_thread(_save_bulk_uploads, files, upload_dir)
+
+
+@router.post("/import/marks/bulk", response_description="Import marks from many Excel files")
+async def import_marks_bulk_endpoint(
+    files: List[UploadFile] = File(..., description="Entry workbooks (.xlsx/.xlsm) or ZIP files of them"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import marks from many returned workbooks in one request.
+    Files are saved in: data/imports/marks/YEAR/MONTH/batch_TIMESTAMP_ID/
+
+    Workbooks are parsed in parallel worker processes and written with one
+    combined update. Marks sent with different values by several files are
+    not written and are listed under ``conflicts``.
+
+    Returns:
+    - JSON response with the count of updated records and a validation result per file
+    """
+    today = datetime.now()
+    upload_dir = os.path.join(
+        UPLOAD_BASE_DIR,
+        str(today.year),
+        f"{today.month:02d}",
+        f"batch_{today.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    )
+    os.makedirs(upload_dir, exist_ok=True)
+
+    try:
+        file_paths = await save_bulk_uploads(files, upload_dir)
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ZIP file: {str(e)}")
+    if not file_paths:
+        raise HTTPException(status_code=400, detail="No .xlsx or .xlsm workbooks found in the upload")
+
+    try:
+        import_stats = await import_marks_from_workbooks(file_paths)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Import failed: {str(e)}"
+        )
+
+    return JSONResponse(
+        content={
+            "status": "success",
+            "exam_id": import_stats["exam_id"],
+            "updated_records": import_stats["updated"],
+            "rows_read": import_stats["rows_read"],
+            "rows_matched": import_stats["rows_matched"],
+            "rows_per_second": round(import_stats["rows_per_second"], 1),
+            "files": import_stats["files"],
+            "conflicts": import_stats["conflicts"],
+            "saved_dir": upload_dir
+        }
+    )
+
+
 @router.post("/process/subject/{exam_id}")
 async def process_subject_endpoint(exam_id: str) -> dict:
     """Process subject data for given exam ID using SubjectProcessor"""
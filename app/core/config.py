@@ -28,6 +28,24 @@ class Settings(BaseSettings):
     DB_USER: str = Field(..., env="DB_USER")
     DB_PASSWORD: str = Field(..., env="DB_PASSWORD")
     DB_NAME: str = Field(..., env="DB_NAME")
+
+    # Connection pool settings, shared by the ORM engine and the raw aiomysql pool
+    DB_POOL_MIN_SIZE: int = Field(1, env="DB_POOL_MIN_SIZE")
+    DB_POOL_MAX_SIZE: int = Field(20, env="DB_POOL_MAX_SIZE")
+    DB_POOL_RECYCLE: int = Field(3600, env="DB_POOL_RECYCLE")
+
+    # Seconds before the cached region/council/ward gazetteer is reloaded
+    LOCATION_CACHE_TTL: int = Field(300, env="LOCATION_CACHE_TTL")
+
+    # Background jobs: jobs running at once across all types, and seconds between cancel/progress checks
+    JOB_MAX_WORKERS: int = Field(2, env="JOB_MAX_WORKERS")
+    JOB_POLL_INTERVAL: float = Field(2.0, env="JOB_POLL_INTERVAL")
+
+    # Local Arrow files caching each exam's students, marks and schools for the processors
+    SNAPSHOT_CACHE_DIR: str = Field("cache/exam_snapshots", env="SNAPSHOT_CACHE_DIR")
+
+    # Worker processes shared by PDF rendering/parsing and workbook exports/imports (capped at the CPU count)
+    PROCESS_POOL_WORKERS: int = Field(4, env="PROCESS_POOL_WORKERS")
     
     # Construct DATABASE_URL with URL-encoded password
     @property
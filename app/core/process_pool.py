@@ -0,0 +1,37 @@
+# app.core.process_pool.py
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by the CPU-bound workers: attendance PDF rendering,
+    PDF parsing, batch workbook exports and bulk marks imports.
+
+    Created on first use with ``PROCESS_POOL_WORKERS`` processes (at most one
+    per CPU), so each API process holds one pool whichever features run. The
+    app shuts it down in its lifespan; scripts rely on the interpreter exit.
+    """
+    global _pool
+    if _pool is None:
+        max_workers = max(min(settings.PROCESS_POOL_WORKERS, os.cpu_count() or 1), 1)
+        _pool = ProcessPoolExecutor(max_workers=max_workers)
+        logger.info(f"Started process pool with {max_workers} workers")
+    return _pool
+
+
+def shutdown_process_pool():
+    """Stop the shared pool, dropping work not yet started; a later call to ``get_process_pool`` starts a new one."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        pool.shutdown(wait=True, cancel_futures=True)
+        logger.info("Stopped process pool")
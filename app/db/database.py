@@ -1,18 +1,227 @@
 # app.db.database.py
 
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import asyncio
+import logging
+import time
+import aiomysql
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from app.db.base import Base
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 # ECHO TRUE OR FALSE
-async_engine = create_async_engine(settings.DATABASE_URL, echo=False)
+async_engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=False,
+    pool_size=settings.DB_POOL_MAX_SIZE,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+)
 AsyncSessionLocal = async_sessionmaker(
     bind=async_engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+
+class PoolLease:
+    """
+    ``aiomysql.Pool``-like view of the registry for code that passes a pool around.
+
+    ``acquire()`` borrows from the shared pool with a fixed autocommit mode;
+    leaving ``async with`` does not close the shared pool.
+    """
+
+    def __init__(self, registry: "PoolRegistry", autocommit: bool = False):
+        self._registry = registry
+        self.autocommit = autocommit
+
+    def acquire(self):
+        return self._registry.acquire(self.autocommit)
+
+    async def __aenter__(self) -> "PoolLease":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class PoolRegistry:
+    """
+    Process-wide database pools: one raw aiomysql pool plus the ORM ``async_engine``.
+
+    The app opens the pool in its lifespan and closes it on shutdown. Scripts
+    and processors used outside the app get the pool created lazily on first
+    use. Because aiomysql pools are bound to their event loop, the pool is
+    rebuilt when it is used from a new loop (e.g. successive ``asyncio.run``).
+
+    Every checkout made through ``acquire``/``checkout`` is timed, so
+    ``metrics()`` reports checkout latency and pool saturation.
+    """
+
+    def __init__(self, engine: AsyncEngine, minsize: int, maxsize: int, pool_recycle: int):
+        self.engine = engine
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.pool_recycle = pool_recycle
+        self._pool: Optional[aiomysql.Pool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Lock guarding pool creation, paired with the event loop it belongs to
+        self._loop_lock: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Lock]] = None
+        # Connections currently checked out, with the pool each one came from
+        self._checked_out: Dict[aiomysql.Connection, aiomysql.Pool] = {}
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._checkouts = 0
+        self._peak_in_use = 0
+        self._saturated_checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _usable(self, loop: asyncio.AbstractEventLoop) -> bool:
+        return self._pool is not None and self._loop is loop and not self._pool.closed
+
+    async def get_pool(self) -> aiomysql.Pool:
+        """Return the shared aiomysql pool, creating it on first use in this event loop."""
+        loop = asyncio.get_running_loop()
+        if self._usable(loop):
+            return self._pool
+        # Bound to the loop before the first await, so concurrent first callers share one lock
+        if self._loop_lock is None or self._loop_lock[0] is not loop:
+            self._loop_lock = (loop, asyncio.Lock())
+        async with self._loop_lock[1]:
+            if self._usable(loop):
+                return self._pool
+            if self._pool is not None:
+                # Left over from a previous event loop; its connections cannot be reused here
+                logger.warning("Discarding database pool bound to another event loop")
+                stale, self._pool = self._pool, None
+                stale.terminate()
+                self._checked_out = {conn: pool for conn, pool in self._checked_out.items() if pool is not stale}
+            pool = await aiomysql.create_pool(
+                host=settings.DB_HOST,
+                port=settings.DB_PORT,
+                user=settings.DB_USER,
+                password=settings.DB_PASSWORD,
+                db=settings.DB_NAME,
+                minsize=self.minsize,
+                maxsize=self.maxsize,
+                pool_recycle=self.pool_recycle,
+                charset='utf8mb4',
+            )
+            self._pool, self._loop = pool, loop
+            self._reset_stats()
+            logger.info(f"Opened database pool (minsize={self.minsize}, maxsize={self.maxsize}, recycle={self.pool_recycle}s)")
+            return self._pool
+
+    async def checkout(self, autocommit: bool = False) -> aiomysql.Connection:
+        """
+        Borrow a connection; hand it back with ``release``.
+
+        ``autocommit`` is applied on every checkout since connections are
+        shared between callers that expect different modes.
+        """
+        pool = await self.get_pool()
+        saturated = pool.freesize == 0 and pool.size >= pool.maxsize
+        start_time = time.perf_counter()
+        conn = await pool.acquire()
+        wait = time.perf_counter() - start_time
+
+        self._checked_out[conn] = pool
+        self._checkouts += 1
+        self._peak_in_use = max(self._peak_in_use, len(self._checked_out))
+        self._saturated_checkouts += saturated
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+        if saturated:
+            logger.debug(f"Database pool saturated, waited {wait * 1000:.1f} ms for a connection")
+
+        try:
+            if conn.get_autocommit() != autocommit:
+                await conn.autocommit(autocommit)
+        except Exception:
+            await self.release(conn)
+            raise
+        return conn
+
+    async def release(self, conn: aiomysql.Connection):
+        """Return a connection taken with ``checkout``, rolling back anything left uncommitted."""
+        pool = self._checked_out.pop(conn, None)
+        if pool is None:
+            # Borrowed from a pool that has since been replaced
+            conn.close()
+            return
+        if not conn.closed and conn.get_transaction_status():
+            # aiomysql would close a connection returned mid-transaction (even after a plain
+            # SELECT with autocommit off); rolling back keeps it reusable with the same outcome
+            try:
+                await conn.rollback()
+            except Exception:
+                conn.close()
+        await pool.release(conn)
+
+    @asynccontextmanager
+    async def acquire(self, autocommit: bool = False) -> AsyncIterator[aiomysql.Connection]:
+        """Borrow a connection for the duration of an ``async with`` block."""
+        conn = await self.checkout(autocommit)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    def lease(self, autocommit: bool = False) -> PoolLease:
+        """Pool-like handle whose ``acquire()`` borrows from the shared pool."""
+        return PoolLease(self, autocommit)
+
+    async def close(self):
+        """Close the raw pool and dispose of the engine's connections."""
+        if self._pool is not None:
+            # Detached first so no new checkout reaches the closing pool; leases still out release into it
+            pool, self._pool = self._pool, None
+            pool.close()
+            await pool.wait_closed()
+            logger.info("Closed database pool")
+        await self.engine.dispose()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Checkout latency and saturation of the raw pool, plus the engine pool's state."""
+        pool = self._pool
+        engine_pool = self.engine.pool
+        return {
+            'raw_pool': {
+                'open': pool is not None,
+                'minsize': self.minsize,
+                'maxsize': self.maxsize,
+                'size': pool.size if pool else 0,
+                'free': pool.freesize if pool else 0,
+                'in_use': len(self._checked_out),
+                'peak_in_use': self._peak_in_use,
+                'saturation': len(self._checked_out) / self.maxsize if self.maxsize else 0.0,
+                'checkouts': self._checkouts,
+                'saturated_checkouts': self._saturated_checkouts,
+                'checkout_wait_avg_ms': self._wait_total / self._checkouts * 1000 if self._checkouts else 0.0,
+                'checkout_wait_max_ms': self._wait_max * 1000,
+            },
+            'engine_pool': {
+                'size': engine_pool.size() if hasattr(engine_pool, 'size') else None,
+                'checked_out': engine_pool.checkedout() if hasattr(engine_pool, 'checkedout') else None,
+                'overflow': engine_pool.overflow() if hasattr(engine_pool, 'overflow') else None,
+                'status': engine_pool.status(),
+            },
+        }
+
+
+db_pools = PoolRegistry(
+    async_engine,
+    minsize=settings.DB_POOL_MIN_SIZE,
+    maxsize=settings.DB_POOL_MAX_SIZE,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+)
+
 async def get_db() -> AsyncSession:
     async with AsyncSessionLocal() as session:
         yield session
@@ -15,6 +15,8 @@ from .user_exam import UserExam
 from .region import Region
 from .ward import Ward
 from .council import Council
+from .job import Job
+from .pipeline_checkpoint import PipelineCheckpoint
 
 __all__ = [
     "School",
@@ -31,5 +33,7 @@ __all__ = [
     "UserExam",
     "Region",
     "Council",
-    "Ward"
+    "Ward",
+    "Job",
+    "PipelineCheckpoint"
 ]
\ No newline at end of file
@@ -0,0 +1,32 @@
+from sqlalchemy import Column, String, Float, ForeignKey, Boolean, DateTime, Text, JSON, Index, CheckConstraint, text
+from app.db.database import Base
+from uuid6 import uuid6
+
+class Job(Base):
+    __tablename__ = "jobs"
+    job_id = Column(String(36), primary_key=True, default=lambda: str(uuid6()))
+    job_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="QUEUED")
+    exam_id = Column(String(36), nullable=True)  # Not a foreign key: jobs outlive the exams they touched
+    params = Column(JSON, nullable=False, default=dict)
+    progress = Column(Float, nullable=False, default=0.0)  # Fraction done, 0.0 - 1.0
+    message = Column(String(255))
+    result = Column(JSON)
+    result_path = Column(String(500))
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker = Column(String(100))  # host:pid of the API process running the job
+    created_by = Column(String(36), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', 'CANCELLED')",
+            name="valid_job_status"
+        ),
+        Index("idx_job_status", "status"),
+        Index("idx_job_type_status", "job_type", "status"),
+        Index("idx_job_created_by", "created_by"),
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String, ForeignKey, DateTime, Text, JSON, text
+from app.db.database import Base
+
+class PipelineCheckpoint(Base):
+    __tablename__ = "pipeline_checkpoints"
+    exam_id = Column(String(36), ForeignKey("exams.exam_id", ondelete="CASCADE"), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)  # Hash of the input snapshot the stages were computed from
+    completed_stages = Column(JSON, nullable=False, default=list)
+    timings = Column(JSON)
+    change_log = Column(JSON)  # Per-centre input hashes and locations of the last successful run
+    status = Column(String(20), nullable=False, default="RUNNING")
+    error = Column(Text)
+    updated_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'), onupdate=text('CURRENT_TIMESTAMP'))
@@ -14,6 +14,7 @@ from .result import Result, ResultCreate
 from .student_subject import StudentSubject, StudentSubjectCreate
 from .user import User, UserCreate
 from .user_exam import UserExam, UserExamCreate
+from .job import Job, JobCreate
 
 __all__ = [
     "Region", "RegionCreate",
@@ -31,4 +32,5 @@ __all__ = [
     "StudentSubject", "StudentSubjectCreate",
     "User", "UserCreate",
     "UserExam", "UserExamCreate",
+    "Job", "JobCreate",
 ]
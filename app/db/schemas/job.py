@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, ConfigDict
+
+class JobCreate(BaseModel):
+    job_type: str
+    params: Dict[str, Any] = {}
+
+class Job(BaseModel):
+    job_id: str
+    job_type: str
+    status: str
+    exam_id: Optional[str] = None
+    params: Dict[str, Any]
+    progress: float
+    message: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    result_path: Optional[str] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    created_by: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
@@ -6,15 +6,23 @@ from app.api.v1 import (
     examination_board_router, exam_router, exam_division_router,
     exam_grade_router, exam_subject_router, subject_router,
     student_router, result_router, student_subject_router,
-    user_router, user_exam_router, auth_router,isal_router
+    user_router, user_exam_router, auth_router,isal_router,
+    job_router, metrics_router
 )
 from app.core.config import settings
-from app.db.database import init_db
+from app.core.process_pool import shutdown_process_pool
+from app.db.database import init_db, db_pools
+from app.services.job_service import job_runner
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await db_pools.get_pool()
+    await job_runner.start()
     yield
+    await job_runner.shutdown()
+    shutdown_process_pool()
+    await db_pools.close()
 
 app = FastAPI(
     title="Exametrics API",
@@ -50,6 +58,8 @@ app.include_router(user_router, prefix="/api/v1")
 app.include_router(user_exam_router, prefix="/api/v1")
 app.include_router(auth_router, prefix="/api/v1")
 app.include_router(isal_router,prefix="/api/v1")
+app.include_router(job_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
 
 # if __name__ == "__main__":
 #     import uvicorn
@@ -1,18 +1,21 @@
 
 import asyncio
+import concurrent.futures
 import os
 import shutil
 import logging
-from typing import Dict, List, Tuple, Optional
+import time
+from typing import AsyncIterator, Dict, List, Tuple, Optional
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from sqlalchemy.sql import and_
-from zipfile import ZipFile
+from zipfile import ZipFile, ZIP_DEFLATED
 from pathlib import Path
 from datetime import datetime
 from app.db.models import School, StudentSubject, Exam, ExamSubject, Student
-from utils.pdf.isal import AsyncAttendancePDFGenerator
+from app.core.process_pool import get_process_pool
+from utils.pdf.isal import build_school_info, render_attendance_pdf
 from uuid import uuid4
 
 logging.basicConfig(level=logging.INFO)
@@ -21,7 +24,64 @@ logger = logging.getLogger(__name__)
 UPLOAD_DIR = Path("uploads/download")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
-async def generate_attendance_pdf(
+# Centres rendering or waiting for a worker at once; bounds memory while the row stream keeps going
+MAX_PENDING_RENDERS = 16
+
+
+async def stream_centre_subjects(
+    db: AsyncSession,
+    exam_id: str,
+    centre_numbers: List[str],
+    batch_size: int = 5000
+) -> AsyncIterator[Tuple[str, Dict[str, List[Tuple[str, str, str]]], int]]:
+    """
+    Stream every (centre, subject, student) row of the exam for the given centres
+    in one query and yield ``(centre_number, subjects_data, skipped_rows)`` per centre.
+
+    Rows come ordered by centre, so a centre is complete as soon as the next one starts.
+    """
+    query = (
+        select(
+            StudentSubject.centre_number,
+            StudentSubject.subject_code,
+            ExamSubject.subject_name,
+            Student.student_id,
+            Student.full_name,
+            Student.sex
+        )
+        .join(Student, Student.student_global_id == StudentSubject.student_global_id)
+        .join(ExamSubject, and_(
+            ExamSubject.exam_id == StudentSubject.exam_id,
+            ExamSubject.subject_code == StudentSubject.subject_code
+        ))
+        .filter(
+            StudentSubject.exam_id == exam_id,
+            StudentSubject.centre_number.in_(centre_numbers)
+        )
+        .order_by(StudentSubject.centre_number, StudentSubject.subject_code, Student.student_id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    current_centre = None
+    subjects_data: Dict[str, List[Tuple[str, str, str]]] = {}
+    skipped = 0
+    result = await db.stream(query)
+    async for rows in result.partitions(batch_size):
+        for row in rows:
+            if row.centre_number != current_centre:
+                if current_centre is not None:
+                    yield current_centre, subjects_data, skipped
+                current_centre, subjects_data, skipped = row.centre_number, {}, 0
+            if not row.full_name or not row.sex:
+                skipped += 1
+                continue
+            subject_key = f"{row.subject_code} - {row.subject_name.upper()}"
+            subjects_data.setdefault(subject_key, []).append((row.student_id, row.full_name, row.sex))
+    if current_centre is not None:
+        yield current_centre, subjects_data, skipped
+
+
+async def generate_attendance_bundle(
     exam_id: str,
     centre_number: Optional[str] = None,
     ward_name: Optional[str] = None,
@@ -35,7 +95,23 @@ async def generate_attendance_pdf(
     exam_board: Optional[str] = None,
     report_name: Optional[str] = "INDIVIDUAL ATTENDANCE LIST",
     db: AsyncSession = None
-) -> str:
+) -> Tuple[str, Dict[str, float]]:
+    """
+    Generate attendance PDFs for every matching school.
+
+    Student rows for all schools are read with one streamed query and grouped
+    per centre in memory. Each centre is rendered on the shared process pool as
+    soon as its rows are complete, and finished PDFs are added to the ZIP as
+    they arrive. On failure the PDFs and the partial ZIP are removed.
+
+    Returns:
+        Path of the PDF (only one produced, no ``zip_output``) or ZIP, and the
+        per-stage timings in seconds. ``render`` and ``zip`` are cumulative
+        across PDFs and overlap with ``fetch``; ``total`` is wall time.
+    """
+    start_time = time.perf_counter()
+    timings = {"lookup": 0.0, "fetch": 0.0, "render": 0.0, "zip": 0.0, "total": 0.0}
+
     # Fetch exam details
     exam = (await db.execute(select(Exam).filter(Exam.exam_id == exam_id))).scalars().first()
     if not exam:
@@ -57,100 +133,137 @@ async def generate_attendance_pdf(
     if region_name:
         school_query = school_query.filter(School.region_name == region_name)
 
-    schools = (await db.execute(school_query)).scalars().all()
+    schools = {school.centre_number: school for school in (await db.execute(school_query)).scalars().all()}
     if not schools:
         logger.error("No schools found for the given criteria")
         raise HTTPException(status_code=404, detail="No schools found")
+    timings["lookup"] = time.perf_counter() - start_time
+    logger.info(f"Found {len(schools)} schools in {timings['lookup']:.2f} seconds")
 
-    # Fetch subjects for the exam
-    subjects = (await db.execute(
-        select(ExamSubject).filter(ExamSubject.exam_id == exam_id)
-    )).scalars().all()
-
-    if not subjects:
-        logger.error(f"No subjects found for exam: {exam_id}")
-        raise HTTPException(status_code=404, detail="No subjects found")
-
-    # Initialize PDF generator
-    pdf_generator = AsyncAttendancePDFGenerator()
-
-    # Prepare output
-    output_files = []
-    for school in schools:
-        logger.info(f"Processing school: {school.centre_number} - {school.school_name}")
-        subjects_data: Dict[str, List[Tuple[str, str, str]]] = {}
-
-        # Fetch student subjects with INNER JOIN to ensure valid student records
-        for subject in subjects:
-            subject_key = f"{subject.subject_code} - {subject.subject_name}"
-            query = (
-                select(StudentSubject, Student)
-                .join(Student, Student.student_global_id == StudentSubject.student_global_id)
-                .filter(
-                    and_(
-                        StudentSubject.exam_id == exam_id,
-                        StudentSubject.centre_number == school.centre_number,
-                        StudentSubject.subject_code == subject.subject_code
-                    )
-                )
-            )
+    render_pool = get_process_pool()
+    pending = set()
+    renders: List[concurrent.futures.Future] = []
+    queued_files: List[Path] = []
+    slots = asyncio.Semaphore(MAX_PENDING_RENDERS)
+    output_files: List[Path] = []
+    zip_path = UPLOAD_DIR / f"attendance_{uuid4()}.zip"
+    # Opened once a second PDF finishes (or at the first with zip_output); a single PDF is returned as is
+    zip_file: Optional[ZipFile] = None
+    zip_lock = asyncio.Lock()
+    board = exam_board or exam.exam_name or "Unknown"
 
-            result = (await db.execute(query)).all()
-            subject_entries = []
-            for student_subject, student in result:
-                if not student.full_name or not student.sex:
-                    logger.warning(f"Invalid student data for {student.student_global_id}: full_name={student.full_name}, sex={student.sex}")
-                    continue
-                subject_entries.append((student.student_global_id, student.full_name, student.sex))
-            
-            subjects_data[subject_key] = subject_entries
-            logger.info(f"Subject {subject_key}: {len(subject_entries)} students")
-
-        if not subjects_data:
-            logger.warning(f"No valid data for school {school.centre_number}")
-            continue
-
-        # Generate PDF
+    async def collect(render: asyncio.Future):
+        nonlocal zip_file
         try:
-            school_info = {
-                "school_name": school.school_name,
-                "centre_number": school.centre_number,
-                "region_name": school.region_name,
-                "council_name": school.council_name,
-                "ward_name": school.ward_name,
-                "exam_year": exam_year,
-                "exam_level": exam_level,
-                "ministry": ministry,
-                "exam_board": exam_board or "Unknown",
-                "report_name": report_name
-            }
-            output_path = UPLOAD_DIR / f"{school.centre_number}_{uuid4()}.pdf"
-            await pdf_generator.generate_pdf_with_naming(
-                subjects_data=subjects_data,
-                school_info=school_info,
-                output_path=output_path,
-                include_score=include_score,
-                underscore_mode=underscore_mode,
-                separate_every=separate_every
+            pdf_path, render_seconds = await render
+        finally:
+            slots.release()
+        timings["render"] += render_seconds
+        pdf_path = Path(pdf_path)
+        async with zip_lock:
+            output_files.append(pdf_path)
+            if zip_file is None and (zip_output or len(output_files) > 1):
+                zip_file = ZipFile(zip_path, 'w', ZIP_DEFLATED)
+                to_zip = list(output_files)
+            else:
+                to_zip = [pdf_path] if zip_file is not None else []
+            for path in to_zip:
+                zip_start = time.perf_counter()
+                await asyncio.to_thread(zip_file.write, path, path.name)
+                timings["zip"] += time.perf_counter() - zip_start
+                path.unlink()  # Remove individual PDFs
+
+    try:
+        fetch_start = time.perf_counter()
+        fetch_wait = 0.0
+        async for centre, subjects_data, skipped in stream_centre_subjects(db, exam_id, list(schools)):
+            fetch_wait += time.perf_counter() - fetch_start
+            if skipped:
+                logger.warning(f"Skipped {skipped} student rows without full_name/sex for school {centre}")
+            school = schools[centre]
+            school_info = build_school_info(
+                ministry, board, centre, school.school_name or "",
+                school.council_name or "", school.region_name or "", report_name
+            )
+            output_path = UPLOAD_DIR / f"{centre}_{uuid4()}.pdf"
+
+            await slots.acquire()
+            render = render_pool.submit(
+                render_attendance_pdf, str(output_path), school_info,
+                subjects_data, include_score, underscore_mode, separate_every
             )
-            output_files.append(output_path)
-            logger.info(f"Generated PDF for {school.centre_number}: {output_path}")
-        except AttributeError as e:
-            logger.error(f"Failed to generate PDF for {school.centre_number}: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"PDF generation error: {str(e)}")
+            renders.append(render)
+            queued_files.append(output_path)
+            task = asyncio.ensure_future(collect(asyncio.wrap_future(render)))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            logger.info(f"Queued school {centre}: {len(subjects_data)} subjects")
+            fetch_start = time.perf_counter()
+        timings["fetch"] = fetch_wait
+
+        if pending:
+            await asyncio.gather(*pending)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        # Renders already running cannot be cancelled; let them finish so their files can be removed
+        for render in renders:
+            render.cancel()
+        await asyncio.to_thread(concurrent.futures.wait, renders)
+        if zip_file is not None:
+            zip_file.close()
+        for path in queued_files + [zip_path]:
+            path.unlink(missing_ok=True)
+        raise
+    if zip_file is not None:
+        zip_file.close()
 
     if not output_files:
         logger.error("No PDFs generated")
         raise HTTPException(status_code=500, detail="No PDFs generated")
 
-    # Handle single or multiple outputs
-    if len(output_files) == 1 and not zip_output:
-        return str(output_files[0])
+    if zip_file is None:
+        result_path = str(output_files[0])
+    else:
+        result_path = str(zip_path)
+        logger.info(f"Generated ZIP: {zip_path}")
 
-    zip_path = UPLOAD_DIR / f"attendance_{uuid4()}.zip"
-    with ZipFile(zip_path, 'w') as zip_file:
-        for file in output_files:
-            zip_file.write(file, file.name)
-            file.unlink()  # Remove individual PDFs
-    logger.info(f"Generated ZIP: {zip_path}")
-    return str(zip_path)
+    timings["total"] = time.perf_counter() - start_time
+    logger.info(
+        f"Attendance PDFs for {len(output_files)} schools: "
+        + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items())
+    )
+    return result_path, timings
+
+
+async def generate_attendance_pdf(
+    exam_id: str,
+    centre_number: Optional[str] = None,
+    ward_name: Optional[str] = None,
+    council_name: Optional[str] = None,
+    region_name: Optional[str] = None,
+    include_score: bool = True,
+    underscore_mode: bool = True,
+    separate_every: int = 10,
+    zip_output: bool = False,
+    ministry: Optional[str] = "PRESIDENT'S OFFICE, REGIONAL ADMINISTRATION AND LOCAL GOVERNMENTS",
+    exam_board: Optional[str] = None,
+    report_name: Optional[str] = "INDIVIDUAL ATTENDANCE LIST",
+    db: AsyncSession = None
+) -> str:
+    path, _ = await generate_attendance_bundle(
+        exam_id=exam_id,
+        centre_number=centre_number,
+        ward_name=ward_name,
+        council_name=council_name,
+        region_name=region_name,
+        include_score=include_score,
+        underscore_mode=underscore_mode,
+        separate_every=separate_every,
+        zip_output=zip_output,
+        ministry=ministry,
+        exam_board=exam_board,
+        report_name=report_name,
+        db=db
+    )
+    return path
@@ -4,6 +4,7 @@ from sqlalchemy.future import select
 from fastapi import HTTPException, status
 from app.db.models.council import Council as CouncilModel
 from app.db.schemas.council import CouncilCreate, Council
+from app.services.location_service import location_cache
 from uuid6 import uuid6
 
 async def create_council(db: AsyncSession, council: CouncilCreate) -> Council:
@@ -18,6 +19,7 @@ async def create_council(db: AsyncSession, council: CouncilCreate) -> Council:
     db_council = CouncilModel(**council_data)
     db.add(db_council)
     await db.commit()
+    location_cache.invalidate()
     await db.refresh(db_council)
     return Council.model_validate(db_council)
 
@@ -0,0 +1,511 @@
+import asyncio
+import inspect
+import logging
+import math
+import os
+import shutil
+import socket
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import Settings, settings
+from app.db.database import AsyncSessionLocal
+from app.db.models.job import Job as JobModel
+from app.db.models.user import User
+from app.db.schemas.job import Job
+from app.services.attendance_service import generate_attendance_bundle
+from app.services.school_service import process_batch_pdf_data
+from utils.excel.excel import export_to_excel, export_schools_to_zip
+from utils.processor.pipeline import ExamPipeline
+from utils.processor.subjects import SubjectProcessor
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("QUEUED", "RUNNING")
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED", "CANCELLED")
+
+# Identifies the API process that owns a job, so other processes leave it alone
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Role allowed to see and cancel every user's jobs
+ADMIN_ROLE = "ADMIN"
+
+JobResult = Tuple[Dict[str, Any], Optional[str]]
+
+
+class JobType(NamedTuple):
+    name: str
+    handler: Callable[..., Awaitable[JobResult]]
+    concurrency: int
+    uploads: bool  # Takes server-side upload paths, so only an upload endpoint may submit it
+    interruptible: bool  # Only awaits I/O and pool work, so it may be cancelled at any await
+
+
+class JobCancelled(asyncio.CancelledError):
+    """Raised inside a job at its next stage boundary once cancellation was requested."""
+
+
+def json_safe(value: Any) -> Any:
+    """Make handler results storable in a JSON column: numpy scalars to Python, NaN to None."""
+    if isinstance(value, dict):
+        return {str(key): json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if hasattr(value, "item") and callable(value.item):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _worker_alive(worker: Optional[str]) -> bool:
+    """
+    Whether the API process ``host:pid`` that owns a job is still running (unknown hosts count as alive).
+
+    Not meaningful for ``WORKER_ID`` itself, which always looks alive.
+    """
+    if not worker:
+        return False
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+class JobContext:
+    """
+    Handed to a job handler to report progress; the runner persists it every poll interval.
+
+    Handlers report progress at their stage boundaries, which is also where a
+    cancelled job stops: ``progress`` raises ``JobCancelled`` once
+    cancellation was requested.
+    """
+
+    def __init__(self, job_id: str, job_type: str):
+        self.job_id = job_id
+        self.job_type = job_type
+        self.fraction = 0.0
+        self.message: Optional[str] = None
+        self.dirty = False
+        self.started = False
+        self.cancel_requested = False
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.job_id} cancelled")
+
+    def progress(self, fraction: float, message: Optional[str] = None):
+        self.fraction = min(max(fraction, 0.0), 1.0)
+        if message is not None:
+            self.message = message[:255]
+        self.dirty = True
+        self.check_cancelled()
+
+
+class JobRunner:
+    """
+    In-process background job runner backed by the ``jobs`` table.
+
+    Jobs run as asyncio tasks of the API process that accepted them. At most
+    ``max_workers`` run at once overall and at most ``concurrency`` per job
+    type; the rest wait as QUEUED. Each job uses its own database session,
+    so it keeps running after the submitting client disconnects. Handlers
+    keep their CPU-bound stages in worker threads or the shared process pool,
+    so running jobs do not hold up API requests on the event loop.
+
+    A watcher task flushes progress and picks up cancellation requests every
+    ``poll_interval`` seconds, so a job can be cancelled from any API process.
+    Cancellation is cooperative: a queued job or an ``interruptible`` one is
+    cancelled at once, any other stops at its next stage boundary (its next
+    ``ctx.progress`` call), so work already running in a thread is never
+    abandoned while it still holds a slot.
+    Jobs left QUEUED or RUNNING by a process that has stopped are marked
+    FAILED when the next process on the same host starts.
+    """
+
+    def __init__(self, max_workers: int, poll_interval: float):
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.job_types: Dict[str, JobType] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._type_slots: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._contexts: Dict[str, JobContext] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def register(self, name: str, concurrency: int = 1, uploads: bool = False, interruptible: bool = False):
+        """Decorator adding ``async def handler(ctx, **params) -> (result, result_path)`` as a job type."""
+        def decorator(handler):
+            self.job_types[name] = JobType(name, handler, concurrency, uploads, interruptible)
+            return handler
+        return decorator
+
+    async def start(self):
+        """
+        Fail jobs orphaned by stopped processes on this host and start the watcher.
+
+        This process has not submitted anything yet, so active jobs carrying its
+        own ``WORKER_ID`` were left by an earlier process that had the same pid
+        (e.g. PID 1 of a restarted container) and are orphaned too.
+        """
+        self._stopping = False
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._type_slots = {name: asyncio.Semaphore(job_type.concurrency) for name, job_type in self.job_types.items()}
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(JobModel.job_id, JobModel.worker).filter(JobModel.status.in_(ACTIVE_STATUSES))
+            )).all()
+            orphaned = [row.job_id for row in rows if row.worker == WORKER_ID or not _worker_alive(row.worker)]
+            if orphaned:
+                await db.execute(
+                    update(JobModel).where(JobModel.job_id.in_(orphaned)).values(
+                        status="FAILED", error="Interrupted: the API process running this job stopped",
+                        finished_at=datetime.now()
+                    )
+                )
+                await db.commit()
+                logger.warning(f"Marked {len(orphaned)} orphaned jobs as FAILED")
+        self._watcher = asyncio.create_task(self._watch())
+        logger.info(f"Job runner started as {WORKER_ID} (max_workers={self.max_workers})")
+
+    async def shutdown(self):
+        """Stop the watcher and interrupt running jobs; they are recorded as FAILED."""
+        self._stopping = True
+        if self._watcher is not None:
+            self._watcher.cancel()
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._watcher is not None:
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    def validate(self, job_type: str, params: Dict[str, Any], uploads: bool = False) -> JobType:
+        """Check that the job type exists and its handler accepts ``params``."""
+        spec = self.job_types.get(job_type)
+        if spec is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown job type '{job_type}'. Available: {', '.join(sorted(self.job_types))}"
+            )
+        if spec.uploads and not uploads:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Job type '{job_type}' must be submitted through its upload endpoint"
+            )
+        try:
+            inspect.signature(spec.handler).bind(None, **params)
+        except TypeError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid params for '{job_type}': {e}")
+        return spec
+
+    async def submit(
+        self,
+        db: AsyncSession,
+        job_type: str,
+        params: Dict[str, Any],
+        user_id: Optional[str] = None,
+        uploads: bool = False
+    ) -> Job:
+        """Record a QUEUED job and schedule it; returns immediately."""
+        self.validate(job_type, params, uploads)
+        if self._slots is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Job runner is not running")
+        db_job = JobModel(
+            job_type=job_type,
+            status="QUEUED",
+            exam_id=params.get("exam_id"),
+            params=json_safe(params),
+            progress=0.0,
+            cancel_requested=False,
+            worker=WORKER_ID,
+            created_by=user_id
+        )
+        db.add(db_job)
+        await db.commit()
+        await db.refresh(db_job)
+
+        self._contexts[db_job.job_id] = JobContext(db_job.job_id, job_type)
+        task = asyncio.create_task(self._run(db_job.job_id, job_type, params))
+        self._tasks[db_job.job_id] = task
+        logger.info(f"Queued job {db_job.job_id} ({job_type})")
+        return Job.model_validate(db_job)
+
+    def _interrupt(self, job_id: str) -> Optional[asyncio.Task]:
+        """
+        Cancel a local job: its task is returned when cancelled at once, None when
+        it was only flagged to stop at its next stage boundary.
+        """
+        task, ctx = self._tasks.get(job_id), self._contexts.get(job_id)
+        if task is None or ctx is None:
+            return None
+        ctx.cancel_requested = True
+        if not ctx.started or self.job_types[ctx.job_type].interruptible:
+            task.cancel()
+            return task
+        return None
+
+    async def cancel(self, db: AsyncSession, job_id: str, user: Optional[User] = None) -> Job:
+        """
+        Request cancellation of a job ``user`` may see.
+
+        A local job that is queued or interruptible is cancelled before this
+        returns; a running stage finishes first and the job then stops. Jobs
+        of other processes are picked up by their watcher within a poll interval.
+        """
+        db_job = await get_job_model(db, job_id, user)
+        if db_job.status in TERMINAL_STATUSES:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job already {db_job.status}")
+        db_job.cancel_requested = True
+        await db.commit()
+        task = self._interrupt(job_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+        await db.refresh(db_job)
+        return Job.model_validate(db_job)
+
+    async def _update(self, job_id: str, **values):
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(JobModel).where(JobModel.job_id == job_id).values(**values))
+            await db.commit()
+
+    async def _run(self, job_id: str, job_type: str, params: Dict[str, Any]):
+        spec = self.job_types[job_type]
+        ctx = self._contexts[job_id]
+        try:
+            # Wait for a slot of the job's type before taking one of the shared slots
+            async with self._type_slots[job_type], self._slots:
+                ctx.check_cancelled()
+                ctx.started = True
+                ctx.dirty = False
+                await self._update(job_id, status="RUNNING", started_at=datetime.now(), message="Running")
+                logger.info(f"Started job {job_id} ({job_type})")
+                result, result_path = await spec.handler(ctx, **params)
+            await self._update(
+                job_id, status="SUCCEEDED", progress=1.0, message="Done", finished_at=datetime.now(),
+                result=json_safe(result or {}), result_path=result_path
+            )
+            logger.info(f"Job {job_id} ({job_type}) succeeded")
+        except asyncio.CancelledError:
+            if self._stopping:
+                await self._update(job_id, status="FAILED", error="Interrupted by server shutdown", finished_at=datetime.now())
+            else:
+                await self._update(job_id, status="CANCELLED", message="Cancelled", finished_at=datetime.now())
+            logger.info(f"Job {job_id} ({job_type}) cancelled")
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.exception(f"Job {job_id} ({job_type}) failed: {detail}")
+            await self._update(job_id, status="FAILED", error=str(detail), finished_at=datetime.now())
+        finally:
+            self._tasks.pop(job_id, None)
+            self._contexts.pop(job_id, None)
+
+    async def _watch(self):
+        """Persist progress of local jobs and cancel those with a cancellation request."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if not self._tasks:
+                continue
+            try:
+                async with AsyncSessionLocal() as db:
+                    for job_id, ctx in list(self._contexts.items()):
+                        if ctx.dirty:
+                            ctx.dirty = False
+                            await db.execute(
+                                update(JobModel).where(JobModel.job_id == job_id, JobModel.status == "RUNNING")
+                                .values(progress=ctx.fraction, message=ctx.message)
+                            )
+                    await db.commit()
+                    cancelled = (await db.execute(
+                        select(JobModel.job_id).filter(
+                            JobModel.job_id.in_(list(self._tasks)), JobModel.cancel_requested.is_(True)
+                        )
+                    )).scalars().all()
+                for job_id in cancelled:
+                    self._interrupt(job_id)
+            except Exception as e:
+                logger.error(f"Job watcher error: {e}")
+
+
+job_runner = JobRunner(max_workers=settings.JOB_MAX_WORKERS, poll_interval=settings.JOB_POLL_INTERVAL)
+
+
+def _sees_all_jobs(user: Optional[User]) -> bool:
+    return user is None or user.role == ADMIN_ROLE
+
+
+async def get_job_model(db: AsyncSession, job_id: str, user: Optional[User] = None) -> JobModel:
+    """Job ``job_id``; when ``user`` is given and not an admin, only a job they created."""
+    query = select(JobModel).filter(JobModel.job_id == job_id)
+    if not _sees_all_jobs(user):
+        query = query.filter(JobModel.created_by == user.id)
+    result = await db.execute(query)
+    db_job = result.scalars().first()
+    if not db_job:
+        # Jobs of other users are reported as missing, so their ids cannot be probed
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db_job
+
+
+async def get_job(db: AsyncSession, job_id: str, user: Optional[User] = None) -> Job:
+    return Job.model_validate(await get_job_model(db, job_id, user))
+
+
+async def get_jobs(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    job_status: Optional[str] = None,
+    job_type: Optional[str] = None,
+    exam_id: Optional[str] = None,
+    user: Optional[User] = None
+) -> List[Job]:
+    query = select(JobModel)
+    if not _sees_all_jobs(user):
+        query = query.filter(JobModel.created_by == user.id)
+    if job_status:
+        query = query.filter(JobModel.status == job_status)
+    if job_type:
+        query = query.filter(JobModel.job_type == job_type)
+    if exam_id:
+        query = query.filter(JobModel.exam_id == exam_id)
+    result = await db.execute(query.order_by(JobModel.created_at.desc()).offset(skip).limit(limit))
+    return [Job.model_validate(job) for job in result.scalars().all()]
+
+
+# Job types
+
+@job_runner.register("process_subjects", concurrency=1)
+async def process_subjects_job(ctx: JobContext, exam_id: str) -> JobResult:
+    processor = SubjectProcessor(exam_id=exam_id, settings=Settings())
+    result = await processor.process_all(progress=ctx.progress)
+    return result, result.get("exported_file")
+
+
+@job_runner.register("exam_pipeline", concurrency=1)
+async def exam_pipeline_job(
+    ctx: JobContext,
+    exam_id: str,
+    resume: bool = True,
+    strategy: str = "staging",
+    incremental: bool = False
+) -> JobResult:
+    """Run every processing stage of an exam, resuming after the last checkpointed stage."""
+    pipeline = ExamPipeline(exam_id, resume=resume, strategy=strategy, progress=ctx.progress, incremental=incremental)
+    return await pipeline.run(), None
+
+
+@job_runner.register("export_excel", concurrency=2, interruptible=True)
+async def export_excel_job(
+    ctx: JobContext,
+    exam_id: str,
+    ward_name: str = "",
+    council_name: str = "",
+    region_name: str = "",
+    school_type: str = "",
+    practical_mode: int = 0,
+    marks_filler: str = "",
+    centre_number: str = "",
+    centre_number_list: Optional[List[str]] = None
+) -> JobResult:
+    file_path = await export_to_excel(
+        exam_id=exam_id,
+        ward_name=ward_name,
+        council_name=council_name,
+        region_name=region_name,
+        school_type=school_type,
+        practical_mode=practical_mode,
+        marks_filler=marks_filler,
+        centre_number=centre_number,
+        centre_number_list=centre_number_list or []
+    )
+    return {"file": os.path.basename(file_path)}, file_path
+
+
+@job_runner.register("export_excel_schools", concurrency=1, interruptible=True)
+async def export_excel_schools_job(
+    ctx: JobContext,
+    exam_id: str,
+    ward_name: str = "",
+    council_name: str = "",
+    region_name: str = "",
+    school_type: str = "",
+    practical_mode: int = 0,
+    marks_filler: str = "",
+    centre_number_list: Optional[List[str]] = None
+) -> JobResult:
+    zip_path, stats = await export_schools_to_zip(
+        exam_id=exam_id,
+        ward_name=ward_name,
+        council_name=council_name,
+        region_name=region_name,
+        school_type=school_type,
+        practical_mode=practical_mode,
+        marks_filler=marks_filler,
+        centre_number_list=centre_number_list or []
+    )
+    return stats, zip_path
+
+
+@job_runner.register("attendance_pdf", concurrency=1, interruptible=True)
+async def attendance_pdf_job(
+    ctx: JobContext,
+    exam_id: str,
+    centre_number: Optional[str] = None,
+    ward_name: Optional[str] = None,
+    council_name: Optional[str] = None,
+    region_name: Optional[str] = None,
+    include_score: bool = True,
+    underscore_mode: bool = True,
+    separate_every: int = 10,
+    zip_output: bool = False,
+    ministry: Optional[str] = "PRESIDENT'S OFFICE, REGIONAL ADMINISTRATION AND LOCAL GOVERNMENTS",
+    exam_board: Optional[str] = None,
+    report_name: Optional[str] = "INDIVIDUAL ATTENDANCE LIST"
+) -> JobResult:
+    async with AsyncSessionLocal() as db:
+        file_path, timings = await generate_attendance_bundle(
+            exam_id=exam_id,
+            centre_number=centre_number,
+            ward_name=ward_name,
+            council_name=council_name,
+            region_name=region_name,
+            include_score=include_score,
+            underscore_mode=underscore_mode,
+            separate_every=separate_every,
+            zip_output=zip_output,
+            ministry=ministry,
+            exam_board=exam_board,
+            report_name=report_name,
+            db=db
+        )
+    return {"timings": timings}, file_path
+
+
+@job_runner.register("pdf_ingest", concurrency=1, uploads=True)
+async def pdf_ingest_job(ctx: JobContext, exam_id: str, upload_dir: str, chunk_size: int = 20) -> JobResult:
+    """Ingest the PDFs saved by the upload endpoint in chunks, then remove the upload folder."""
+    try:
+        pdf_paths = sorted(str(path) for path in Path(upload_dir).rglob("*") if path.suffix.lower() == ".pdf")
+        async with AsyncSessionLocal() as db:
+            for i in range(0, len(pdf_paths), chunk_size):
+                await process_batch_pdf_data(db, pdf_paths[i:i + chunk_size], exam_id)
+                done = min(i + chunk_size, len(pdf_paths))
+                ctx.progress(done / len(pdf_paths), f"{done}/{len(pdf_paths)} PDFs processed")
+        return {"pdfs": len(pdf_paths)}, None
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
@@ -0,0 +1,116 @@
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.models.region import Region
+from app.db.models.council import Council
+from app.db.models.ward import Ward
+
+logger = logging.getLogger(__name__)
+
+
+class RegionEntry(NamedTuple):
+    region_id: int
+    region_name: str
+
+
+class CouncilEntry(NamedTuple):
+    council_id: int
+    council_name: str
+    region: RegionEntry
+
+
+class WardEntry(NamedTuple):
+    ward_id: int
+    ward_name: str
+    council: CouncilEntry
+
+
+def normalise_name(name: str) -> str:
+    return name.strip().upper()
+
+
+class Gazetteer:
+    """Immutable snapshot of regions → councils → wards, indexed by ID and by normalised name."""
+
+    def __init__(self, regions: List[RegionEntry], councils: List[CouncilEntry], wards: List[WardEntry]):
+        self.regions_by_id: Dict[int, RegionEntry] = {r.region_id: r for r in regions}
+        self.councils_by_id: Dict[int, CouncilEntry] = {c.council_id: c for c in councils}
+        self.wards_by_id: Dict[int, WardEntry] = {w.ward_id: w for w in wards}
+        self.regions_by_name: Dict[str, List[RegionEntry]] = {}
+        self.councils_by_name: Dict[str, List[CouncilEntry]] = {}
+        self.wards_by_name: Dict[str, List[WardEntry]] = {}
+        for region in regions:
+            self.regions_by_name.setdefault(normalise_name(region.region_name), []).append(region)
+        for council in councils:
+            self.councils_by_name.setdefault(normalise_name(council.council_name), []).append(council)
+        for ward in wards:
+            self.wards_by_name.setdefault(normalise_name(ward.ward_name), []).append(ward)
+
+    def regions_named(self, name: str) -> List[RegionEntry]:
+        return self.regions_by_name.get(normalise_name(name), [])
+
+    def councils_named(self, name: str) -> List[CouncilEntry]:
+        return self.councils_by_name.get(normalise_name(name), [])
+
+    def wards_named(self, name: str) -> List[WardEntry]:
+        return self.wards_by_name.get(normalise_name(name), [])
+
+
+class LocationCache:
+    """
+    Process-wide, lazily loaded ``Gazetteer``.
+
+    The region/council/ward services call ``invalidate()`` after every write.
+    Snapshots also expire after ``LOCATION_CACHE_TTL`` seconds so rows added
+    outside the API (migrations, SQL scripts, other workers) are picked up.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._gazetteer: Optional[Gazetteer] = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    async def get(self, db: AsyncSession) -> Gazetteer:
+        """Return the current snapshot, loading it with three queries if missing or expired."""
+        if self._gazetteer is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._gazetteer
+
+        generation = self._generation
+        start_time = time.perf_counter()
+        regions = {
+            row.region_id: RegionEntry(row.region_id, row.region_name)
+            for row in (await db.execute(select(Region.region_id, Region.region_name))).all()
+        }
+        councils = {
+            row.council_id: CouncilEntry(row.council_id, row.council_name, regions[row.region_id])
+            for row in (await db.execute(select(Council.council_id, Council.council_name, Council.region_id))).all()
+            if row.region_id in regions
+        }
+        wards = [
+            WardEntry(row.ward_id, row.ward_name, councils[row.council_id])
+            for row in (await db.execute(select(Ward.ward_id, Ward.ward_name, Ward.council_id))).all()
+            if row.council_id in councils
+        ]
+        gazetteer = Gazetteer(list(regions.values()), list(councils.values()), wards)
+        logger.info(
+            f"Loaded location gazetteer: {len(regions)} regions, {len(councils)} councils, "
+            f"{len(wards)} wards in {time.perf_counter() - start_time:.2f} seconds"
+        )
+
+        # A write that landed while loading may not be in this snapshot; use it for this call only
+        if generation == self._generation:
+            self._gazetteer = gazetteer
+            self._loaded_at = time.monotonic()
+        return gazetteer
+
+    def invalidate(self):
+        """Drop the snapshot; the next lookup reloads it."""
+        self._gazetteer = None
+        self._generation += 1
+
+
+location_cache = LocationCache(ttl=settings.LOCATION_CACHE_TTL)
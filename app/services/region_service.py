@@ -4,6 +4,7 @@ from sqlalchemy.future import select
 from fastapi import HTTPException, status
 from app.db.models.region import Region as RegionModel
 from app.db.schemas.region import RegionCreate, Region
+from app.services.location_service import location_cache
 from uuid6 import uuid6
 
 async def create_region(db: AsyncSession, region: RegionCreate) -> Region:
@@ -18,6 +19,7 @@ async def create_region(db: AsyncSession, region: RegionCreate) -> Region:
     db_region = RegionModel(**region_data)
     db.add(db_region)
     await db.commit()
+    location_cache.invalidate()
     await db.refresh(db_region)
     return Region.model_validate(db_region)
 
@@ -8,8 +8,12 @@ from uuid6 import uuid6
 import pandas as pd
 import numpy as np
 import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import text
 from app.db.models.result import Result
+from utils.processor.lookup import ThresholdLookup
+from utils.processor.ranking import RESULT_RANK_LEVELS, rank_levels
 
 
 
@@ -42,6 +46,10 @@ async def get_results(db: AsyncSession, skip: int = 0, limit: int = 100) -> list
 
 
 
+# CPU-heavy frame preparation runs here so the event loop keeps serving requests
+_results_executor = ThreadPoolExecutor(max_workers=2)
+
+
 async def prepare_results_df(exam_id: str, db: AsyncSession) -> pd.DataFrame:
     """Prepare a comprehensive results DataFrame from multiple database tables."""
     start_time = time.time()
@@ -98,7 +106,24 @@ async def prepare_results_df(exam_id: str, db: AsyncSession) -> pd.DataFrame:
     for name, query in queries.items():
         result = await conn.execute(text(query), {"exam_id": exam_id})
         data[name] = pd.DataFrame(result.fetchall(), columns=result.keys())
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Loaded source data in {time.time() - start_time:.2f}s")
+    
+    # 3-9. Columnar processing off the event loop
+    loop = asyncio.get_running_loop()
+    df = await loop.run_in_executor(_results_executor, build_results_df, data)
     
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] DataFrame preparation completed in {time.time() - start_time:.2f}s")
+    return df
+
+def _map_bands(bands: pd.DataFrame, bound_col: str, label_col: str, values: pd.Series) -> np.ndarray:
+    """Map values to their band label; values under the lowest band take the lowest band."""
+    if bands.empty:
+        return np.full(len(values), np.nan)
+    lookup = ThresholdLookup.from_frame(bands, bound_col, label_col, below='clip')
+    return lookup.lookup(values)
+
+def build_results_df(data: dict) -> pd.DataFrame:
+    """Build the results frame from the loaded tables (CPU only, safe to run in a worker)."""
     # 3. Process and merge data
     df = data['students'].merge(data['exams'], on='exam_id', how='left')
     
@@ -113,70 +138,26 @@ async def prepare_results_df(exam_id: str, db: AsyncSession) -> pd.DataFrame:
     
     # 4. Calculate best subjects and points
     subject_codes = data['exam_subjects']['subject_code'].unique()
-    for i in range(1, 9):
-        df[f'best_{i}'] = np.nan
+    best_cols = [f'best_{i}' for i in range(1, 9)]
     
-    marks_matrix = df[subject_codes].to_numpy()
+    marks_matrix = df[subject_codes].to_numpy(dtype=np.float64)
     filled = np.where(np.isnan(marks_matrix), -1e9, marks_matrix)
     sorted_indices = np.argsort(-filled, axis=1)[:, :8]
     row_indices = np.arange(len(df))[:, None]
     top8 = marks_matrix[row_indices, sorted_indices]
-    df[[f'best_{i+1}' for i in range(8)]] = top8
+    df[best_cols] = top8
     
     # 5. Calculate division points
-    division_lookup = {}
-    for _, row in data['exam_grades'].iterrows():
-        exam_id = row['exam_id']
-        if exam_id not in division_lookup:
-            division_lookup[exam_id] = []
-        division_lookup[exam_id].append((row['lower_value'], row['division_points']))
-    
-    for exam_id in division_lookup:
-        division_lookup[exam_id].sort(reverse=True, key=lambda x: x[0])
-    
-    for i in range(1, 9):
-        points = []
-        for _, row in df.iterrows():
-            mark = row[f'best_{i}']
-            exam_id = row['exam_id']
-            if pd.isna(mark) or exam_id not in division_lookup:
-                points.append(np.nan)
-                continue
-            for lower, point in division_lookup[exam_id]:
-                if mark >= lower:
-                    points.append(point)
-                    break
-            else:
-                points.append(division_lookup[exam_id][-1][1])
-        df[f'best_{i}_points'] = points
+    points_cols = [f'{col}_points' for col in best_cols]
+    for col, points_col in zip(best_cols, points_cols):
+        df[points_col] = _map_bands(data['exam_grades'], 'lower_value', 'division_points', df[col])
     
     # 6. Calculate total points and division
-    df['total_points'] = df[[f'best_{i}_points' for i in range(1, 9)]].sum(axis=1)
-    df.loc[df[[f'best_{i}' for i in range(1, 9)]].count(axis=1) < 7, 'total_points'] = -1
-    
-    division_map = {}
-    for _, row in data['exam_divisions'].iterrows():
-        exam_id = row['exam_id']
-        if exam_id not in division_map:
-            division_map[exam_id] = []
-        division_map[exam_id].append((row['lowest_points'], row['division']))
+    df['total_points'] = df[points_cols].sum(axis=1)
+    df.loc[df[best_cols].count(axis=1) < 7, 'total_points'] = -1
     
-    for exam_id in division_map:
-        division_map[exam_id].sort(reverse=True, key=lambda x: x[0])
-    
-    divisions = []
-    for _, row in df.iterrows():
-        points = row['total_points']
-        exam_id = row['exam_id']
-        if points == -1 or pd.isna(points) or exam_id not in division_map:
-            divisions.append(np.nan)
-            continue
-        for low, div in division_map[exam_id]:
-            if points >= low:
-                divisions.append(div)
-                break
-        else:
-            divisions.append(division_map[exam_id][-1][1])
+    divisions = _map_bands(data['exam_divisions'], 'lowest_points', 'division', df['total_points'])
+    divisions[(df['total_points'] == -1).to_numpy()] = np.nan
     df['division'] = divisions
     
     # 7. Calculate averages and totals based on style
@@ -210,49 +191,10 @@ async def prepare_results_df(exam_id: str, db: AsyncSession) -> pd.DataFrame:
         df.loc[mask, 'avg_marks'] = valid_marks.sum(axis=1) / np.maximum(7, counts)
     
     # 8. Calculate rankings
-    df_valid = df[df['avg_marks'] >= 0].copy()
-    
-    # National ranking
-    df['pos'] = df_valid['avg_marks'].rank(method='min', ascending=False)
-    df['out_of'] = len(df_valid)
-    
-    # Helper function for grouped rankings
-    def calculate_group_rankings(df_main, df_sub, group_cols, prefix):
-        if len(df_sub) == 0:
-            return
-        
-        # Overall group ranking
-        ranks = df_sub['avg_marks'].rank(method='min', ascending=False)
-        df_main.loc[df_sub.index, f'{prefix}_pos'] = ranks
-        df_main.loc[df_sub.index, f'{prefix}_out_of'] = len(df_sub)
-        
-        # Government/private breakdown
-        for sch_type, suffix in [('GOVERNMENT', 'gvt'), ('PRIVATE', 'pvt')]:
-            mask = df_sub['school_type'] == sch_type
-            if mask.any():
-                sub_ranks = df_sub.loc[mask, 'avg_marks'].rank(method='min', ascending=False)
-                df_main.loc[df_sub[mask].index, f'{prefix}_pos_{suffix}'] = sub_ranks
-    
-    # Regional rankings
-    for region, group in df_valid.groupby('region_name'):
-        if pd.notna(region):
-            calculate_group_rankings(df, group, ['region_name'], 'region')
-    
-    # Council rankings
-    for council, group in df_valid.groupby('council_name'):
-        if pd.notna(council):
-            calculate_group_rankings(df, group, ['council_name'], 'council')
-    
-    # Ward rankings
-    for (council, ward), group in df_valid.groupby(['council_name', 'ward_name']):
-        if pd.notna(council) and pd.notna(ward):
-            calculate_group_rankings(df, group, ['council_name', 'ward_name'], 'ward')
-    
-    # School rankings
-    for centre, group in df_valid.groupby('centre_number'):
-        if pd.notna(centre):
-            df.loc[group.index, 'school_pos'] = group['avg_marks'].rank(method='min', ascending=False)
-            df.loc[group.index, 'school_out_of'] = len(group)
+    valid = df['avg_marks'] >= 0
+    ranks = rank_levels(df, 'avg_marks', RESULT_RANK_LEVELS, valid=valid)
+    df[list(ranks.columns)] = ranks
+    df['out_of'] = int(valid.sum())
     
     # 9. Final formatting
     rename_dict = {
@@ -264,7 +206,6 @@ async def prepare_results_df(exam_id: str, db: AsyncSession) -> pd.DataFrame:
     # Add UUIDs
     df.insert(0, 'id', [str(uuid6()) for _ in range(len(df))])
     
-    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] DataFrame preparation completed in {time.time() - start_time:.2f}s")
     return df
 
 async def execute_results_insert(df: pd.DataFrame, db: AsyncSession) -> dict:
@@ -1,6 +1,5 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import text
 from fastapi import HTTPException
 from app.db.models.school import School as SchoolModel
@@ -9,16 +8,14 @@ from app.db.models.exam_subject import ExamSubject
 from app.db.models.student import Student
 from app.db.models.student_subject import StudentSubject
 from app.db.models.exam import Exam
-from app.db.models.region import Region
-from app.db.models.council import Council
-from app.db.models.ward import Ward
 from app.db.schemas.school import SchoolCreate, School
+from app.services.location_service import location_cache
 from utils.pdf.pdf_processor import PDFTableProcessor
 from utils.pdf.batch_processor import BatchPDFProcessor
 from uuid6 import uuid6
 import pandas as pd
 import re
-from typing import List
+from typing import Dict, Iterable, List, Set, Tuple
 import logging
 
 # Configure logging to file
@@ -29,6 +26,7 @@ logging.basicConfig(
 )
 
 async def resolve_location_data(db: AsyncSession, school_data: dict) -> dict:
+    """Fill in the ward/council/region IDs and names from the cached gazetteer."""
     rn = school_data.get("region_name")
     cn = school_data.get("council_name")
     wn = school_data.get("ward_name")
@@ -38,9 +36,9 @@ async def resolve_location_data(db: AsyncSession, school_data: dict) -> dict:
         cn = cn.strip().upper()
     if wn:
         wn = wn.strip().upper()
+    gazetteer = await location_cache.get(db)
     if wn:
-        stmt = select(Ward).options(selectinload(Ward.council).selectinload(Council.region)).filter(Ward.ward_name.ilike(wn))
-        wards = (await db.execute(stmt)).scalars().all()
+        wards = gazetteer.wards_named(wn)
         if not wards:
             raise HTTPException(404, f"Ward '{wn}' not found")
         if len(wards) > 1:
@@ -53,8 +51,7 @@ async def resolve_location_data(db: AsyncSession, school_data: dict) -> dict:
         school_data["council_name"] = ward.council.council_name
         school_data["region_name"] = ward.council.region.region_name
     elif cn:
-        stmt = select(Council).options(selectinload(Council.region)).filter(Council.council_name.ilike(cn))
-        councils = (await db.execute(stmt)).scalars().all()
+        councils = gazetteer.councils_named(cn)
         if not councils:
             raise HTTPException(404, f"Council '{cn}' not found")
         if len(councils) > 1:
@@ -65,16 +62,15 @@ async def resolve_location_data(db: AsyncSession, school_data: dict) -> dict:
         school_data["council_name"] = council.council_name
         school_data["region_name"] = council.region.region_name
     elif rn:
-        stmt = select(Region).filter(Region.region_name.ilike(rn))
-        region = (await db.execute(stmt)).scalars().first()
-        if not region:
+        regions = gazetteer.regions_named(rn)
+        if not regions:
             raise HTTPException(404, f"Region '{rn}' not found")
+        region = regions[0]
         school_data["region_id"] = region.region_id
         school_data["region_name"] = region.region_name
     else:
         if "ward_id" in school_data:
-            stmt = select(Ward).options(selectinload(Ward.council).selectinload(Council.region)).filter(Ward.ward_id == school_data["ward_id"])
-            ward = (await db.execute(stmt)).scalars().first()
+            ward = gazetteer.wards_by_id.get(school_data["ward_id"])
             if not ward:
                 raise HTTPException(404, "Ward ID not found")
             school_data["ward_name"] = ward.ward_name
@@ -83,15 +79,14 @@ async def resolve_location_data(db: AsyncSession, school_data: dict) -> dict:
             school_data["region_id"] = ward.council.region.region_id
             school_data["region_name"] = ward.council.region.region_name
         elif "council_id" in school_data:
-            stmt = select(Council).options(selectinload(Council.region)).filter(Council.council_id == school_data["council_id"])
-            council = (await db.execute(stmt)).scalars().first()
+            council = gazetteer.councils_by_id.get(school_data["council_id"])
             if not council:
                 raise HTTPException(404, "Council ID not found")
             school_data["council_name"] = council.council_name
             school_data["region_id"] = council.region.region_id
             school_data["region_name"] = council.region.region_name
         elif "region_id" in school_data:
-            region = await db.get(Region, school_data["region_id"])
+            region = gazetteer.regions_by_id.get(school_data["region_id"])
             if not region:
                 raise HTTPException(404, "Region ID not found")
             school_data["region_name"] = region.region_name
@@ -126,6 +121,123 @@ def abbreviate_subject(subject_name: str) -> str:
         return words[0][:3].upper()
     return ''.join(word[0].upper() for word in words if word.lower() not in ['in', 'language'])
 
+async def ensure_exam_subjects(db: AsyncSession, exam_id: str, subject_names: Dict[str, str]) -> None:
+    """
+    Make sure every subject code has a ``subjects`` row and an ``exam_subjects`` row for the exam.
+
+    Existing rows are loaded in two set queries; only the missing ones are written,
+    each table with one multi-row ``INSERT IGNORE``.
+    """
+    codes = list(subject_names)
+    if not codes:
+        return
+
+    result = await db.execute(select(Subject).filter(Subject.subject_code.in_(codes)))
+    subjects = {
+        subject.subject_code: {
+            "subject_code": subject.subject_code,
+            "subject_name": subject.subject_name,
+            "subject_short": subject.subject_short,
+            "has_practical": subject.has_practical if subject.has_practical is not None else False,
+            "exclude_from_gpa": subject.exclude_from_gpa if subject.exclude_from_gpa is not None else False
+        }
+        for subject in result.scalars().all()
+    }
+    new_subjects = [
+        {
+            "subject_code": code,
+            "subject_name": subject_names[code],
+            "subject_short": abbreviate_subject(subject_names[code]),
+            "has_practical": False,
+            "exclude_from_gpa": False
+        }
+        for code in codes if code not in subjects
+    ]
+    if new_subjects:
+        await db.execute(
+            text("""
+                INSERT IGNORE INTO subjects
+                (subject_code, subject_name, subject_short, has_practical, exclude_from_gpa)
+                VALUES (:subject_code, :subject_name, :subject_short, :has_practical, :exclude_from_gpa)
+            """),
+            new_subjects
+        )
+        subjects.update((subject["subject_code"], subject) for subject in new_subjects)
+
+    result = await db.execute(
+        select(ExamSubject.subject_code)
+        .filter(ExamSubject.exam_id == exam_id, ExamSubject.subject_code.in_(codes))
+    )
+    existing_exam_subjects = set(result.scalars().all())
+    new_exam_subjects = [
+        {"exam_id": exam_id, **subjects[code]}
+        for code in codes if code not in existing_exam_subjects
+    ]
+    if new_exam_subjects:
+        await db.execute(
+            text("""
+                INSERT IGNORE INTO exam_subjects
+                (exam_id, subject_code, subject_name, subject_short, has_practical, exclude_from_gpa)
+                VALUES (:exam_id, :subject_code, :subject_name, :subject_short, :has_practical, :exclude_from_gpa)
+            """),
+            new_exam_subjects
+        )
+    await db.commit()
+
+async def load_student_global_ids(db: AsyncSession, exam_id: str, centre_numbers: Iterable[str]) -> Dict[Tuple[str, str], str]:
+    """Map ``(student_id, centre_number)`` to ``student_global_id`` for the exam's students at these centres."""
+    result = await db.execute(
+        select(Student.student_id, Student.centre_number, Student.student_global_id)
+        .filter(Student.exam_id == exam_id, Student.centre_number.in_(list(centre_numbers)))
+    )
+    return {(row.student_id, row.centre_number): row.student_global_id for row in result.fetchall()}
+
+async def insert_students(db: AsyncSession, student_params: List[dict]) -> int:
+    """Write new students with one multi-row ``INSERT IGNORE``; returns the number actually inserted."""
+    if not student_params:
+        return 0
+    result = await db.execute(
+        text("""
+            INSERT IGNORE INTO students
+            (student_global_id, exam_id, student_id, centre_number, first_name, middle_name, surname, sex)
+            VALUES (:student_global_id, :exam_id, :student_id, :centre_number, :first_name, :middle_name, :surname, :sex)
+        """),
+        student_params
+    )
+    await db.commit()
+    inserted_rows = result.rowcount
+    expected_rows = len(student_params)
+    if inserted_rows < expected_rows:
+        logging.info(f"Skipped {expected_rows - inserted_rows} duplicate students during bulk insert")
+    return inserted_rows
+
+async def load_student_subject_keys(db: AsyncSession, exam_id: str, centre_numbers: Iterable[str]) -> Set[Tuple[str, str]]:
+    """``(student_global_id, subject_code)`` pairs already registered for the exam at these centres."""
+    result = await db.execute(
+        select(StudentSubject.student_global_id, StudentSubject.subject_code)
+        .filter(StudentSubject.exam_id == exam_id, StudentSubject.centre_number.in_(list(centre_numbers)))
+    )
+    return {(row.student_global_id, row.subject_code) for row in result.fetchall()}
+
+async def insert_student_subjects(db: AsyncSession, student_subject_params: List[dict]) -> int:
+    """Write new student subjects with one multi-row ``INSERT IGNORE``; returns the number actually inserted."""
+    if not student_subject_params:
+        return 0
+    result = await db.execute(
+        text("""
+            INSERT IGNORE INTO student_subjects
+            (id, exam_id, student_global_id, centre_number, subject_code)
+            VALUES (:id, :exam_id, :student_global_id, :centre_number, :subject_code)
+        """),
+        student_subject_params
+    )
+    await db.commit()
+    inserted_rows = result.rowcount
+    expected_rows = len(student_subject_params)
+    if inserted_rows < expected_rows:
+        logging.info(f"Skipped {expected_rows - inserted_rows} duplicate student subjects during bulk insert")
+    return inserted_rows
+
 async def process_pdf_data(db: AsyncSession, pdf_path: str, exam_id: str) -> None:
     pdf_data = PDFTableProcessor.parse_pdf_to_data(pdf_path)
     school_info = pdf_data['school_info']
@@ -147,68 +259,54 @@ async def process_pdf_data(db: AsyncSession, pdf_path: str, exam_id: str) -> Non
         school = SchoolModel(**school_data)
         db.add(school)
     await db.commit()
-    await db.refresh(school)
-    for _, row in subject_data.iterrows():
-        subject_code = row['CODE']
-        subject_name = row['SUBJECT']
-        result = await db.execute(select(Subject).filter(Subject.subject_code == subject_code))
-        subject = result.scalars().first()
-        if not subject:
-            subject_short = abbreviate_subject(subject_name)
-            subject = Subject(
-                subject_code=subject_code,
-                subject_name=subject_name,
-                subject_short=subject_short,
-                has_practical=False,
-                exclude_from_gpa=False
-            )
-            db.add(subject)
-            await db.commit()
-            await db.refresh(subject)
-        result = await db.execute(select(ExamSubject).filter(ExamSubject.exam_id == exam_id, ExamSubject.subject_code == subject_code))
-        exam_subject = result.scalars().first()
-        if not exam_subject:
-            exam_subject = ExamSubject(
-                exam_id=exam_id,
-                subject_code=subject_code,
-                subject_name=subject.subject_name,
-                subject_short=subject.subject_short,
-                has_practical=subject.has_practical,
-                exclude_from_gpa=subject.exclude_from_gpa
-            )
-            db.add(exam_subject)
-    await db.commit()
-    for _, row in student_data.iterrows():
+
+    subject_names = {}
+    for code, name in zip(subject_data['CODE'], subject_data['SUBJECT']):
+        subject_names.setdefault(code, name)
+    await ensure_exam_subjects(db, exam_id, subject_names)
+
+    # Diff the PDF against what the centre already has, then write only the new rows
+    student_global_ids = await load_student_global_ids(db, exam_id, [centre_number])
+    students = student_data.to_dict('records')
+    student_params = []
+    for row in students:
         student_id = row['CANDIDATE']
-        result = await db.execute(select(Student).filter(Student.exam_id == exam_id, Student.student_id == student_id, Student.centre_number == centre_number))
-        student = result.scalars().first()
-        if not student:
-            student = Student(
-                student_global_id=str(uuid6()),
-                exam_id=exam_id,
-                student_id=student_id,
-                centre_number=centre_number,
-                first_name=row['FIRST_NAME'],
-                middle_name=row['MIDDLE_NAME'],
-                surname=row['LAST_NAME'],
-                sex=row['SEX']
-            )
-            db.add(student)
-        subject_codes = [col for col in student_data.columns if re.match(r'^\d{3}$', col)]
+        if (student_id, centre_number) in student_global_ids:
+            continue
+        student_global_id = str(uuid6())
+        student_params.append({
+            "student_global_id": student_global_id,
+            "exam_id": exam_id,
+            "student_id": student_id,
+            "centre_number": centre_number,
+            "first_name": row['FIRST_NAME'],
+            "middle_name": row['MIDDLE_NAME'] if pd.notna(row['MIDDLE_NAME']) else None,
+            "surname": row['LAST_NAME'],
+            "sex": row['SEX']
+        })
+        student_global_ids[(student_id, centre_number)] = student_global_id
+    if await insert_students(db, student_params) < len(student_params):
+        # Some were written concurrently under other ids; use the ids that are actually stored
+        student_global_ids = await load_student_global_ids(db, exam_id, [centre_number])
+
+    existing_student_subjects = await load_student_subject_keys(db, exam_id, [centre_number])
+    subject_codes = [col for col in student_data.columns if re.match(r'^\d{3}$', col)]
+    student_subject_params = []
+    for row in students:
+        student_global_id = student_global_ids.get((row['CANDIDATE'], centre_number))
+        if not student_global_id:
+            continue
         for code in subject_codes:
-            if pd.notna(row[code]):
-                result = await db.execute(select(StudentSubject).filter(StudentSubject.exam_id == exam_id, StudentSubject.student_global_id == student.student_global_id, StudentSubject.centre_number == centre_number, StudentSubject.subject_code == code))
-                student_subject = result.scalars().first()
-                if not student_subject:
-                    student_subject = StudentSubject(
-                        id=str(uuid6()),
-                        exam_id=exam_id,
-                        student_global_id=student.student_global_id,
-                        centre_number=centre_number,
-                        subject_code=code
-                    )
-                    db.add(student_subject)
-    await db.commit()
+            if pd.notna(row[code]) and (student_global_id, code) not in existing_student_subjects:
+                student_subject_params.append({
+                    "id": str(uuid6()),
+                    "exam_id": exam_id,
+                    "student_global_id": student_global_id,
+                    "centre_number": centre_number,
+                    "subject_code": code
+                })
+                existing_student_subjects.add((student_global_id, code))
+    await insert_student_subjects(db, student_subject_params)
 
 async def process_batch_pdf_data(db: AsyncSession, pdf_paths: List[str], exam_id: str) -> None:
     result = await db.execute(select(Exam).filter(Exam.exam_id == exam_id))
@@ -216,7 +314,7 @@ async def process_batch_pdf_data(db: AsyncSession, pdf_paths: List[str], exam_id
     if not exam:
         raise HTTPException(status_code=400, detail=f"Exam ID {exam_id} not found")
     
-    students_df, report_df = BatchPDFProcessor.process_pdf_files(pdf_paths, split_names=False)
+    students_df, report_df = await BatchPDFProcessor.process_pdf_files_async(pdf_paths, split_names=False)
     
     required_columns = ['CENTRE NUMBER', 'SCHOOL NAME', 'SCHOOL TYPE']
     missing_columns = [col for col in required_columns if col not in report_df.columns]
@@ -259,45 +357,9 @@ async def process_batch_pdf_data(db: AsyncSession, pdf_paths: List[str], exam_id
     await db.commit()
     
     subject_codes = [col for col in students_df.columns if re.match(r'^\d{3}$', col)]
-    with db.no_autoflush:
-        for code in subject_codes:
-            subject_name = f"SUBJECT {code}"
-            result = await db.execute(select(Subject).filter(Subject.subject_code == code))
-            subject = result.scalars().first()
-            if not subject:
-                subject_short = abbreviate_subject(subject_name)
-                subject = Subject(
-                    subject_code=code,
-                    subject_name=subject_name,
-                    subject_short=subject_short,
-                    has_practical=False,
-                    exclude_from_gpa=False
-                )
-                db.add(subject)
-                await db.commit()
-                await db.refresh(subject)
-            result = await db.execute(select(ExamSubject).filter(ExamSubject.exam_id == exam_id, ExamSubject.subject_code == code))
-            exam_subject = result.scalars().first()
-            if not exam_subject:
-                exam_subject = ExamSubject(
-                    exam_id=exam_id,
-                    subject_code=code,
-                    subject_name=subject.subject_name,
-                    subject_short=subject.subject_short,
-                    has_practical=subject.has_practical if subject.has_practical is not None else False,
-                    exclude_from_gpa=subject.exclude_from_gpa if subject.exclude_from_gpa is not None else False
-                )
-                db.add(exam_subject)
+    await ensure_exam_subjects(db, exam_id, {code: f"SUBJECT {code}" for code in subject_codes})
     
-    await db.commit()
-    
-    existing_students = {}
-    result = await db.execute(
-        select(Student.student_id, Student.centre_number, Student.student_global_id)
-        .filter(Student.exam_id == exam_id, Student.centre_number.in_(student_centres))
-    )
-    for row in result.fetchall():
-        existing_students[(row.student_id, row.centre_number)] = row.student_global_id
+    existing_students = await load_student_global_ids(db, exam_id, student_centres)
     
     students_to_add = []
     student_global_ids = {}
@@ -327,18 +389,16 @@ async def process_batch_pdf_data(db: AsyncSession, pdf_paths: List[str], exam_id
                 middle_name = None
                 surname = None
             student_global_id = str(uuid6())
-            students_to_add.append(
-                Student(
-                    student_global_id=student_global_id,
-                    exam_id=exam_id,
-                    student_id=student_id,
-                    centre_number=centre_number,
-                    first_name=first_name,
-                    middle_name=middle_name,
-                    surname=surname or "-",
-                    sex=row['SEX']
-                )
-            )
+            students_to_add.append({
+                "student_global_id": student_global_id,
+                "exam_id": exam_id,
+                "student_id": student_id,
+                "centre_number": centre_number,
+                "first_name": first_name,
+                "middle_name": middle_name,
+                "surname": surname or "-",
+                "sex": row['SEX']
+            })
             student_global_ids[(student_id, centre_number)] = student_global_id
         else:
             logging.info(f"Skipping duplicate student: {student_id}, centre: {centre_number}")
@@ -347,41 +407,11 @@ async def process_batch_pdf_data(db: AsyncSession, pdf_paths: List[str], exam_id
 
 
 
-    if students_to_add:
-        student_params = [
-            {
-                "student_global_id": s.student_global_id,
-                "exam_id": s.exam_id,
-                "student_id": s.student_id,
-                "centre_number": s.centre_number,
-                "first_name": s.first_name,
-                "middle_name": s.middle_name,
-                "surname": s.surname,
-                "sex": s.sex
-            }
-            for s in students_to_add
-        ]
-        result = await db.execute(
-            text("""
-                INSERT IGNORE INTO students
-                (student_global_id, exam_id, student_id, centre_number, first_name, middle_name, surname, sex)
-                VALUES (:student_global_id, :exam_id, :student_id, :centre_number, :first_name, :middle_name, :surname, :sex)
-            """),
-            student_params
-        )
-        await db.commit()
-        inserted_rows = result.rowcount
-        expected_rows = len(students_to_add)
-        if inserted_rows < expected_rows:
-            logging.info(f"Skipped {expected_rows - inserted_rows} duplicate students during bulk insert")
+    if await insert_students(db, students_to_add) < len(students_to_add):
+        # Some were written concurrently under other ids; use the ids that are actually stored
+        student_global_ids.update(await load_student_global_ids(db, exam_id, student_centres))
 
-    existing_student_subjects = set()
-    result = await db.execute(
-        select(StudentSubject.student_global_id, StudentSubject.subject_code)
-        .filter(StudentSubject.exam_id == exam_id, StudentSubject.centre_number.in_(student_centres))
-    )
-    for row in result.fetchall():
-        existing_student_subjects.add((row.student_global_id, row.subject_code))
+    existing_student_subjects = await load_student_subject_keys(db, exam_id, student_centres)
     
     student_subjects_to_add = []
     for _, row in students_df.iterrows():
@@ -391,37 +421,12 @@ async def process_batch_pdf_data(db: AsyncSession, pdf_paths: List[str], exam_id
         if student_global_id:
             for code in subject_codes:
                 if pd.notna(row[code]) and (student_global_id, code) not in existing_student_subjects:
-                    student_subjects_to_add.append(
-                        StudentSubject(
-                            id=str(uuid6()),
-                            exam_id=exam_id,
-                            student_global_id=student_global_id,
-                            centre_number=centre_number,
-                            subject_code=code
-                        )
-                    )
+                    student_subjects_to_add.append({
+                        "id": str(uuid6()),
+                        "exam_id": exam_id,
+                        "student_global_id": student_global_id,
+                        "centre_number": centre_number,
+                        "subject_code": code
+                    })
     
-    if student_subjects_to_add:
-        student_subject_params = [
-            {
-                "id": s.id,
-                "exam_id": s.exam_id,
-                "student_global_id": s.student_global_id,
-                "centre_number": s.centre_number,
-                "subject_code": s.subject_code
-            }
-            for s in student_subjects_to_add
-        ]
-        result = await db.execute(
-            text("""
-                INSERT IGNORE INTO student_subjects
-                (id, exam_id, student_global_id, centre_number, subject_code)
-                VALUES (:id, :exam_id, :student_global_id, :centre_number, :subject_code)
-            """),
-            student_subject_params
-        )
-        await db.commit()
-        inserted_rows = result.rowcount
-        expected_rows = len(student_subjects_to_add)
-        if inserted_rows < expected_rows:
-            logging.info(f"Skipped {expected_rows - inserted_rows} duplicate student subjects during bulk insert")
\ No newline at end of file
+    await insert_student_subjects(db, student_subjects_to_add)
@@ -4,6 +4,7 @@ from sqlalchemy.future import select
 from fastapi import HTTPException, status
 from app.db.models.ward import Ward as WardModel
 from app.db.schemas.ward import WardCreate, Ward
+from app.services.location_service import location_cache
 from uuid6 import uuid6
 
 async def create_ward(db: AsyncSession, ward: WardCreate) -> Ward:
@@ -18,6 +19,7 @@ async def create_ward(db: AsyncSession, ward: WardCreate) -> Ward:
     db_ward = WardModel(**ward_data)
     db.add(db_ward)
     await db.commit()
+    location_cache.invalidate()
     await db.refresh(db_ward)
     return Ward.model_validate(db_ward)
 
@@ -0,0 +1,79 @@
+import aiomysql
+import numpy as np
+import pandas as pd
+import pytest
+from uuid6 import uuid6
+from utils.processor.columnar import read_frame
+from utils.processor.snapshot_cache import SNAPSHOT_TABLES
+
+KINDS = {'id': 'text', 'centre_number': 'str', 'subject_code': 'category', 'overall_marks': 'float'}
+
+
+class FakeSSCursor:
+    """Unbuffered cursor over fixed rows, handing them out through ``fetchmany`` like aiomysql's SSCursor."""
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.description = [(name,) for name in columns]
+        self.position = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.position = 0
+
+    async def fetchmany(self, size):
+        rows = self.rows[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.cursor_classes = []
+
+    def cursor(self, cursor_class=None):
+        self.cursor_classes.append(cursor_class)
+        return FakeSSCursor(self.rows, self.columns)
+
+
+def student_subject_rows(n_rows):
+    # Primary keys are uuid6 strings, as in student_subjects.id
+    return [
+        (str(uuid6()), f"S{i % 3:04d}", f"0{i % 2}1", None if i % 5 == 0 else float(i))
+        for i in range(n_rows)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_read_frame_streams_uuid_primary_keys():
+    rows = student_subject_rows(25)
+    conn = FakeConnection(rows, list(KINDS))
+    frame = await read_frame(conn, "SELECT ...", ('exam-1',), KINDS, chunk_size=4, expected_rows=3)
+
+    assert conn.cursor_classes == [aiomysql.SSCursor]
+    assert frame['id'].tolist() == [row[0] for row in rows]
+    assert frame['id'].dtype == object
+    assert frame['centre_number'].tolist() == [row[1] for row in rows]
+    assert isinstance(frame['subject_code'].dtype, pd.CategoricalDtype)
+    assert frame['subject_code'].tolist() == [row[2] for row in rows]
+    marks = frame['overall_marks'].to_numpy()
+    assert np.isnan(marks[0]) and marks[1] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_read_frame_rejects_text_keys_read_as_integers():
+    conn = FakeConnection(student_subject_rows(3), list(KINDS))
+    with pytest.raises(ValueError):
+        await read_frame(conn, "SELECT ...", (), {**KINDS, 'id': 'int'})
+
+
+def test_snapshot_tables_read_ids_as_text():
+    table = SNAPSHOT_TABLES['student_subjects']
+    assert 'id' in table.keys and 'id' not in table.marks + table.categorical
@@ -0,0 +1,108 @@
+import re
+from contextlib import asynccontextmanager
+import aiomysql
+import pytest
+from uuid6 import uuid6
+from utils.excel import excel
+from utils.processor.bulk_writer import BulkColumnWriter
+
+EXAM = 'exam-1'
+SUBJECTS = ['011', '012', '013', '014', '015', '016', '017']
+TABLES = {
+    'exam_grades': [
+        {'exam_id': EXAM, 'grade': grade, 'lower_value': low, 'highest_value': high,
+         'grade_points': points, 'division_points': points}
+        for grade, low, high, points in [('A', 75, 100, 1), ('B', 65, 75, 2), ('C', 45, 65, 3), ('D', 30, 45, 4), ('F', -1, 30, 5)]
+    ],
+    'exam_divisions': [
+        {'exam_id': EXAM, 'division': division, 'lowest_points': low, 'highest_points': high}
+        for division, low, high in [('I', 7, 17), ('II', 18, 21), ('III', 22, 25), ('IV', 26, 33), ('0', 34, 35)]
+    ],
+    'exams': [{'exam_id': EXAM, 'avg_style': 'AUTO'}],
+    'schools': [
+        {'centre_number': 'S0001', 'region_name': 'R1', 'council_name': 'C1', 'ward_name': 'W1', 'school_type': 'GOVERNMENT'},
+        {'centre_number': 'S0002', 'region_name': 'R1', 'council_name': 'C1', 'ward_name': 'W2', 'school_type': 'PRIVATE'},
+    ],
+}
+
+
+def student_subject_rows():
+    """(id, exam_id, student_global_id, centre_number, overall_marks, subject_code) with uuid6 ids, as stored."""
+    marks = {'s1': [80, 78, 90, 76, 85, 79, 88], 's2': [50, 40, 66, 70, 20, 55, 61], 's3': [60, 70, 80]}
+    centres = {'s1': 'S0001', 's2': 'S0001', 's3': 'S0002'}
+    return [
+        (str(uuid6()), EXAM, student, centres[student], float(mark), code)
+        for student, student_marks in marks.items() for code, mark in zip(SUBJECTS, student_marks)
+    ]
+
+
+class FakeCursor:
+    def __init__(self, rows_by_table, ss_rows):
+        self.rows_by_table = rows_by_table
+        self.ss_rows = ss_rows
+        self.rows = []
+        self.description = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        if 'FROM student_subjects' in query:
+            self.rows = list(self.ss_rows)
+            self.description = [(name,) for name in range(6)]
+            return
+        self.rows = list(self.rows_by_table[re.search(r'FROM (\w+)', query).group(1)])
+
+    async def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    async def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class FakeConnection:
+    def __init__(self, ss_rows):
+        self.ss_rows = ss_rows
+        self.cursor_classes = []
+
+    def cursor(self, cursor_class=None):
+        self.cursor_classes.append(cursor_class)
+        return FakeCursor(TABLES, self.ss_rows)
+
+
+@pytest.mark.asyncio
+async def test_process_exam_results_reads_uuid_ids_and_writes_grades_and_results(monkeypatch):
+    rows = student_subject_rows()
+    conn = FakeConnection(rows)
+
+    class FakePools:
+        @asynccontextmanager
+        async def acquire(self, autocommit=False):
+            yield conn
+
+    writes = []
+
+    async def write(self, connection, df):
+        writes.append((self.table, df.copy()))
+        return {'rows': len(df), 'seconds': 0.0}
+
+    monkeypatch.setattr(excel, 'db_pools', FakePools())
+    monkeypatch.setattr(BulkColumnWriter, 'write', write)
+
+    await excel.process_exam_results(EXAM)
+
+    assert aiomysql.SSCursor in conn.cursor_classes
+    assert [table for table, _ in writes] == ['student_subjects', 'results']
+    grades = writes[0][1]
+    assert grades['id'].tolist() == [row[0] for row in rows]
+    assert grades.set_index('id').loc[rows[0][0], 'subject_grade'] == 'A'
+
+    results = writes[1][1].set_index('student_global_id')
+    assert results.loc['s1', 'division'] == 'I'
+    assert results.loc['s3', 'division'] == 'INC'
+    assert results.loc['s1', 'pos'] == 1
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from utils.excel import excel
+
+
+class FakeCursor:
+    def __init__(self, records):
+        self.records = records
+
+    async def execute(self, query, params=None):
+        pass
+
+    async def fetchmany(self, size):
+        records, self.records = self.records[:size], self.records[size:]
+        return records
+
+    async def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, records):
+        self.records = records
+
+    async def cursor(self, cursor_class=None):
+        return FakeCursor(self.records)
+
+
+class FakePools:
+    def __init__(self, records):
+        self.records = records
+        self.released = 0
+
+    async def checkout(self, autocommit=False):
+        return FakeConnection(self.records)
+
+    async def release(self, conn):
+        self.released += 1
+
+
+def school_records(n_schools):
+    # Only the centre number (7) and school name (8) matter to the export loop
+    return [(None,) * 7 + (f"S{i:04d}", f"School {i}") for i in range(n_schools) for _ in range(2)]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_schools_export_waits_for_builds_and_removes_its_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    started = threading.Event()
+    finished = []
+
+    def build_entry_workbook(save_path, exam_id, practical_mode, marks_filler, records):
+        started.set()
+        time.sleep(0.2)
+        with open(save_path, "wb") as workbook:
+            workbook.write(b"xlsm")
+        finished.append(save_path)
+        return save_path, len(records), 0.2
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(excel, "db_pools", FakePools(school_records(6)))
+    monkeypatch.setattr(excel, "get_process_pool", lambda: pool)
+    monkeypatch.setattr(excel, "build_entry_workbook", build_entry_workbook)
+
+    export = asyncio.ensure_future(excel.export_schools_to_zip("exam-1", region_name="R1"))
+    await asyncio.to_thread(started.wait, 5)
+    export.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await export
+    pool.shutdown(wait=True)
+
+    # Builds that were running finished before cleanup, and none of their output is left behind
+    assert finished
+    assert os.listdir(tmp_path / "output") == []
@@ -0,0 +1,78 @@
+import pytest
+from fastapi import status
+from uuid6 import uuid6
+
+@pytest.mark.asyncio
+async def test_create_job_unauthorized(client):
+    job_data = {"job_type": "export_excel", "params": {"exam_id": str(uuid6())}}
+    response = await client.post("/api/v1/jobs/", json=job_data)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_get_job_unauthorized(client):
+    response = await client.get(f"/api/v1/jobs/{uuid6()}")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_cancel_job_unauthorized(client):
+    response = await client.post(f"/api/v1/jobs/{uuid6()}/cancel")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_create_job_unknown_type(client, login_token):
+    headers = {"Authorization": f"Bearer {login_token}"}
+    response = await client.post("/api/v1/jobs/", json={"job_type": "unknown", "params": {}}, headers=headers)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+@pytest.mark.asyncio
+async def test_get_job_result_unauthorized(client):
+    response = await client.get(f"/api/v1/jobs/{uuid6()}/result")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_get_job_not_found(client, login_token):
+    headers = {"Authorization": f"Bearer {login_token}"}
+    response = await client.get(f"/api/v1/jobs/{uuid6()}", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        rows = self.rows
+
+        class Result:
+            def all(self):
+                return rows
+        return Result()
+
+    async def commit(self):
+        pass
+
+@pytest.mark.asyncio
+async def test_job_runner_start_fails_jobs_left_with_its_own_worker_id(monkeypatch):
+    from types import SimpleNamespace
+    from app.services import job_service
+
+    rows = [
+        SimpleNamespace(job_id="reused-pid", worker=job_service.WORKER_ID),
+        SimpleNamespace(job_id="other-host", worker="elsewhere:1"),
+    ]
+    session = FakeSession(rows)
+    monkeypatch.setattr(job_service, "AsyncSessionLocal", lambda: session)
+    runner = job_service.JobRunner(max_workers=1, poll_interval=60)
+    await runner.start()
+    runner._watcher.cancel()
+
+    update = session.statements[-1]
+    assert update.is_update
+    assert update.compile().params["job_id_1"] == ["reused-pid"]
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from utils.excel.excel import find_conflicting_marks, prepare_marks_frame
+
+EXAM = 'exam-1'
+
+
+def students_sheet(rows):
+    return pd.DataFrame(rows, columns=['exam_id', 'student_global_id', 'subject_code', 'marks'])
+
+
+def marks(rows):
+    return pd.DataFrame(rows, columns=['student_global_id', 'subject_code', 'theory_marks', 'practical_marks'])
+
+
+def test_prepare_marks_frame_splits_practical_rows():
+    frame = prepare_marks_frame(students_sheet([
+        (EXAM, 's1', '033', 60),
+        (EXAM, 's1', '033-P', 25),
+        (EXAM, 's1', '011', '48'),
+        (EXAM, 's2', '033-P', 30),
+    ])).set_index(['student_global_id', 'subject_code'])
+    assert len(frame) == 3
+    assert frame.loc[('s1', '033'), ['theory_marks', 'practical_marks']].tolist() == [60, 25]
+    assert frame.loc[('s1', '011'), 'theory_marks'] == 48
+    assert np.isnan(frame.loc[('s1', '011'), 'practical_marks'])
+    assert np.isnan(frame.loc[('s2', '033'), 'theory_marks'])
+    assert frame.loc[('s2', '033'), 'practical_marks'] == 30
+
+
+def test_prepare_marks_frame_keeps_first_non_null_mark():
+    frame = prepare_marks_frame(students_sheet([
+        (EXAM, 's1', '011', None),
+        (EXAM, 's1', '011', 'ABS'),
+        (EXAM, 's1', '011', 55),
+        (EXAM, 's1', '011', 70),
+        (EXAM, 's1', '033-P', None),
+        (EXAM, 's1', '033-P', 20),
+        (EXAM, None, '011', 90),
+        (EXAM, 's2', None, 90),
+    ])).set_index(['student_global_id', 'subject_code'])
+    assert len(frame) == 2
+    assert frame.loc[('s1', '011'), 'theory_marks'] == 55
+    assert frame.loc[('s1', '033'), 'practical_marks'] == 20
+
+
+def test_find_conflicting_marks_collapses_identical_duplicates():
+    rows, conflicts = find_conflicting_marks(marks([
+        ('s1', '011', 55.0, np.nan),
+        ('s1', '011', 55.0, np.nan),
+        ('s2', '033', 40.0, 20.0),
+    ]))
+    assert conflicts.empty
+    assert rows[['student_global_id', 'subject_code']].values.tolist() == [['s1', '011'], ['s2', '033']]
+
+
+def test_find_conflicting_marks_holds_back_differing_duplicates():
+    rows, conflicts = find_conflicting_marks(marks([
+        ('s1', '011', 55.0, np.nan),
+        ('s2', '033', 40.0, 20.0),
+        ('s1', '011', 56.0, np.nan),
+        ('s2', '033', 40.0, 21.0),
+        ('s3', '011', 70.0, np.nan),
+        ('s3', '011', 70.0, np.nan),
+    ]))
+    assert rows[['student_global_id', 'subject_code']].values.tolist() == [['s3', '011']]
+    assert len(conflicts) == 4
+    assert conflicts[['student_global_id', 'subject_code']].values.tolist() == [
+        ['s1', '011'], ['s1', '011'], ['s2', '033'], ['s2', '033']
+    ]
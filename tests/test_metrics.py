@@ -0,0 +1,14 @@
+import pytest
+from fastapi import status
+
+@pytest.mark.asyncio
+async def test_db_pool_metrics_unauthorized(client):
+    response = await client.get("/api/v1/metrics/db-pool")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_db_pool_metrics(client, login_token):
+    headers = {"Authorization": f"Bearer {login_token}"}
+    response = await client.get("/api/v1/metrics/db-pool", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert "raw_pool" in response.json()
@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils.processor import pipeline
+from utils.processor.pipeline import (
+    CENTRE_TABLES, RESULT_KEY, STAGES, STORED_QUERIES, ExamPipeline, centre_change_log, changed_centres,
+    compute_subject_grades, values_differ
+)
+
+EXAM = 'exam-1'
+SUBJECTS = ['011', '012', '013', '014', '015', '016', '017', '018']
+# Centre: region, council, ward, school type
+CENTRES = {
+    'S0001': ('R1', 'C1', 'W1', 'GOVERNMENT'),
+    'S0002': ('R1', 'C1', 'W1', 'PRIVATE'),
+    'S0003': ('R1', 'C2', 'W2', 'GOVERNMENT'),
+    'S0004': ('R2', 'C3', 'W3', 'PRIVATE'),
+}
+GRADES = pd.DataFrame(
+    [
+        (EXAM, 'A', 75.0, 100.0, 1.0, 1),
+        (EXAM, 'B', 65.0, 75.0, 2.0, 2),
+        (EXAM, 'C', 45.0, 65.0, 3.0, 3),
+        (EXAM, 'D', 30.0, 45.0, 4.0, 4),
+        (EXAM, 'F', 0.0, 30.0, 5.0, 5),
+    ],
+    columns=['exam_id', 'grade', 'lower_value', 'highest_value', 'grade_points', 'division_points']
+)
+
+
+def make_snapshot():
+    rng = np.random.default_rng(7)
+    students, subjects = [], []
+    for centre in CENTRES:
+        for n in range(6):
+            student = f'{centre}-{n}'
+            students.append((student, f'{centre}/{n:04d}', f'Student {student}', 'FM'[n % 2], EXAM, centre))
+            # Only S0004 sits 018; the first student of every centre misses subjects and is INC
+            codes = SUBJECTS if centre == 'S0004' else SUBJECTS[:7]
+            for code in codes[:5] if n == 0 else codes:
+                # Whole marks, so students tie
+                theory = float(rng.integers(20, 100))
+                practical = float(rng.integers(0, 50)) if code == '013' else None
+                subjects.append((f'{student}-{code}', EXAM, student, centre, code, theory, practical))
+    return {
+        'student_subjects': pd.DataFrame(subjects, columns=[
+            'id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code', 'theory_marks', 'practical_marks'
+        ]),
+        'students': pd.DataFrame(students, columns=[
+            'student_global_id', 'student_id', 'full_name', 'sex', 'exam_id', 'centre_number'
+        ]),
+        'schools': pd.DataFrame(
+            [(centre,) + location for centre, location in CENTRES.items()],
+            columns=['centre_number', 'region_name', 'council_name', 'ward_name', 'school_type']
+        ),
+        'exams': pd.DataFrame([(EXAM, 'AUTO')], columns=['exam_id', 'avg_style']),
+        'exam_subjects': pd.DataFrame(
+            [(EXAM, code, code == '013') for code in SUBJECTS], columns=['exam_id', 'subject_code', 'has_practical']
+        ),
+        'exam_grades': GRADES,
+        'exam_divisions': pd.DataFrame(
+            [(EXAM, 'I', 7, 17), (EXAM, 'II', 18, 21), (EXAM, 'III', 22, 25), (EXAM, 'IV', 26, 33), (EXAM, '0', 34, 35)],
+            columns=['exam_id', 'division', 'lowest_points', 'highest_points']
+        ),
+    }
+
+
+def centre_digests(snapshot):
+    """In-memory stand-in for the per-centre digests the database computes."""
+    digests = {}
+    for name in CENTRE_TABLES:
+        frame = snapshot[name]
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        groups = pd.DataFrame({'centre_number': frame['centre_number'], 'hash': hashes}).groupby('centre_number')['hash']
+        digests[name] = pd.DataFrame({
+            'centre_number': groups.size().index,
+            'rows': groups.size().to_numpy(),
+            'digest': groups.agg(lambda values: np.bitwise_xor.reduce(values.to_numpy())).to_numpy(),
+        })
+    return digests
+
+
+class FakeDatabase:
+    """The student_subjects and results columns the pipeline writes, keyed like their tables."""
+
+    def __init__(self, snapshot):
+        keys = ['id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code']
+        self.tables = {
+            'student_subjects': {row['id']: dict(row) for row in snapshot['student_subjects'][keys].to_dict('records')},
+            'results': {},
+        }
+
+    def copy(self):
+        clone = FakeDatabase.__new__(FakeDatabase)
+        clone.tables = {name: {key: dict(row) for key, row in rows.items()} for name, rows in self.tables.items()}
+        return clone
+
+    def apply(self, writes):
+        rows = 0
+        for writer, frame in writes:
+            key = ['id'] if writer.table == 'student_subjects' else list(RESULT_KEY)
+            table = self.tables[writer.table]
+            columns = key + [col for col in writer.columns if col not in key]
+            for record in frame[columns].astype(object).to_dict('records'):
+                values = {col: None if pd.isna(value) else value for col, value in record.items()}
+                table.setdefault(tuple(values[col] for col in key) if len(key) > 1 else values['id'], {}).update(values)
+                rows += 1
+        return rows
+
+    def frame(self, name):
+        columns = STORED_QUERIES[name][1]
+        return pd.DataFrame(
+            [tuple(row.get(col) for col in columns) for row in self.tables[name].values()], columns=columns
+        )
+
+
+def run_stages(exam_pipeline, db):
+    return sum(db.apply(getattr(exam_pipeline, stage)()) for stage in STAGES)
+
+
+def run_full(snapshot, db):
+    exam_pipeline = ExamPipeline(EXAM)
+    exam_pipeline.snapshot = {name: frame.copy() for name, frame in snapshot.items()}
+    exam_pipeline.prepare()
+    return run_stages(exam_pipeline, db)
+
+
+def assert_same_tables(db, expected):
+    for name, key in (('student_subjects', ['id']), ('results', list(RESULT_KEY))):
+        actual_frame = db.frame(name).sort_values(key, ignore_index=True)
+        expected_frame = expected.frame(name).sort_values(key, ignore_index=True)
+        assert actual_frame[key].equals(expected_frame[key])
+        differ = values_differ(actual_frame, expected_frame)
+        assert not differ.any(), actual_frame.loc[differ]
+
+
+def test_compute_subject_grades_prefers_the_first_band_on_a_shared_boundary():
+    grades = compute_subject_grades(pd.Series([75.0, 74.5, 30.0, None, 101.0]), GRADES)
+    assert grades.tolist() == ['A', 'B', 'D', None, None]
+    assert compute_subject_grades(pd.Series([75.0]), GRADES.iloc[::-1]).tolist() == ['B']
+
+
+@pytest.mark.asyncio
+async def test_incremental_run_writes_the_same_values_as_a_full_run(monkeypatch):
+    old = make_snapshot()
+    db_old = FakeDatabase(old)
+    run_full(old, db_old)
+
+    new = {name: frame.copy() for name, frame in old.items()}
+    subjects = new['student_subjects']
+    # S0002 marks change and tie with other centres; an S0003 student's sex changes
+    subjects.loc[subjects['centre_number'] == 'S0002', 'theory_marks'] = 80.0
+    subjects.loc[subjects['id'] == 'S0002-2-012', 'theory_marks'] = None
+    new['students'].loc[new['students']['student_global_id'] == 'S0003-3', 'sex'] = 'F'
+
+    previous = centre_change_log(old, centre_digests(old))
+    current = centre_change_log(new, centre_digests(new))
+    assert changed_centres(previous, current) == {'S0002', 'S0003'}
+    assert changed_centres(previous, centre_change_log(old, centre_digests(old))) == set()
+
+    db_full = db_old.copy()
+    full_rows = run_full(new, db_full)
+
+    loaded = {}
+
+    async def load_snapshot(exam_id, queries, filters=None):
+        frames = {}
+        for name, (query, columns) in queries.items():
+            stored = query == STORED_QUERIES.get(name, (None,))[0]
+            frame = db_old.frame(name) if stored else new[name][columns]
+            if filters and name in filters:
+                column, values = filters[name]
+                frame = frame[frame[column].isin(values)]
+            frames[name] = loaded[('stored' if stored else 'input', name)] = frame.reset_index(drop=True)
+        return frames
+
+    monkeypatch.setattr(pipeline, 'load_snapshot', load_snapshot)
+    db_incremental = db_old.copy()
+    exam_pipeline = ExamPipeline(EXAM, incremental=True)
+    exam_pipeline.snapshot = {name: new[name].copy() for name in pipeline.EXAM_TABLES + ('schools',)}
+    exam_pipeline.changed = changed_centres(previous, current)
+    await exam_pipeline.load_inputs()
+    exam_pipeline.prepare()
+    incremental_rows = run_stages(exam_pipeline, db_incremental)
+
+    # Only the inputs of changed centres, and stored rows of the subjects they sit, are read
+    assert set(loaded[('input', 'student_subjects')]['centre_number']) == {'S0002', 'S0003'}
+    assert '018' not in set(loaded[('stored', 'student_subjects')]['subject_code'])
+    assert 0 < incremental_rows < full_rows
+    assert_same_tables(db_incremental, db_full)
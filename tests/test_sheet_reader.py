@@ -0,0 +1,89 @@
+import zipfile
+import numpy as np
+import pytest
+from utils.excel import sheet_reader
+from utils.excel.sheet_reader import iter_sheet_columns
+
+WORKBOOK = (
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Students" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+RELS = (
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="worksheet" Target="worksheets/sheet1.xml"/></Relationships>'
+)
+SHARED = (
+    '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<si><t>Amina</t></si><si><r><t>Baraka </t></r><r><t>Juma</t></r></si></sst>'
+)
+COLUMNS = ['student_id', 'full_name', 'sex', 'marks']
+
+
+def write_workbook(path, rows, shared=True):
+    sheet = (
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        + ''.join(f'<row r="{number}">{cells}</row>' for number, cells in rows)
+        + '</sheetData></worksheet>'
+    )
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/workbook.xml', WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', RELS)
+        archive.writestr('xl/worksheets/sheet1.xml', sheet)
+        if shared:
+            archive.writestr('xl/sharedStrings.xml', SHARED)
+    return str(path)
+
+
+def read_all(path, **kwargs):
+    blocks = list(iter_sheet_columns(path, columns=COLUMNS, **kwargs))
+    return {name: np.concatenate([block[name] for block in blocks]) for name in COLUMNS}
+
+
+def test_shared_and_inline_strings(tmp_path):
+    path = write_workbook(tmp_path / 'book.xlsx', [
+        (1, '<c r="A1" t="inlineStr"><is><t>student_id</t></is></c>'),
+        (2, '<c r="A2" t="inlineStr"><is><t>S0101/0001</t></is></c><c r="B2" t="s"><v>0</v></c>'
+            '<c r="C2" t="str"><v>F</v></c><c r="D2"><v>75</v></c>'),
+        (3, '<c r="A3" t="inlineStr"><is><t>S0101/0002</t></is></c><c r="B3" t="s"><v>1</v></c>'
+            '<c r="C3" t="inlineStr"><is><r><t>M</t></r></is></c><c r="D3" t="inlineStr"><is><t>ABS</t></is></c>'),
+        (4, '<c r="A4" t="inlineStr"><is><t>Tom &amp; Jerry</t></is></c><c r="D4"><v>40.5</v></c>'),
+    ])
+    data = read_all(path)
+    assert list(data['student_id']) == ['S0101/0001', 'S0101/0002', 'Tom & Jerry']
+    assert list(data['full_name']) == ['Amina', 'Baraka Juma', None]
+    assert list(data['sex']) == ['F', 'M', None]
+    assert data['marks'].dtype == np.float64
+    assert data['marks'][0] == 75 and np.isnan(data['marks'][1]) and data['marks'][2] == 40.5
+
+
+def test_rows_split_across_read_slices(tmp_path, monkeypatch):
+    rows = [(1, '<c r="A1" t="inlineStr"><is><t>header</t></is></c>')]
+    for number in range(2, 202):
+        rows.append((number, f'<c r="A{number}" t="inlineStr"><is><t>Ndugu Ñ{number}</t></is></c><c r="D{number}"><v>{number % 101}</v></c>'))
+    path = write_workbook(tmp_path / 'book.xlsx', rows, shared=False)
+    # Slices far smaller than a row, so rows, cells and multi-byte characters are cut between reads
+    monkeypatch.setattr(sheet_reader, 'READ_BYTES', 37)
+    data = read_all(path, chunk_rows=64)
+    assert list(data['student_id']) == [f'Ndugu Ñ{number}' for number in range(2, 202)]
+    assert list(data['marks']) == [float(number % 101) for number in range(2, 202)]
+
+
+def test_sparse_cells(tmp_path):
+    path = write_workbook(tmp_path / 'book.xlsx', [
+        (1, '<c r="A1" t="inlineStr"><is><t>student_id</t></is></c>'),
+        (2, '<c r="A2" t="inlineStr"><is><t>S1</t></is></c><c r="D2"><v>10</v></c>'),
+        (3, '<c r="B3" s="1"/><c r="C3" t="str"><v>M</v></c><c r="O3"><v>99</v></c>'),
+        (5, '<c r="D5"><v>0</v></c>'),
+    ], shared=False)
+    data = read_all(path)
+    assert list(data['student_id']) == ['S1', None, None]
+    assert list(data['full_name']) == [None, None, None]
+    assert list(data['sex']) == [None, 'M', None]
+    assert data['marks'][0] == 10 and np.isnan(data['marks'][1]) and data['marks'][2] == 0
+
+
+def test_missing_sheet(tmp_path):
+    path = write_workbook(tmp_path / 'book.xlsx', [])
+    with pytest.raises(KeyError):
+        list(iter_sheet_columns(path, sheet_name='Subjects', columns=COLUMNS))
@@ -114,3 +114,14 @@ async def test_create_student_subject_unauthorized(client):
     }
     response = await client.post("/api/v1/student-subjects/", json=subject_data)
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_export_excel_schools_unauthorized(client):
+    response = await client.get("/api/v1/student-subjects/export/excel/schools", params={"exam_id": str(uuid6())})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_import_marks_bulk_unauthorized(client):
+    files = [("files", ("S1869.xlsm", b"not a workbook", "application/vnd.ms-excel.sheet.macroEnabled.12"))]
+    response = await client.post("/api/v1/student-subjects/import/marks/bulk", files=files)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
@@ -1,10 +1,13 @@
 import asyncio
+import concurrent.futures
 import os
 import shutil
+import tempfile
 from datetime import datetime
 import time
+import zipfile
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 import aiomysql
 from dotenv import load_dotenv
 import numpy as np
@@ -14,6 +17,14 @@ import pandas as pd
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.sql import text
 from uuid6 import uuid6
+from app.db.database import db_pools
+from utils.processor.bulk_writer import BulkColumnWriter
+from utils.processor.columnar import read_frame
+from utils.processor.lookup import first_matching_band
+from utils.processor.ranking import RankLevel, rank_partitions
+from app.core.process_pool import get_process_pool
+from utils.excel.sheet_reader import read_students_sheet
+from utils.excel.stream_export import StreamingEntryWorkbook, build_entry_workbook
 
 # Load environment variables
 if not os.path.exists('.env'):
@@ -37,6 +48,12 @@ DB_CONFIG = {
     'maxsize': int(os.getenv('DB_POOL_SIZE', 5))
 }
 
+# Rows pulled per round trip from the server-side cursor during exports
+EXPORT_FETCH_SIZE = 5000
+
+# Schools building or waiting for a worker at once in a batch export; bounds the rows held in memory
+MAX_PENDING_EXPORTS = 16
+
 
 
 async def get_excel_workbook_name(
@@ -413,6 +430,101 @@ async def export_to_excel_Old(
             await pool.wait_closed()
 
 
+def build_export_query(
+    exam_id: str,
+    ward_name: str = "",
+    council_name: str = "",
+    region_name: str = "",
+    school_type: str = "",
+    practical_mode: int = 0,
+    centre_number: str = "",
+    centre_number_list: List[str] = [],
+    order_by: str = "st.student_id ASC, es.subject_code ASC"
+) -> Tuple[str, List[Any], int]:
+    """
+    Build the entry-sheet export join for the given filters.
+
+    Returns the SQL (columns in ``EXPORT_COLUMNS`` order), its parameters and
+    the number of schools named in ``centre_number_list``.
+    """
+    # Build WHERE clause with parameterized query
+    where_clause = "WHERE es.exam_id = %s"
+    params = [exam_id]
+    location_filter = []
+    if ward_name:
+        location_filter.append("s.ward_name = %s")
+        params.append(ward_name)
+    if council_name:
+        location_filter.append("s.council_name = %s")
+        params.append(council_name)
+    if region_name:
+        location_filter.append("s.region_name = %s")
+        params.append(region_name)
+    if school_type:
+        location_filter.append("s.school_type = %s")
+        params.append(school_type)
+    
+    if location_filter:
+        where_clause += " AND " + " AND ".join(location_filter)
+    
+    if practical_mode == 2:  # ExportOnlyPracticalVersions
+        where_clause += " AND es.has_practical = TRUE"
+    
+    if centre_number:
+        # No need to use any location filter other than it as it has all
+        where_clause += " AND s.centre_number = %s"
+        params.append(centre_number)
+
+    school_count = 0
+    if centre_number_list and not centre_number:
+        placeholders = ', '.join(['%s'] * len(centre_number_list))
+        where_clause += f" AND s.centre_number IN ({placeholders})"
+        params.extend(centre_number_list)
+        # Count Schools in the List
+        school_count = len(centre_number_list)
+
+    # SQL query with INNER JOINs, columns in EXPORT_COLUMNS order
+    sql = f"""
+    SELECT st.student_id, st.student_global_id, st.full_name, st.sex,
+           es.subject_code, es.subject_name, es.subject_short,
+           s.centre_number, s.school_name,
+           s.ward_name, s.council_name, s.region_name,
+           s.school_type, es.has_practical
+    FROM schools s
+    INNER JOIN students st ON s.centre_number = st.centre_number
+    INNER JOIN student_subjects ss ON st.student_global_id = ss.student_global_id AND st.exam_id = ss.exam_id
+    INNER JOIN exam_subjects es ON ss.exam_id = es.exam_id AND ss.subject_code = es.subject_code
+    {where_clause}
+    ORDER BY {order_by}
+    """
+    return sql, params, school_count
+
+
+def export_empty_message(
+    exam_id: str,
+    ward_name: str = "",
+    council_name: str = "",
+    region_name: str = "",
+    school_type: str = "",
+    practical_mode: int = 0
+) -> str:
+    """Error message for an export whose filters match no student."""
+    msg = "NO STUDENT REGISTERED FOR THIS CONDITION!"
+    if ward_name:
+        msg += f" WARD_NAME={ward_name}"
+    if council_name:
+        msg += f" COUNCIL={council_name}"
+    if region_name:
+        msg += f" REGION={region_name}"
+    if school_type:
+        msg += f" SCHOOL TYPE={school_type}"
+    if practical_mode != 0:
+        msg += f" PRACTICAL MODE={practical_mode}"
+    if exam_id:
+        msg += f" EXAM_ID={exam_id}"
+    return msg
+
+
 async def export_to_excel(
     exam_id: str,
     ward_name: str = "",
@@ -425,13 +537,11 @@ async def export_to_excel(
     centre_number_list:List[str] = [],
 ) -> str:
     """Export student data to an Excel file and return the file path."""
-    pool = None
     conn = None
     cursor = None
     
     try:
-        pool = await aiomysql.create_pool(**DB_CONFIG)
-        conn = await pool.acquire()
+        conn = await db_pools.checkout()
         cursor = await conn.cursor(aiomysql.DictCursor)
         
         # Debug: Check data existence
@@ -449,307 +559,46 @@ async def export_to_excel(
         student_subjects_count = (await cursor.fetchone())['count']
         logger.info(f"Found {student_subjects_count} student-subject mappings for exam_id={exam_id}")
         
-        # Build WHERE clause with parameterized query
-        where_clause = "WHERE es.exam_id = %s"
-        params = [exam_id]
-        location_filter = []
-        if ward_name:
-            location_filter.append("s.ward_name = %s")
-            params.append(ward_name)
-        if council_name:
-            location_filter.append("s.council_name = %s")
-            params.append(council_name)
-        if region_name:
-            location_filter.append("s.region_name = %s")
-            params.append(region_name)
-        if school_type:
-            location_filter.append("s.school_type = %s")
-            params.append(school_type)
-        
-        if location_filter:
-            where_clause += " AND " + " AND ".join(location_filter)
-        
-        if practical_mode == 2:  # ExportOnlyPracticalVersions
-            where_clause += " AND es.has_practical = TRUE"
-        
-        if centre_number:
-            # No need to use any location filter other than it as it has all
-            where_clause += " AND s.centre_number = %s"
-            params.append(centre_number)
-    
-        if centre_number:
-            # No need to use any location filter other than it as it has all
-            where_clause += " AND s.centre_number = %s"
-            params.append(centre_number)
-
-        school_count=0
-        if centre_number_list and not centre_number:  # use elif to avoid conflict with single centre_number
-            placeholders = ', '.join(['%s'] * len(centre_number_list))
-            where_clause += f" AND s.centre_number IN ({placeholders})"
-            params.extend(centre_number_list)
-            # Count Schools in the List
-            school_count= len(centre_number_list)
-
-        # SQL query with INNER JOINs
-        sql = f"""
-        SELECT st.student_id, st.student_global_id, st.full_name, st.sex,
-               es.subject_code, es.subject_name, es.subject_short,
-               s.centre_number, s.school_name,
-               s.ward_name, s.council_name, s.region_name,
-               s.school_type, es.has_practical
-        FROM schools s
-        INNER JOIN students st ON s.centre_number = st.centre_number
-        INNER JOIN student_subjects ss ON st.student_global_id = ss.student_global_id AND st.exam_id = ss.exam_id
-        INNER JOIN exam_subjects es ON ss.exam_id = es.exam_id AND ss.subject_code = es.subject_code
-        {where_clause}
-        ORDER BY st.student_id ASC, es.subject_code ASC
-        """
-        
-        await cursor.execute(sql, params)
-        records = await cursor.fetchall()
-        
-        # Error message for empty result
-        msg = "NO STUDENT REGISTERED FOR THIS CONDITION!"
-        if ward_name:
-            msg += f" WARD_NAME={ward_name}"
-        if council_name:
-            msg += f" COUNCIL={council_name}"
-        if region_name:
-            msg += f" REGION={region_name}"
-        if school_type:
-            msg += f" SCHOOL TYPE={school_type}"
-        if practical_mode != 0:
-            msg += f" PRACTICAL MODE={practical_mode}"
-        if exam_id:
-            msg += f" EXAM_ID={exam_id}"
-        
-        if not records:
-            logger.error(f"Error 1002: {msg}")
-            raise ValueError(msg)
-        
-        # Initialize dictionaries for subjects and schools
-        subject_dict = {}
-        school_dict = {}
-        data_array = []
-        
-        # Process records
-        prev = None
-        for record in records:
-            prev != record['centre_number'] and logger.info(f"centre_number changed: {record['centre_number']}") or True
-            prev = record['centre_number']
-            
-            school_key = (
-                f"{record['centre_number'] or ''}|{record['school_name'] or ''}|"
-                f"{record['ward_name'] or ''}|{record['council_name'] or ''}|"
-                f"{record['region_name'] or ''}|{record['school_type'] or ''}"
-            )
-            
-            if practical_mode != 2:  # Not ExportOnlyPracticalVersions
-                # Add theory row
-                data_array.append([
-                    record['student_id'] or '',
-                    record['full_name'] or '',
-                    record['sex'] or '',
-                    '',
-                    str(record['subject_code'] or ''),
-                    record['subject_name'] or '',
-                    record['subject_short'] or '',
-                    record['centre_number'] or '',
-                    record['school_name'] or '',
-                    record['ward_name'] or '',
-                    record['council_name'] or '',
-                    record['region_name'] or '',
-                    exam_id,
-                    record['student_global_id'] or ''
-                ])
-                
-                subj_key = (
-                    f"{record['subject_code'] or ''}|{record['subject_name'] or ''}|"
-                    f"{record['subject_short'] or ''}"
-                )
-                if subj_key not in subject_dict:
-                    subject_dict[subj_key] = [
-                        str(record['subject_code'] or ''),
-                        record['subject_name'] or '',
-                        record['subject_short'] or '',
-                        0, 0
-                    ]
-                subject_dict[subj_key][3] += 1
-                
-                if school_key not in school_dict:
-                    school_dict[school_key] = [
-                        record['centre_number'] or '',
-                        record['school_name'] or '',
-                        record['ward_name'] or '',
-                        record['council_name'] or '',
-                        record['region_name'] or '',
-                        0, 0
-                    ]
-                school_dict[school_key][5] += 1
-            
-            if record['has_practical'] and practical_mode != 1:  # Not ExportWithoutPractical
-                # Add practical row
-                data_array.append([
-                    record['student_id'] or '',
-                    record['full_name'] or '',
-                    record['sex'] or '',
-                    '',
-                    f"{record['subject_code'] or ''}-P",
-                    f"{record['subject_name'] or ''}-Practical",
-                    f"{record['subject_short'] or ''}-P",
-                    record['centre_number'] or '',
-                    record['school_name'] or '',
-                    record['ward_name'] or '',
-                    record['council_name'] or '',
-                    record['region_name'] or '',
-                    exam_id,
-                    record['student_global_id'] or ''
-                ])
-                
-                prac_subj_key = (
-                    f"{record['subject_code'] or ''}-P|"
-                    f"{record['subject_name'] or ''}-Practical|"
-                    f"{record['subject_short'] or ''}-P"
-                )
-                if prac_subj_key not in subject_dict:
-                    subject_dict[prac_subj_key] = [
-                        f"{record['subject_code'] or ''}-P",
-                        f"{record['subject_name'] or ''}-Practical",
-                        f"{record['subject_short'] or ''}-P",
-                        0, 0
-                    ]
-                subject_dict[prac_subj_key][3] += 1
-                
-                if school_key not in school_dict:
-                    school_dict[school_key] = [
-                        record['centre_number'] or '',
-                        record['school_name'] or '',
-                        record['ward_name'] or '',
-                        record['council_name'] or '',
-                        record['region_name'] or '',
-                        0, 0
-                    ]
-                school_dict[school_key][5] += 1
-        
-        # Copy master.xlsm to output
-        original_file = os.path.join(os.path.dirname(__file__), "master.xlsm")
-        if not os.path.exists(original_file):
-            logger.error("Error 1001: master.xlsm not found!")
-            raise FileNotFoundError("master.xlsm not found!")
-        
-        os.makedirs("./output", exist_ok=True)
-        save_path = os.path.join(
-            "./output",
-            f"{await get_excel_workbook_name(
-                ward_name, 
-            council_name, 
-            region_name, 
-            school_type, 
-            practical_mode,
-            centre_number, 
-            record['school_name'],
-            school_count
-            )}.xlsm"
-        )
-        
-        shutil.copyfile(original_file, save_path)
-        
-        # Open Excel workbook
-        workbook = openpyxl.load_workbook(save_path, keep_vba=True)
-        students_sheet = workbook["Students"]
-        subjects_sheet = workbook["Subjects"]
-        schools_sheet = workbook["Schools"]
-        interface_sheet = workbook["Interface"]
-        
-        # Clear Interface!A500 or set marks_filler
-        interface_sheet["A500"] = marks_filler if marks_filler else ""
-        
-        # Set number formats
-        students_sheet.column_dimensions["E"].number_format = "@"
-        subjects_sheet.column_dimensions["A"].number_format = "@"
-        
-        # Write student data using chunks to avoid memory issues
-        chunk_size = 1000
-        if data_array:
-            for chunk_start in range(0, len(data_array), chunk_size):
-                chunk = data_array[chunk_start:chunk_start + chunk_size]
-                for i, row in enumerate(chunk, start=2 + chunk_start):
-                    for j, value in enumerate(row, start=1):
-                        students_sheet.cell(row=i, column=j).value = value
-            table1 = students_sheet.tables.get("Table1")
-            if table1:
-                table1.ref = f"A1:N{len(data_array) + 1}"  # Updated to include column N
-        else:
-            students_sheet["A2:N2"] = [""] * 14  # Updated to include column N
-            table1 = students_sheet.tables.get("Table1")
-            if table1:
-                table1.ref = "A1:N2"
-        
-        # Write subjects data
-        row_index = 2
-        for subj_data in subject_dict.values():
-            subjects_sheet[f"A{row_index}"] = subj_data[0]
-            subjects_sheet[f"B{row_index}"] = subj_data[2]
-            subjects_sheet[f"C{row_index}"] = subj_data[1]
-            subjects_sheet[f"D{row_index}"] = f"=COUNTIFS(Students!E:E,A{row_index})"
-            subjects_sheet[f"E{row_index}"] = f"=COUNTIFS(Students!E:E,A{row_index},Students!D:D,\">=0\")"
-            subjects_sheet[f"F{row_index}"] = f"=D{row_index}-E{row_index}"
-            subjects_sheet[f"G{row_index}"] = f"=IF(D{row_index}=0,\"N/A\",E{row_index}/D{row_index})"
-            row_index += 1
-        
-        if row_index > 2:
-            subjects_sheet[f"C{row_index}"] = "Total"
-            subjects_sheet[f"D{row_index}"] = f"=SUM(D2:D{row_index-1})"
-            subjects_sheet[f"E{row_index}"] = f"=SUM(E2:E{row_index-1})"
-            subjects_sheet[f"F{row_index}"] = f"=SUM(F2:F{row_index-1})"
-            subjects_sheet[f"G{row_index}"] = f"=IF(D{row_index}=0,\"N/A\",E{row_index}/D{row_index})"
-        
-        subjects_sheet.column_dimensions["G"].number_format = "0.0%"
-        
-        # Write schools data
-        row_index = 2
-        for school_data in school_dict.values():
-            schools_sheet[f"A{row_index}"] = school_data[0]
-            schools_sheet[f"B{row_index}"] = school_data[1]
-            schools_sheet[f"C{row_index}"] = school_data[2]  # ward_name
-            schools_sheet[f"D{row_index}"] = school_data[3]  # council_name
-            schools_sheet[f"E{row_index}"] = school_data[4]  # region_name
-            schools_sheet[f"F{row_index}"] = f"=COUNTIFS(Students!H:H,A{row_index})"
-            schools_sheet[f"G{row_index}"] = f"=COUNTIFS(Students!H:H,A{row_index},Students!D:D,\">=0\")"
-            schools_sheet[f"H{row_index}"] = f"=F{row_index}-G{row_index}"
-            schools_sheet[f"I{row_index}"] = f"=IF(F{row_index}=0,\"N/A\",G{row_index}/F{row_index})"
-            row_index += 1
-        
-        if row_index > 2:
-            schools_sheet[f"E{row_index}"] = "Total"
-            schools_sheet[f"F{row_index}"] = f"=SUM(F2:F{row_index-1})"
-            schools_sheet[f"G{row_index}"] = f"=SUM(G2:G{row_index-1})"
-            schools_sheet[f"H{row_index}"] = f"=SUM(H2:H{row_index-1})"
-            schools_sheet[f"I{row_index}"] = f"=IF(F{row_index}=0,\"N/A\",G{row_index}/F{row_index})"
-        
-        schools_sheet.column_dimensions["I"].number_format = "0.0%"
+        sql, params, school_count = build_export_query(
+            exam_id, ward_name, council_name, region_name, school_type,
+            practical_mode, centre_number, centre_number_list
+        )
         
-        # Create dropdowns in Interface sheet
-        centre_numbers = [str(school_data[0]) for school_data in school_dict.values() if school_data[0]]
-        if centre_numbers:
-            dv_centre = DataValidation(type="list", formula1=f'"{",".join(centre_numbers)}"', allow_blank=True)
-            dv_centre.add("C5")
-            interface_sheet.add_data_validation(dv_centre)
-            logger.debug(f"Added dropdown to Interface!C5 with {len(centre_numbers)} centre numbers")
+        # Stream the rows with a server-side cursor straight into the Students sheet spool;
+        # loading the template and building rows run in worker threads, off the event loop
+        workbook = await asyncio.to_thread(StreamingEntryWorkbook, exam_id, practical_mode)
+        await cursor.close()
+        cursor = await conn.cursor(aiomysql.SSCursor)
+        await cursor.execute(sql, params)
+        while True:
+            records = await cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not records:
+                break
+            await asyncio.to_thread(workbook.add_records, records)
+        
+        if not workbook.record_count:
+            workbook.close()
+            msg = export_empty_message(exam_id, ward_name, council_name, region_name, school_type, practical_mode)
+            logger.error(f"Error 1002: {msg}")
+            raise ValueError(msg)
         
-        subject_codes = [str(subj_data[0]) for subj_data in subject_dict.values() if subj_data[0]]
-        if subject_codes:
-            interface_sheet["C6"].number_format = "@"
-            dv_subject = DataValidation(type="list", formula1=f'"{",".join(subject_codes)}"', allow_blank=True)
-            dv_subject.add("C6")
-            interface_sheet.add_data_validation(dv_subject)
-            logger.debug(f"Added dropdown to Interface!C6 with {len(subject_codes)} subject codes")
+        os.makedirs("./output", exist_ok=True)
+        workbook_name = await get_excel_workbook_name(
+            ward_name,
+            council_name,
+            region_name,
+            school_type,
+            practical_mode,
+            centre_number,
+            workbook.last_school_name,
+            school_count
+        )
+        save_path = os.path.join("./output", f"{workbook_name}.xlsm")
         
-        # Save and close
-        workbook.save(save_path)
-        workbook.close()
+        row_count = workbook.row_count
+        await asyncio.to_thread(workbook.save, save_path, marks_filler)
         
-        logger.info(f"Export completed successfully to {save_path}")
+        logger.info(f"Export completed successfully to {save_path} ({row_count} student rows)")
         return save_path
     
     except aiomysql.Error as e:
@@ -761,13 +610,163 @@ async def export_to_excel(
     finally:
         if cursor:
             await cursor.close()
-        if conn and pool:
-            pool.release(conn)
-        if pool:
-            pool.close()
-            await pool.wait_closed()
+        if conn:
+            await db_pools.release(conn)
 
 
+
+async def export_schools_to_zip(
+    exam_id: str,
+    ward_name: str = "",
+    council_name: str = "",
+    region_name: str = "",
+    school_type: str = "",
+    practical_mode: int = 0,
+    marks_filler: str = "",
+    centre_number_list: List[str] = [],
+) -> Tuple[str, Dict[str, float]]:
+    """
+    Export one entry workbook per school into a single ZIP.
+
+    The export join runs once for the whole filter, ordered by centre, and the
+    rows are partitioned by ``centre_number`` as they stream in. Each school's
+    workbook is built on the shared process pool as soon as its rows are
+    complete, and finished workbooks are added to the ZIP as they arrive.
+
+    Returns the ZIP path and stats: ``workbooks``, ``rows``, the per-stage
+    timings in seconds (``build`` and ``zip`` are cumulative across workbooks
+    and overlap with ``fetch``; ``total`` is wall time) and
+    ``workbooks_per_second``.
+    """
+    start_time = time.perf_counter()
+    stats = {"workbooks": 0, "rows": 0, "fetch": 0.0, "build": 0.0, "zip": 0.0, "total": 0.0, "workbooks_per_second": 0.0}
+    conn = None
+    cursor = None
+    zip_file = None
+    pending = set()
+    # Process pool builds and ZIP writes in threads; neither stops when its task is cancelled
+    builds: List[concurrent.futures.Future] = []
+    zip_writes: List[asyncio.Future] = []
+
+    os.makedirs("./output", exist_ok=True)
+    zip_name = await get_excel_workbook_name(ward_name, council_name, region_name, school_type, practical_mode)
+    zip_path = os.path.join("./output", f"{zip_name}_SCHOOLS.zip")
+    build_dir = tempfile.mkdtemp(dir="./output")
+
+    export_pool = get_process_pool()
+    slots = asyncio.Semaphore(MAX_PENDING_EXPORTS)
+    zip_lock = asyncio.Lock()
+
+    async def collect(build: asyncio.Future):
+        try:
+            save_path, row_count, build_seconds = await build
+        finally:
+            slots.release()
+        stats["build"] += build_seconds
+        stats["rows"] += row_count
+        async with zip_lock:
+            zip_start = time.perf_counter()
+            # Workbooks are already compressed packages
+            write = asyncio.ensure_future(
+                asyncio.to_thread(zip_file.write, save_path, os.path.basename(save_path), zipfile.ZIP_STORED)
+            )
+            zip_writes.append(write)
+            await asyncio.shield(write)
+            stats["zip"] += time.perf_counter() - zip_start
+        os.remove(save_path)
+        stats["workbooks"] += 1
+
+    async def submit(centre: str, records: List[Tuple]):
+        school_name = records[-1][8]
+        workbook_name = await get_excel_workbook_name(
+            practical_mode=practical_mode, centre_number=centre or "", school_name=school_name or ""
+        )
+        save_path = os.path.join(build_dir, f"{workbook_name}.xlsm")
+        await slots.acquire()
+        build = export_pool.submit(build_entry_workbook, save_path, exam_id, practical_mode, marks_filler, records)
+        builds.append(build)
+        task = asyncio.ensure_future(collect(asyncio.wrap_future(build)))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    try:
+        sql, params, _ = build_export_query(
+            exam_id, ward_name, council_name, region_name, school_type,
+            practical_mode, centre_number_list=centre_number_list,
+            order_by="s.centre_number ASC, st.student_id ASC, es.subject_code ASC"
+        )
+        zip_file = zipfile.ZipFile(zip_path, "w", allowZip64=True)
+
+        conn = await db_pools.checkout()
+        cursor = await conn.cursor(aiomysql.SSCursor)
+        fetch_start = time.perf_counter()
+        await cursor.execute(sql, params)
+        current_centre = None
+        school_records: List[Tuple] = []
+        while True:
+            records = await cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not records:
+                break
+            for record in records:
+                centre = record[7]
+                if centre != current_centre:
+                    if school_records:
+                        stats["fetch"] += time.perf_counter() - fetch_start
+                        await submit(current_centre, school_records)
+                        fetch_start = time.perf_counter()
+                    current_centre, school_records = centre, []
+                school_records.append(record)
+        if school_records:
+            await submit(current_centre, school_records)
+        stats["fetch"] += time.perf_counter() - fetch_start
+        await cursor.close()
+        cursor = None
+        await db_pools.release(conn)
+        conn = None
+
+        if not pending and not stats["workbooks"]:
+            msg = export_empty_message(exam_id, ward_name, council_name, region_name, school_type, practical_mode)
+            logger.error(f"Error 1002: {msg}")
+            raise ValueError(msg)
+
+        if pending:
+            await asyncio.gather(*pending)
+        zip_file.close()
+    except BaseException as e:
+        # Also on cancellation: stop the collectors, then wait for builds and ZIP writes
+        # already running, so nothing writes into the ZIP or build_dir once they are removed
+        tasks = list(pending)
+        for task in tasks:
+            task.cancel()
+        for build in builds:
+            build.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(concurrent.futures.wait, builds)
+        await asyncio.gather(*zip_writes, return_exceptions=True)
+        if zip_file is not None:
+            zip_file.close()
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        if isinstance(e, aiomysql.Error):
+            logger.error(f"Error 1004: Database error: {e}")
+        elif isinstance(e, Exception):
+            logger.error(f"Error 1003: Excel operation failed: {e}")
+        raise
+    finally:
+        if cursor:
+            await cursor.close()
+        if conn:
+            await db_pools.release(conn)
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    stats["total"] = time.perf_counter() - start_time
+    stats["workbooks_per_second"] = stats["workbooks"] / stats["total"] if stats["total"] else 0.0
+    logger.info(
+        f"Batch export of {stats['workbooks']} workbooks to {zip_path}: "
+        + ", ".join(f"{key}={value:.2f}" for key, value in stats.items() if key not in ("workbooks", "rows"))
+    )
+    return zip_path, stats
+
 async def import_marks_from_excel_old(file_path: str) -> int:
     """Read marks from an Excel file and update student_subjects table using pandas. Return number of updated records."""
     try:
@@ -808,12 +807,10 @@ async def import_marks_from_excel_old(file_path: str) -> int:
         logger.info(f"Grouped into {len(grouped)} unique exam_id, student_global_id, subject_code combinations")
         
         # Verify existing records in database
-        pool = None
         conn = None
         cursor = None
         try:
-            pool = await aiomysql.create_pool(**DB_CONFIG)
-            conn = await pool.acquire()
+            conn = await db_pools.checkout()
             cursor = await conn.cursor()
             
             # Get unique exam_id for validation
@@ -835,13 +832,7 @@ async def import_marks_from_excel_old(file_path: str) -> int:
             )]
             logger.info(f"After filtering for existing records, {len(grouped)} rows remain")
             
-            # Prepare SQLAlchemy engine
-            engine = create_async_engine(
-                f"mysql+aiomysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['db']}",
-                pool_size=DB_CONFIG['maxsize']
-            )
-            
-            async with AsyncSession(engine) as session:
+            async with AsyncSession(db_pools.engine) as session:
                 async with session.begin():
                     updated_records = 0
                     batch_size = 1000
@@ -876,19 +867,291 @@ async def import_marks_from_excel_old(file_path: str) -> int:
         finally:
             if cursor:
                 await cursor.close()
-            if conn and pool:
-                pool.release(conn)
-            if pool:
-                pool.close()
-                await pool.wait_closed()
-            if 'engine' in locals():
-                await engine.dispose()
+            if conn:
+                await db_pools.release(conn)
     
     except Exception as e:
         logger.error(f"Error 2003: Import operation failed: {e}")
         raise
 
 
+def prepare_marks_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn Students sheet rows into one row per (exam_id, student_global_id, subject_code).
+
+    ``-P`` rows carry practical marks for the subject without the suffix, all
+    other rows carry theory marks; within a key the first non-null mark of
+    each kind wins. Every step is a column operation.
+    """
+    df = df[['exam_id', 'student_global_id', 'subject_code', 'marks']].dropna(
+        subset=['exam_id', 'student_global_id', 'subject_code']
+    )
+    codes = df['subject_code'].astype(str)
+    is_practical = codes.str.endswith("-P")
+    marks = pd.to_numeric(df['marks'], errors='coerce')
+
+    frame = pd.DataFrame({
+        'exam_id': df['exam_id'],
+        'student_global_id': df['student_global_id'],
+        'subject_code': codes.mask(is_practical, codes.str[:-2]),
+        'theory_marks': marks.mask(is_practical),
+        'practical_marks': marks.where(is_practical),
+    })
+    return frame.groupby(['exam_id', 'student_global_id', 'subject_code'], sort=False).agg({
+        'theory_marks': 'first',
+        'practical_marks': 'first'
+    }).reset_index()
+
+
+async def import_marks_from_excel(file_path: str, strategy: str = 'staging') -> Dict[str, Any]:
+    """
+    Read marks from an Excel file and write them to student_subjects column-wise.
+
+    Same steps as ``import_marks_from_excel_old``, without row-wise ``apply``
+    or ``iterrows``: the Students sheet is streamed by ``read_students_sheet``
+    (every row below the header), marks are split by the ``-P`` suffix with string ops,
+    matched to existing student subjects with one merge on
+    (student_global_id, subject_code), and written by primary key through
+    ``BulkColumnWriter`` (a staging table plus join-update by default).
+
+    Returns:
+        Dict with ``rows_read``, ``rows_matched``, ``updated`` (rows changed
+        by MySQL), per-stage ``timings`` in seconds and ``rows_per_second``.
+    """
+    start_time = time.perf_counter()
+    timings = {}
+    try:
+        if not os.path.exists(file_path):
+            logger.error(f"Error 2001: Excel file not found at {file_path}")
+            raise FileNotFoundError(f"Excel file not found: {file_path}")
+
+        df = await asyncio.to_thread(read_students_sheet, file_path)
+        rows_read = len(df)
+        timings['read'] = time.perf_counter() - start_time
+        logger.info(f"Read {rows_read} rows from {file_path} in {timings['read']:.2f} seconds")
+
+        stage_start = time.perf_counter()
+        grouped = prepare_marks_frame(df)
+        del df
+        logger.info(f"Grouped into {len(grouped)} unique exam_id, student_global_id, subject_code combinations")
+
+        exam_ids = grouped['exam_id'].unique()
+        if len(exam_ids) != 1:
+            logger.error(f"Error 2004: Multiple exam_ids found in Excel: {exam_ids}")
+            raise ValueError(f"Multiple exam_ids found in Excel: {exam_ids}")
+        exam_id = exam_ids[0]
+        timings['prepare'] = time.perf_counter() - stage_start
+
+        async with db_pools.acquire() as conn:
+            stage_start = time.perf_counter()
+            async with conn.cursor() as cursor:
+                await cursor.execute(
+                    "SELECT id, student_global_id, subject_code FROM student_subjects WHERE exam_id = %s",
+                    (exam_id,)
+                )
+                existing = pd.DataFrame(list(await cursor.fetchall()), columns=['id', 'student_global_id', 'subject_code'])
+
+            # Keep only keys that exist; the merge also brings in the primary key to update by
+            matched = grouped.merge(existing, on=['student_global_id', 'subject_code'], how='inner')
+            del existing
+            timings['match'] = time.perf_counter() - stage_start
+            logger.info(f"After filtering for existing records, {len(matched)} rows remain")
+
+            writer = BulkColumnWriter(
+                'student_subjects', ['theory_marks', 'practical_marks'], key=('id',), strategy=strategy
+            )
+            result = await writer.write(conn, matched[['id', 'theory_marks', 'practical_marks']])
+            timings['write'] = result['seconds']
+
+        timings['total'] = time.perf_counter() - start_time
+        stats = {
+            'rows_read': rows_read,
+            'rows_matched': len(matched),
+            'updated': result['affected'],
+            'timings': timings,
+            'rows_per_second': len(matched) / timings['total'] if timings['total'] else 0.0,
+        }
+        logger.info(
+            f"Successfully updated {stats['updated']} records from {file_path} "
+            f"({stats['rows_per_second']:,.0f} rows/s; "
+            + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items()) + ")"
+        )
+        return stats
+
+    except Exception as e:
+        logger.error(f"Error 2003: Import operation failed: {e}")
+        raise
+
+
+MARKS_KEY = ['student_global_id', 'subject_code']
+
+# Conflicting rows echoed back in a bulk import response
+MAX_REPORTED_CONFLICTS = 100
+
+
+def parse_marks_workbook(file_path: str) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Parse and validate one returned workbook; runs in a process pool worker.
+
+    Returns the ``prepare_marks_frame`` rows of the file (empty when the file
+    is rejected) and its validation report: ``status`` ``ok`` or ``error``,
+    ``rows_read``, ``marks`` (keys kept), ``invalid_marks`` (keys dropped for
+    marks outside 0-100), ``exam_id`` and ``error``.
+    """
+    start_time = time.perf_counter()
+    report = {
+        'file': os.path.basename(file_path), 'status': 'ok', 'rows_read': 0, 'marks': 0,
+        'invalid_marks': 0, 'exam_id': None, 'error': None, 'seconds': 0.0
+    }
+    empty = pd.DataFrame(columns=['exam_id', 'student_global_id', 'subject_code', 'theory_marks', 'practical_marks'])
+    try:
+        df = read_students_sheet(file_path)
+        report['rows_read'] = len(df)
+        grouped = prepare_marks_frame(df)
+        del df
+
+        exam_ids = grouped['exam_id'].unique()
+        if len(exam_ids) != 1:
+            raise ValueError(f"Expected one exam_id, found {len(exam_ids)}: {list(exam_ids)[:5]}")
+        report['exam_id'] = str(exam_ids[0])
+
+        invalid = pd.Series(False, index=grouped.index)
+        for column in ('theory_marks', 'practical_marks'):
+            invalid |= grouped[column].notna() & ~grouped[column].between(0, 100)
+        report['invalid_marks'] = int(invalid.sum())
+        grouped = grouped[~invalid]
+        report['marks'] = len(grouped)
+    except Exception as e:
+        logger.error(f"Error 2005: Could not parse {file_path}: {e}")
+        report.update(status='error', error=str(e))
+        grouped = empty
+    report['seconds'] = time.perf_counter() - start_time
+    return grouped, report
+
+
+def find_conflicting_marks(combined: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split marks gathered from several files into rows to write and conflicts.
+
+    A (student_global_id, subject_code) key sent with the same marks by more
+    than one file is written once; a key sent with different marks is a
+    conflict and none of its rows are written.
+    """
+    distinct = combined.drop_duplicates(subset=MARKS_KEY + ['theory_marks', 'practical_marks'])
+    conflicting = distinct.duplicated(subset=MARKS_KEY, keep=False)
+    return distinct[~conflicting], distinct[conflicting].sort_values(MARKS_KEY)
+
+
+async def import_marks_from_workbooks(file_paths: List[str], strategy: str = 'staging') -> Dict[str, Any]:
+    """
+    Import marks from many returned workbooks with one combined write.
+
+    Workbooks are parsed and validated in parallel on the shared process
+    pool. Files for an exam other than the batch's (the one most marks
+    belong to) are rejected, conflicting duplicates across files are
+    detected in memory with ``find_conflicting_marks``, and the remaining
+    marks are matched and written exactly like ``import_marks_from_excel``.
+
+    Returns:
+        Dict with ``exam_id``, ``files`` (per-file reports, including
+        ``conflicts`` and ``unmatched`` counts), ``rows_read``,
+        ``rows_matched``, ``updated``, ``conflicts`` (up to
+        ``MAX_REPORTED_CONFLICTS`` conflicting rows), per-stage ``timings``
+        and ``rows_per_second``.
+    """
+    start_time = time.perf_counter()
+    timings = {}
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    parsed = await asyncio.gather(*(
+        loop.run_in_executor(pool, parse_marks_workbook, file_path) for file_path in file_paths
+    ))
+    timings['parse'] = time.perf_counter() - start_time
+    reports = [report for _, report in parsed]
+    for report in reports:
+        report.update(conflicts=0, unmatched=0)
+
+    stage_start = time.perf_counter()
+    marks_per_exam: Dict[str, int] = {}
+    for report in reports:
+        if report['status'] == 'ok':
+            marks_per_exam[report['exam_id']] = marks_per_exam.get(report['exam_id'], 0) + report['marks']
+    if not marks_per_exam:
+        logger.error("Error 2006: No workbook in the batch could be imported")
+        raise ValueError("No workbook in the batch could be imported: "
+                         + "; ".join(f"{r['file']}: {r['error']}" for r in reports))
+    exam_id = max(marks_per_exam, key=marks_per_exam.get)
+
+    frames = []
+    for position, (frame, report) in enumerate(parsed):
+        if report['status'] != 'ok':
+            continue
+        if report['exam_id'] != exam_id:
+            report.update(status='error', error=f"exam_id {report['exam_id']} differs from batch exam_id {exam_id}")
+            continue
+        frames.append(frame.drop(columns='exam_id').assign(file=position))
+    del parsed
+    combined = pd.concat(frames, ignore_index=True)
+    del frames
+
+    to_write, conflicts = find_conflicting_marks(combined)
+    del combined
+    for position, count in conflicts['file'].value_counts().items():
+        reports[position]['conflicts'] = int(count)
+    timings['combine'] = time.perf_counter() - stage_start
+    if len(conflicts):
+        logger.warning(f"{conflicts[MARKS_KEY].drop_duplicates().shape[0]} student subjects have conflicting marks across files")
+
+    async with db_pools.acquire() as conn:
+        stage_start = time.perf_counter()
+        async with conn.cursor() as cursor:
+            await cursor.execute(
+                "SELECT id, student_global_id, subject_code FROM student_subjects WHERE exam_id = %s",
+                (exam_id,)
+            )
+            existing = pd.DataFrame(list(await cursor.fetchall()), columns=['id', 'student_global_id', 'subject_code'])
+
+        matched = to_write.merge(existing, on=MARKS_KEY, how='left', indicator=True)
+        unmatched = matched['_merge'] == 'left_only'
+        for position, count in matched.loc[unmatched, 'file'].value_counts().items():
+            reports[position]['unmatched'] = int(count)
+        matched = matched[~unmatched].astype({'id': existing['id'].dtype})
+        del existing
+        timings['match'] = time.perf_counter() - stage_start
+
+        writer = BulkColumnWriter('student_subjects', ['theory_marks', 'practical_marks'], key=('id',), strategy=strategy)
+        result = await writer.write(conn, matched[['id', 'theory_marks', 'practical_marks']])
+        timings['write'] = result['seconds']
+
+    timings['total'] = time.perf_counter() - start_time
+    reported = conflicts.head(MAX_REPORTED_CONFLICTS)
+    stats = {
+        'exam_id': exam_id,
+        'files': reports,
+        'rows_read': sum(report['rows_read'] for report in reports),
+        'rows_matched': len(matched),
+        'updated': result['affected'],
+        'conflicts': [
+            {
+                'student_global_id': row.student_global_id,
+                'subject_code': row.subject_code,
+                'file': reports[row.file]['file'],
+                'theory_marks': None if pd.isna(row.theory_marks) else float(row.theory_marks),
+                'practical_marks': None if pd.isna(row.practical_marks) else float(row.practical_marks),
+            }
+            for row in reported.itertuples(index=False)
+        ],
+        'timings': timings,
+        'rows_per_second': len(matched) / timings['total'] if timings['total'] else 0.0,
+    }
+    logger.info(
+        f"Bulk import of {len(file_paths)} files updated {stats['updated']} records "
+        f"({stats['rows_per_second']:,.0f} rows/s; "
+        + ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in timings.items()) + ")"
+    )
+    return stats
+
+
 async def import_marks_from_excel_OLDER(file_path: str) -> int:
     """Read marks from Excel, combine theory/practical records, clear rankings, update student_subjects table in bulk, and validate imports. Return number of updated records."""
     start_time = time.perf_counter()
@@ -1115,13 +1378,11 @@ async def calculate_marks_and_ranks(exam_id: str) -> int:
     info=await clear_student_subject_results(exam_id)
     print(info)
     start_time = time.perf_counter()
-    pool = None
     conn = None
     cursor = None
     
     try:
-        pool = await aiomysql.create_pool(**DB_CONFIG)
-        conn = await pool.acquire()
+        conn = await db_pools.checkout()
         cursor = await conn.cursor(aiomysql.DictCursor)
         
         # Fetch records where theory_marks >= 0 OR practical_marks >= 0
@@ -1214,15 +1475,9 @@ async def calculate_marks_and_ranks(exam_id: str) -> int:
                                                'council_subject_pos_gvt', 'council_subject_pos_pvt',
                                                'region_subject_pos_gvt', 'region_subject_pos_pvt']] = None
         
-        # Prepare SQLAlchemy engine
-        engine = create_async_engine(
-            f"mysql+aiomysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['db']}",
-            pool_size=DB_CONFIG['maxsize']
-        )
-        
         # Bulk update database
         logger.info(f"Starting Database Update==========")
-        async with AsyncSession(engine) as session:
+        async with AsyncSession(db_pools.engine) as session:
             async with session.begin():
                 updated_records = 0
                 batch_size = 1000
@@ -1297,13 +1552,8 @@ async def calculate_marks_and_ranks(exam_id: str) -> int:
     finally:
         if cursor:
             await cursor.close()
-        if conn and pool:
-            pool.release(conn)
-        if pool:
-            pool.close()
-            await pool.wait_closed()
-        if 'engine' in locals():
-            await engine.dispose()
+        if conn:
+            await db_pools.release(conn)
 
 
 async def process_exam_results_OLD(exam_id: str):
@@ -1528,21 +1778,8 @@ async def process_exam_results_OLD(exam_id: str):
 
 
 async def process_exam_results(exam_id: str):
-    pool = None
     try:
-        # Create aiomysql connection pool
-        logger.info(f"Creating aiomysql connection pool for database: {DB_CONFIG['db']}")
-        pool = await aiomysql.create_pool(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            db=DB_CONFIG['db'],
-            maxsize=DB_CONFIG['maxsize'],
-            charset='utf8mb4'
-        )
-
-        async with pool.acquire() as conn:
+        async with db_pools.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
                 # Load reference data
                 logger.info(f"Loading exam grades for exam_id: {exam_id}")
@@ -1586,58 +1823,53 @@ async def process_exam_results(exam_id: str):
                     SELECT id, exam_id, student_global_id, centre_number, overall_marks, subject_code
                     FROM student_subjects WHERE exam_id = %s
                 """
-                await cur.execute(subjects_query, (exam_id,))
-                subjects_df = pd.DataFrame(await cur.fetchall(), columns=['id', 'exam_id', 'student_global_id', 'centre_number', 'overall_marks', 'subject_code'])
+                subjects_df = await read_frame(conn, subjects_query, (exam_id,), {
+                    'id': 'text', 'exam_id': 'str', 'student_global_id': 'str', 'centre_number': 'str',
+                    'overall_marks': 'float', 'subject_code': 'str'
+                })
                 logger.info(f"Loaded {len(subjects_df)} student subject records. dtypes: {subjects_df.dtypes.to_dict()}")
 
                 if subjects_df.empty:
                     logger.warning(f"No student subjects found for exam_id: {exam_id}")
                     return
 
-                # Ensure numeric types
-                logger.info("Converting overall_marks to float64")
-                subjects_df['overall_marks'] = pd.to_numeric(subjects_df['overall_marks'], errors='coerce').astype('float64')
-                logger.info(f"overall_marks dtypes after conversion: {subjects_df['overall_marks'].dtype}")
                 logger.info(f"Non-numeric overall_marks values: {subjects_df['overall_marks'].isna().sum()} NaN values")
 
-                # Map grades
+                # Map grades: first band in exam_grades order with lower_value < marks <= highest_value
                 logger.info(f"Mapping grades for {len(subjects_df)} records")
-                def map_grade(marks):
-                    if pd.notnull(marks):
-                        grade_row = grades_df[(grades_df['lower_value'] < marks) & (marks <= grades_df['highest_value'])]
-                        return grade_row['grade'].iloc[0] if not grade_row.empty else None
-                    return None
-
-                def map_grade_points(marks):
-                    if pd.notnull(marks):
-                        grade_row = grades_df[(grades_df['lower_value'] < marks) & (marks <= grades_df['highest_value'])]
-                        return float(grade_row['grade_points'].iloc[0]) if not grade_row.empty else np.nan
-                    return np.nan
+                def map_grades(marks, label_col, missing=None):
+                    return first_matching_band(
+                        marks, grades_df['lower_value'], grades_df['highest_value'], grades_df[label_col].to_numpy(),
+                        lower_inclusive=False, missing=missing
+                    )
 
-                subjects_df['subject_grade'] = subjects_df['overall_marks'].apply(map_grade)
-                subjects_df['grade_points'] = subjects_df['overall_marks'].apply(map_grade_points).astype('float64')
+                subjects_df['subject_grade'] = map_grades(subjects_df['overall_marks'], 'grade')
+                subjects_df['grade_points'] = pd.to_numeric(
+                    pd.Series(map_grades(subjects_df['overall_marks'], 'grade_points', np.nan)), errors='coerce'
+                ).to_numpy(dtype=np.float64)
                 logger.info(f"Completed grade mapping. subjects_df dtypes: {subjects_df.dtypes.to_dict()}")
 
-                # Update student_subjects
+                # Update student_subjects through a staging table
                 logger.info(f"Updating student_subjects for {len(subjects_df)} records")
-                for i, row in subjects_df.iterrows():
-                    await cur.execute(
-                        "UPDATE student_subjects SET subject_grade = %s WHERE id = %s",
-                        (row['subject_grade'], row['id'])
-                    )
-                    if (i + 1) % 1000 == 0:
-                        logger.info(f"Updated {i + 1} student subject records")
-                        await conn.commit()
-                await conn.commit()
-                logger.info(f"Finished updating student_subjects")
+                grade_writer = BulkColumnWriter('student_subjects', ['subject_grade'])
+                stats = await grade_writer.write(conn, subjects_df[['id', 'subject_grade']])
+                logger.info(f"Finished updating {stats['rows']} student_subjects in {stats['seconds']:.2f} seconds")
 
-                # Compute results
+                # Compute results: totals, subject counts and best 7 sums per student
                 logger.info(f"Computing results for exam_id: {exam_id}")
-                results = subjects_df.groupby(['exam_id', 'student_global_id', 'centre_number']).agg({
-                    'overall_marks': ['sum', 'count', lambda x: x.nlargest(7).sum()],
-                    'grade_points': lambda x: x.nlargest(7).sum()
+                keys = ['exam_id', 'student_global_id', 'centre_number']
+                grouped = subjects_df.groupby(keys)
+
+                def best_sum(column, n=7):
+                    top = subjects_df.sort_values(column, ascending=False, na_position='last').groupby(keys, sort=False).head(n)
+                    return top.groupby(keys)[column].sum()
+
+                results = pd.DataFrame({
+                    'total_marks': grouped['overall_marks'].sum(),
+                    'subject_count': grouped['overall_marks'].count(),
+                    'best_7_marks': best_sum('overall_marks'),
+                    'total_points': best_sum('grade_points'),
                 }).reset_index()
-                results.columns = ['exam_id', 'student_global_id', 'centre_number', 'total_marks', 'subject_count', 'best_7_marks', 'total_points']
                 logger.info(f"Computed results for {len(results)} students. dtypes: {results.dtypes.to_dict()}")
 
                 # Compute avg_marks
@@ -1656,21 +1888,19 @@ async def process_exam_results(exam_id: str):
 
                 # Map avg_grade
                 logger.info(f"Mapping average grades for {len(results)} records")
-                results['avg_grade'] = results['avg_marks'].apply(map_grade)
+                results['avg_grade'] = map_grades(results['avg_marks'], 'grade')
                 logger.info(f"Completed average grade mapping. avg_grade dtype: {results['avg_grade'].dtype}")
 
-                # Map division
+                # Map division: first band with lowest_points <= total_points <= highest_points,
+                # otherwise INC below 7 subjects and ABS
                 logger.info(f"Mapping divisions for {len(results)} records")
-                results['division'] = results.apply(
-                    lambda row: divisions_df[
-                        (divisions_df['lowest_points'] <= row['total_points']) & 
-                        (row['total_points'] <= divisions_df['highest_points'])
-                    ]['division'].iloc[0] if pd.notnull(row['total_points']) and not divisions_df[
-                        (divisions_df['lowest_points'] <= row['total_points']) & 
-                        (row['total_points'] <= divisions_df['highest_points'])
-                    ].empty else 'INC' if row['subject_count'] < 7 else 'ABS',
-                    axis=1
+                divisions = first_matching_band(
+                    results['total_points'], divisions_df['lowest_points'], divisions_df['highest_points'],
+                    divisions_df['division'].to_numpy()
                 )
+                unmatched = pd.isna(divisions)
+                divisions[unmatched] = np.where(results['subject_count'].to_numpy()[unmatched] < 7, 'INC', 'ABS')
+                results['division'] = divisions
                 logger.info(f"Completed division mapping. division dtype: {results['division'].dtype}")
 
                 # Merge school data
@@ -1678,34 +1908,17 @@ async def process_exam_results(exam_id: str):
                 results = results.merge(schools_df, on='centre_number', how='left')
                 logger.info(f"Completed school data merge. dtypes: {results.dtypes.to_dict()}")
 
-                # Initialize ranking columns
-                logger.info(f"Initializing ranking columns")
-                for col in ['ward_pos', 'ward_out_of', 'council_pos', 'council_out_of', 'region_pos', 'region_out_of',
-                            'ward_pos_gvt', 'ward_pos_pvt', 'council_pos_gvt', 'council_pos_pvt', 'region_pos_gvt', 'region_pos_pvt']:
-                    results[col] = pd.NA
-                results = results.astype({col: 'Int64' for col in ['ward_pos', 'ward_out_of', 'council_pos', 'council_out_of', 
-                                                                  'region_pos', 'region_out_of', 'ward_pos_gvt', 'ward_pos_pvt', 
-                                                                  'council_pos_gvt', 'council_pos_pvt', 'region_pos_gvt', 'region_pos_pvt']})
-                logger.info(f"Initialized ranking columns. dtypes: {results.dtypes.to_dict()}")
-
-                # Compute rankings
+                # Compute dense rankings overall and by location name, with GOVERNMENT/PRIVATE splits
                 logger.info(f"Computing rankings for exam_id: {exam_id}")
-                results['pos'] = results[results['avg_marks'].notnull()]['avg_marks'].rank(ascending=False, method='dense').astype('Int64')
-                results['out_of'] = results[results['avg_marks'].notnull()].shape[0]
-                logger.info(f"Computed overall rankings: {results['out_of'].iloc[0]} students. pos dtype: {results['pos'].dtype}")
-
-                for level in ['ward', 'council', 'region']:
-                    logger.info(f"Computing {level} rankings")
-                    for school_type in ['GOVERNMENT', 'PRIVATE']:
-                        for name in results[f'{level}_name'].dropna().unique():
-                            mask = (results[f'{level}_name'] == name) & (results['school_type'] == school_type) & (results['avg_marks'].notnull())
-                            if mask.any():
-                                results.loc[mask, f'{level}_pos_{school_type[:3].lower()}'] = results[mask]['avg_marks'].rank(ascending=False, method='dense').astype('Int64')
-                            mask_all = (results[f'{level}_name'] == name) & (results['avg_marks'].notnull())
-                            if mask_all.any():
-                                results.loc[mask_all, f'{level}_pos'] = results[mask_all]['avg_marks'].rank(ascending=False, method='dense').astype('Int64')
-                                results.loc[mask_all, f'{level}_out_of'] = results[mask_all].shape[0]
-                    logger.info(f"Completed {level} rankings. {level}_pos dtype: {results[f'{level}_pos'].dtype}")
+                ranked = results['avg_marks'].notnull()
+                levels = {level: RankLevel((f'{level}_name',)) for level in ('ward', 'council', 'region')}
+                rank_columns = ['pos'] + [
+                    f'{level}_{stat}' for level in levels for stat in ('pos', 'out_of', 'pos_gvt', 'pos_pvt')
+                ]
+                ranks = rank_partitions(results, 'avg_marks', levels, rank_columns, valid=ranked, method='dense')
+                results[rank_columns] = ranks[rank_columns].astype('Int64')
+                results['out_of'] = int(ranked.sum())
+                logger.info(f"Computed rankings: {results['out_of'].iloc[0]} students ranked")
 
                 # Prepare results for insertion
                 logger.info(f"Preparing {len(results)} results for insertion")
@@ -1719,39 +1932,19 @@ async def process_exam_results(exam_id: str):
                                  'created_at']]
                 logger.info(f"Prepared results DataFrame. dtypes: {results.dtypes.to_dict()}")
 
-                # Insert results
+                # Insert results with multi-row upserts; a rerun updates the existing
+                # rows through the unique exam/student/centre key
                 logger.info(f"Inserting {len(results)} results into results table")
-                for i, row in results.iterrows():
-                    await cur.execute(
-                        """
-                        INSERT INTO results (id, exam_id, student_global_id, centre_number, avg_marks, avg_grade, 
-                                            total_marks, division, total_points, pos, out_of, 
-                                            ward_pos, ward_out_of, council_pos, council_out_of, 
-                                            region_pos, region_out_of, ward_pos_gvt, ward_pos_pvt, 
-                                            council_pos_gvt, council_pos_pvt, region_pos_gvt, region_pos_pvt, 
-                                            created_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        tuple(row)
-                    )
-                    if (i + 1) % 1000 == 0:
-                        logger.info(f"Inserted {i + 1} result records")
-                        await conn.commit()
-                await conn.commit()
-                logger.info(f"Completed insertion of {len(results)} results")
+                results_writer = BulkColumnWriter('results', [col for col in results.columns if col != 'id'], strategy='upsert')
+                stats = await results_writer.write(conn, results)
+                logger.info(f"Completed insertion of {stats['rows']} results in {stats['seconds']:.2f} seconds")
 
                 logger.info(f"Processing completed successfully for exam_id: {exam_id}")
 
     except Exception as e:
+        # The pool rolls back anything left uncommitted when the connection is released
         logger.error(f"Error during processing for exam_id {exam_id}: {str(e)}")
-        await conn.rollback()
         raise
-    finally:
-        logger.info("Closing connection pool")
-        if pool is not None:
-            pool.close()
-            await pool.wait_closed()
-        logger.info("Connection pool closed")
 
 
 async def clear_student_subject_results(exam_id: str, clear_overall_marks: bool = False) -> Dict[str, Any]:
@@ -1798,18 +1991,7 @@ async def clear_student_subject_results(exam_id: str, clear_overall_marks: bool
     sql += " WHERE exam_id = %s"
     
     try:
-        # Create connection pool
-        pool = await aiomysql.create_pool(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            db=DB_CONFIG['db'],
-            minsize=1,
-            maxsize=DB_CONFIG['maxsize']
-        )
-        
-        async with pool.acquire() as conn:
+        async with db_pools.acquire() as conn:
             async with conn.cursor() as cursor:
                 # Execute the update
                 await cursor.execute(sql, (exam_id,))
@@ -1829,10 +2011,6 @@ async def clear_student_subject_results(exam_id: str, clear_overall_marks: bool
             "status": "error",
             "message": f"Failed to clear results: {str(e)}"
         }
-    finally:
-        if 'pool' in locals():
-            pool.close()
-            await pool.wait_closed()
 
 
 # if __name__ == "__main__":
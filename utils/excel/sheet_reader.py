@@ -0,0 +1,182 @@
+import codecs
+import html
+import logging
+import re
+import time
+import zipfile
+from typing import Dict, Iterator, List, Sequence
+from xml.etree.ElementTree import iterparse
+import numpy as np
+import pandas as pd
+from utils.excel.stream_export import sheet_part
+
+logger = logging.getLogger(__name__)
+
+# Columns A:N of the Students sheet, as written by export_to_excel
+STUDENT_SHEET_COLUMNS = [
+    'student_id', 'full_name', 'sex', 'marks', 'subject_code', 'subject_name', 'subject_short',
+    'centre_number', 'school_name', 'ward_name', 'council_name', 'region_name', 'exam_id', 'student_global_id'
+]
+
+# Columns parsed as numbers; the rest stay text
+NUMERIC_COLUMNS = {'marks'}
+
+# Decompressed sheet XML read per step; cells are parsed up to the last complete row
+READ_BYTES = 4 * 1024 * 1024
+
+# Rows per yielded block of column arrays
+CHUNK_ROWS = 100_000
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+# Excel, LibreOffice and openpyxl all write the cell reference as the first attribute
+_CELL_RE = re.compile(r'<c r="([A-Z]{1,3})(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_TYPE_RE = re.compile(r'\bt="(\w+)"')
+_VALUE_RE = re.compile(r'<v>(.*?)</v>', re.S)
+_TEXT_RE = re.compile(r'<t(?:\s[^>]*)?>(.*?)</t>', re.S)
+
+# Body of a plain inline string cell, as written by export_to_excel
+_INLINE_PREFIX = '<is><t>'
+_INLINE_SUFFIX = '</t></is>'
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _text(value: str) -> str:
+    return html.unescape(value) if '&' in value else value
+
+
+def _number(raw: str):
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+def read_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    """Shared string table of the package (empty when every string is inline)."""
+    try:
+        source = archive.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    strings = []
+    with source:
+        for _, element in iterparse(source):
+            if element.tag != f"{_NS}si":
+                continue
+            # Plain text, or the runs of rich text; phonetic hints (rPh) are not part of the value
+            text = element.find(f"{_NS}t")
+            if text is not None:
+                strings.append(text.text or '')
+            else:
+                strings.append(''.join(run.text or '' for run in element.iterfind(f"{_NS}r/{_NS}t")))
+            element.clear()
+    return strings
+
+
+def _cell_value(attributes: str, body: str, shared: List[str]):
+    """Typed value of one ``<c>`` element from its attributes and inner XML."""
+    if not body:
+        return None
+    if body.startswith(_INLINE_PREFIX) and body.endswith(_INLINE_SUFFIX):
+        text = body[len(_INLINE_PREFIX):-len(_INLINE_SUFFIX)]
+        if '<' not in text:
+            return _text(text)
+    cell_type = _TYPE_RE.search(attributes) if 't="' in attributes else None
+    cell_type = cell_type.group(1) if cell_type else 'n'
+    if cell_type == 'inlineStr':
+        return ''.join(_text(part) for part in _TEXT_RE.findall(body))
+    value = _VALUE_RE.search(body)
+    if value is None:
+        return None
+    raw = value.group(1)
+    if cell_type == 's':
+        return shared[int(raw)]
+    if cell_type == 'str':
+        return _text(raw)
+    if cell_type == 'b':
+        return raw == '1'
+    if cell_type == 'e':
+        return None
+    return _number(raw)
+
+
+def _to_arrays(columns: Sequence[str], values: List[list]) -> Dict[str, np.ndarray]:
+    arrays = {}
+    for name, column in zip(columns, values):
+        if name in NUMERIC_COLUMNS:
+            arrays[name] = pd.to_numeric(pd.Series(column, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            arrays[name] = np.array(column, dtype=object)
+    return arrays
+
+
+def iter_sheet_columns(
+    path: str,
+    sheet_name: str = "Students",
+    columns: Sequence[str] = STUDENT_SHEET_COLUMNS,
+    header_rows: int = 1,
+    chunk_rows: int = CHUNK_ROWS
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Stream the first ``len(columns)`` columns of a worksheet as blocks of column arrays.
+
+    The worksheet XML is decompressed in slices and scanned for cells with a
+    regular expression instead of building an object model, so VBA, styles
+    and the other sheets are never loaded. Rows after ``header_rows`` are
+    returned in sheet order; missing cells are ``None`` (``NaN`` in numeric
+    columns). Text columns are object arrays, ``NUMERIC_COLUMNS`` are float64.
+    """
+    width = len(columns)
+    with zipfile.ZipFile(path) as archive:
+        shared = read_shared_strings(archive)
+        part = sheet_part(archive, sheet_name)
+        values: List[list] = [[] for _ in range(width)]
+        column_indexes: Dict[str, int] = {}
+        current_row = None
+        # Sheet parts are UTF-8; the decoder carries a character split across slices
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        with archive.open(part) as source:
+            tail = ''
+            while True:
+                chunk = source.read(READ_BYTES)
+                buffer = tail + decoder.decode(chunk, final=not chunk)
+                if chunk:
+                    # Only parse complete rows; the rest waits for the next slice
+                    cut = buffer.rfind('</row>')
+                    cut = cut + len('</row>') if cut >= 0 else 0
+                else:
+                    cut = len(buffer)
+                for letters, row, attributes, body in _CELL_RE.findall(buffer, 0, cut):
+                    column = column_indexes.get(letters)
+                    if column is None:
+                        column = column_indexes[letters] = _column_index(letters)
+                    if column >= width or int(row) <= header_rows:
+                        continue
+                    if row != current_row:
+                        if len(values[0]) >= chunk_rows:
+                            yield _to_arrays(columns, values)
+                            values = [[] for _ in range(width)]
+                        current_row = row
+                        for column_values in values:
+                            column_values.append(None)
+                    values[column][-1] = _cell_value(attributes, body, shared)
+                tail = buffer[cut:]
+                if not chunk:
+                    break
+        if values[0]:
+            yield _to_arrays(columns, values)
+
+
+def read_students_sheet(path: str) -> pd.DataFrame:
+    """Read columns A:N of the Students sheet of an entry workbook into a DataFrame."""
+    start_time = time.perf_counter()
+    blocks = [pd.DataFrame(block) for block in iter_sheet_columns(path)]
+    df = pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(columns=STUDENT_SHEET_COLUMNS)
+    logger.info(f"Parsed {len(df)} Students rows from {path} in {time.perf_counter() - start_time:.2f} seconds")
+    return df
@@ -0,0 +1,378 @@
+import logging
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import openpyxl
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+
+logger = logging.getLogger(__name__)
+
+MASTER_TEMPLATE = os.path.join(os.path.dirname(__file__), "master.xlsm")
+
+# Order of the columns selected by the export query; ``add_records`` unpacks rows in this order
+EXPORT_COLUMNS = (
+    "student_id", "student_global_id", "full_name", "sex",
+    "subject_code", "subject_name", "subject_short",
+    "centre_number", "school_name",
+    "ward_name", "council_name", "region_name",
+    "school_type", "has_practical",
+)
+
+# Columns A..N of the Students sheet
+STUDENT_COLUMNS = 14
+
+# Rows buffered as XML text before being written to the spool file
+FLUSH_ROWS = 2000
+
+_RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DOC_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_DIMENSION_RE = re.compile(r'<dimension ref="([A-Z]+)1:([A-Z]+)(\d+)"\s*/>')
+# <sheetData> opening tag, group 1 is "/" for an empty self-closed <sheetData/>
+_SHEET_DATA_RE = re.compile(r'<sheetData\b[^>]*?(/?)>')
+# One <row> element of sheetData with its row number
+_ROW_RE = re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+
+
+def _cell_text(value: str) -> str:
+    value = escape(ILLEGAL_CHARACTERS_RE.sub("", value))
+    if value[:1].isspace() or value[-1:].isspace():
+        return f'<t xml:space="preserve">{value}</t>'
+    return f"<t>{value}</t>"
+
+
+def sheet_part(archive: zipfile.ZipFile, sheet_name: str) -> str:
+    """Path of the worksheet XML for ``sheet_name`` inside an xlsx/xlsm package."""
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_RELS_NS}Relationship")}
+    for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+        if sheet.get("name") == sheet_name:
+            target = targets[sheet.get(_DOC_REL_ID)]
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+    raise KeyError(f"Sheet {sheet_name!r} not found in workbook")
+
+
+class StreamingEntryWorkbook:
+    """
+    Entry workbook (copy of ``master.xlsm``) whose Students sheet is streamed.
+
+    Records are turned into Students rows as they arrive and written as sheet
+    XML to an anonymous spool file, so memory stays bounded by the subject and
+    school summaries rather than by the number of rows. Only the small sheets
+    (Subjects, Schools, Interface) and the ``Table1`` ref go through openpyxl;
+    on ``save`` the spooled rows are spliced into the Students sheet part of
+    the saved package. VBA and all other parts of the template are kept.
+    """
+
+    def __init__(self, exam_id: str, practical_mode: int = 0, template_path: str = MASTER_TEMPLATE):
+        if not os.path.exists(template_path):
+            logger.error("Error 1001: master.xlsm not found!")
+            raise FileNotFoundError("master.xlsm not found!")
+        self.exam_id = exam_id
+        self.practical_mode = practical_mode
+        self.template_path = template_path
+        self.workbook = openpyxl.load_workbook(template_path, keep_vba=True)
+
+        # Streamed rows take the styles of the template's first (empty) data row
+        students_sheet = self.workbook["Students"]
+        self._styles = [students_sheet.cell(row=2, column=j).style_id for j in range(1, STUDENT_COLUMNS + 1)]
+        self._letters = [get_column_letter(j) for j in range(1, STUDENT_COLUMNS + 1)]
+
+        self.subject_dict: Dict[str, list] = {}
+        self.school_dict: Dict[str, list] = {}
+        self.record_count = 0
+        self.row_count = 0
+        self.last_school_name: Optional[str] = None
+        self._prev_centre = None
+        self._spool = tempfile.TemporaryFile()
+        self._buffer: List[str] = []
+
+    def _write_row(self, values: Sequence[str]):
+        row_number = self.row_count + 2
+        cells = []
+        for letter, style, value in zip(self._letters, self._styles, values):
+            if value:
+                cells.append(f'<c r="{letter}{row_number}" s="{style}" t="inlineStr"><is>{_cell_text(value)}</is></c>')
+            else:
+                cells.append(f'<c r="{letter}{row_number}" s="{style}"/>')
+        self._buffer.append(f'<row r="{row_number}">{"".join(cells)}</row>')
+        self.row_count += 1
+        if len(self._buffer) >= FLUSH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._spool.write("".join(self._buffer).encode("utf-8"))
+            self._buffer.clear()
+
+    def _count_school(self, school_key: str, centre_number, school_name, ward_name, council_name, region_name):
+        if school_key not in self.school_dict:
+            self.school_dict[school_key] = [
+                centre_number or '',
+                school_name or '',
+                ward_name or '',
+                council_name or '',
+                region_name or '',
+                0, 0
+            ]
+        self.school_dict[school_key][5] += 1
+
+    def add_records(self, records: Iterable[Sequence]):
+        """Add query rows (in ``EXPORT_COLUMNS`` order) as theory and/or practical Students rows."""
+        exam_id = self.exam_id
+        practical_mode = self.practical_mode
+        for record in records:
+            (student_id, student_global_id, full_name, sex,
+             subject_code, subject_name, subject_short,
+             centre_number, school_name, ward_name, council_name, region_name,
+             school_type, has_practical) = record
+            self.record_count += 1
+            self.last_school_name = school_name
+            if centre_number != self._prev_centre:
+                logger.info(f"centre_number changed: {centre_number}")
+                self._prev_centre = centre_number
+
+            school_key = (
+                f"{centre_number or ''}|{school_name or ''}|"
+                f"{ward_name or ''}|{council_name or ''}|"
+                f"{region_name or ''}|{school_type or ''}"
+            )
+            location = [
+                centre_number or '',
+                school_name or '',
+                ward_name or '',
+                council_name or '',
+                region_name or '',
+                exam_id,
+                student_global_id or ''
+            ]
+
+            if practical_mode != 2:  # Not ExportOnlyPracticalVersions
+                # Add theory row
+                self._write_row([
+                    student_id or '',
+                    full_name or '',
+                    sex or '',
+                    '',
+                    str(subject_code or ''),
+                    subject_name or '',
+                    subject_short or '',
+                    *location
+                ])
+
+                subj_key = f"{subject_code or ''}|{subject_name or ''}|{subject_short or ''}"
+                if subj_key not in self.subject_dict:
+                    self.subject_dict[subj_key] = [
+                        str(subject_code or ''),
+                        subject_name or '',
+                        subject_short or '',
+                        0, 0
+                    ]
+                self.subject_dict[subj_key][3] += 1
+                self._count_school(school_key, centre_number, school_name, ward_name, council_name, region_name)
+
+            if has_practical and practical_mode != 1:  # Not ExportWithoutPractical
+                # Add practical row
+                self._write_row([
+                    student_id or '',
+                    full_name or '',
+                    sex or '',
+                    '',
+                    f"{subject_code or ''}-P",
+                    f"{subject_name or ''}-Practical",
+                    f"{subject_short or ''}-P",
+                    *location
+                ])
+
+                prac_subj_key = (
+                    f"{subject_code or ''}-P|"
+                    f"{subject_name or ''}-Practical|"
+                    f"{subject_short or ''}-P"
+                )
+                if prac_subj_key not in self.subject_dict:
+                    self.subject_dict[prac_subj_key] = [
+                        f"{subject_code or ''}-P",
+                        f"{subject_name or ''}-Practical",
+                        f"{subject_short or ''}-P",
+                        0, 0
+                    ]
+                self.subject_dict[prac_subj_key][3] += 1
+                self._count_school(school_key, centre_number, school_name, ward_name, council_name, region_name)
+
+    def _fill_small_sheets(self, marks_filler: str):
+        workbook = self.workbook
+        students_sheet = workbook["Students"]
+        subjects_sheet = workbook["Subjects"]
+        schools_sheet = workbook["Schools"]
+        interface_sheet = workbook["Interface"]
+
+        # Clear Interface!A500 or set marks_filler
+        interface_sheet["A500"] = marks_filler if marks_filler else ""
+
+        # Set number formats
+        students_sheet.column_dimensions["E"].number_format = "@"
+        subjects_sheet.column_dimensions["A"].number_format = "@"
+
+        table1 = students_sheet.tables.get("Table1")
+        if table1:
+            table1.ref = f"A1:N{max(self.row_count, 1) + 1}"
+
+        # Write subjects data
+        row_index = 2
+        for subj_data in self.subject_dict.values():
+            subjects_sheet[f"A{row_index}"] = subj_data[0]
+            subjects_sheet[f"B{row_index}"] = subj_data[2]
+            subjects_sheet[f"C{row_index}"] = subj_data[1]
+            subjects_sheet[f"D{row_index}"] = f"=COUNTIFS(Students!E:E,A{row_index})"
+            subjects_sheet[f"E{row_index}"] = f"=COUNTIFS(Students!E:E,A{row_index},Students!D:D,\">=0\")"
+            subjects_sheet[f"F{row_index}"] = f"=D{row_index}-E{row_index}"
+            subjects_sheet[f"G{row_index}"] = f"=IF(D{row_index}=0,\"N/A\",E{row_index}/D{row_index})"
+            row_index += 1
+
+        if row_index > 2:
+            subjects_sheet[f"C{row_index}"] = "Total"
+            subjects_sheet[f"D{row_index}"] = f"=SUM(D2:D{row_index-1})"
+            subjects_sheet[f"E{row_index}"] = f"=SUM(E2:E{row_index-1})"
+            subjects_sheet[f"F{row_index}"] = f"=SUM(F2:F{row_index-1})"
+            subjects_sheet[f"G{row_index}"] = f"=IF(D{row_index}=0,\"N/A\",E{row_index}/D{row_index})"
+
+        subjects_sheet.column_dimensions["G"].number_format = "0.0%"
+
+        # Write schools data
+        row_index = 2
+        for school_data in self.school_dict.values():
+            schools_sheet[f"A{row_index}"] = school_data[0]
+            schools_sheet[f"B{row_index}"] = school_data[1]
+            schools_sheet[f"C{row_index}"] = school_data[2]  # ward_name
+            schools_sheet[f"D{row_index}"] = school_data[3]  # council_name
+            schools_sheet[f"E{row_index}"] = school_data[4]  # region_name
+            schools_sheet[f"F{row_index}"] = f"=COUNTIFS(Students!H:H,A{row_index})"
+            schools_sheet[f"G{row_index}"] = f"=COUNTIFS(Students!H:H,A{row_index},Students!D:D,\">=0\")"
+            schools_sheet[f"H{row_index}"] = f"=F{row_index}-G{row_index}"
+            schools_sheet[f"I{row_index}"] = f"=IF(F{row_index}=0,\"N/A\",G{row_index}/F{row_index})"
+            row_index += 1
+
+        if row_index > 2:
+            schools_sheet[f"E{row_index}"] = "Total"
+            schools_sheet[f"F{row_index}"] = f"=SUM(F2:F{row_index-1})"
+            schools_sheet[f"G{row_index}"] = f"=SUM(G2:G{row_index-1})"
+            schools_sheet[f"H{row_index}"] = f"=SUM(H2:H{row_index-1})"
+            schools_sheet[f"I{row_index}"] = f"=IF(F{row_index}=0,\"N/A\",G{row_index}/F{row_index})"
+
+        schools_sheet.column_dimensions["I"].number_format = "0.0%"
+
+        # Create dropdowns in Interface sheet
+        centre_numbers = [str(school_data[0]) for school_data in self.school_dict.values() if school_data[0]]
+        if centre_numbers:
+            dv_centre = DataValidation(type="list", formula1=f'"{",".join(centre_numbers)}"', allow_blank=True)
+            dv_centre.add("C5")
+            interface_sheet.add_data_validation(dv_centre)
+            logger.debug(f"Added dropdown to Interface!C5 with {len(centre_numbers)} centre numbers")
+
+        subject_codes = [str(subj_data[0]) for subj_data in self.subject_dict.values() if subj_data[0]]
+        if subject_codes:
+            interface_sheet["C6"].number_format = "@"
+            dv_subject = DataValidation(type="list", formula1=f'"{",".join(subject_codes)}"', allow_blank=True)
+            dv_subject.add("C6")
+            interface_sheet.add_data_validation(dv_subject)
+            logger.debug(f"Added dropdown to Interface!C6 with {len(subject_codes)} subject codes")
+
+    def _splice_students(self, package_path: str, save_path: str):
+        """Copy ``package_path`` to ``save_path`` with the spooled rows in the Students sheet."""
+        with zipfile.ZipFile(package_path) as source, \
+                zipfile.ZipFile(save_path, "w", zipfile.ZIP_DEFLATED) as target:
+            students_part = sheet_part(source, "Students")
+            for item in source.infolist():
+                if item.filename != students_part:
+                    with source.open(item) as src, target.open(item.filename, "w", force_zip64=True) as dst:
+                        shutil.copyfileobj(src, dst)
+                    continue
+
+                sheet_xml = source.read(item).decode("utf-8")
+                opening = _SHEET_DATA_RE.search(sheet_xml)
+                if opening.group(1):
+                    # Empty <sheetData/>: open it so the streamed rows have somewhere to go
+                    head = sheet_xml[:opening.start()] + "<sheetData>"
+                    body, tail = "", "</sheetData>" + sheet_xml[opening.end():]
+                else:
+                    data_end = sheet_xml.index("</sheetData>", opening.end())
+                    head = sheet_xml[:opening.end()]
+                    body, tail = sheet_xml[opening.end():data_end], sheet_xml[data_end:]
+
+                below = ""
+                if self.row_count:
+                    # The streamed rows take rows 2..last_row: template rows from row 2 on are cut,
+                    # and those below the streamed rows are put back after them to keep rows in order
+                    last_row = self.row_count + 1
+                    rows = [(int(m.group(1)), m) for m in _ROW_RE.finditer(body)]
+                    first = next((m for number, m in rows if number >= 2), None)
+                    if first is not None:
+                        below = "".join(m.group(0) for number, m in rows if number > last_row)
+                        body = body[:first.start()]
+                    head = _DIMENSION_RE.sub(
+                        lambda m: f'<dimension ref="{m.group(1)}1:{m.group(2)}{max(int(m.group(3)), last_row)}" />',
+                        head,
+                        count=1
+                    )
+
+                with target.open(item.filename, "w", force_zip64=True) as dst:
+                    dst.write((head + body).encode("utf-8"))
+                    self._spool.seek(0)
+                    shutil.copyfileobj(self._spool, dst, 1024 * 1024)
+                    dst.write((below + tail).encode("utf-8"))
+
+    def save(self, save_path: str, marks_filler: str = "") -> str:
+        """Write the finished workbook to ``save_path``."""
+        self._flush()
+        self._fill_small_sheets(marks_filler)
+
+        directory = os.path.dirname(os.path.abspath(save_path))
+        fd, package_path = tempfile.mkstemp(suffix=".xlsm", dir=directory)
+        os.close(fd)
+        try:
+            self.workbook.save(package_path)
+            self._splice_students(package_path, save_path)
+        finally:
+            os.remove(package_path)
+            self.close()
+        return save_path
+
+    def close(self):
+        """Release the spool file and the template workbook."""
+        self._buffer.clear()
+        if not self._spool.closed:
+            self._spool.close()
+        self.workbook.close()
+
+
+def build_entry_workbook(
+    save_path: str,
+    exam_id: str,
+    practical_mode: int,
+    marks_filler: str,
+    records: List[Tuple]
+) -> Tuple[str, int, float]:
+    """
+    Build one entry workbook from the records of a single school.
+
+    Top-level so it can run in a process pool worker. Returns the saved path,
+    the number of Students rows and the build time in seconds.
+    """
+    start_time = time.perf_counter()
+    workbook = StreamingEntryWorkbook(exam_id, practical_mode)
+    workbook.add_records(records)
+    row_count = workbook.row_count
+    workbook.save(save_path, marks_filler)
+    return save_path, row_count, time.perf_counter() - start_time
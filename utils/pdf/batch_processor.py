@@ -1,94 +1,168 @@
 # app/utils/batch_processor.py
 
+import asyncio
 import os
+import time
 import pandas as pd
-from typing import List, Tuple
+from concurrent.futures import as_completed
+from typing import Any, AsyncIterator, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from app.core.process_pool import get_process_pool
 from utils.pdf.pdf_processor import PDFTableProcessor
 import traceback
 from datetime import datetime
 import numpy as np
 
 
+class PDFFileResult(NamedTuple):
+    """Outcome of one PDF: its student rows (None on failure) and its report row."""
+    index: int
+    pdf_path: str
+    student_data: Optional[pd.DataFrame]
+    report: Dict[str, Any]
+    error: Optional[str]
+    seconds: float
+
+
+def process_pdf_file(index: int, pdf_path: str) -> PDFFileResult:
+    """
+    Parse one PDF into student rows with the school info columns inserted.
+
+    Top-level so it can run in a process pool worker; failures are returned,
+    not raised, so one bad file does not stop a batch.
+    """
+    start_time = time.perf_counter()
+    print(f"[BatchPDFProcessor] Processing file: {pdf_path}")
+    try:
+        student_data, _, school_info = PDFTableProcessor.extract_tables(pdf_path)
+
+        # Remove repeater column if exists (accepting common typos)
+        for col in ['REPEATER', 'RETAEPER']:
+            if col in student_data.columns:
+                student_data = student_data.drop(columns=[col])
+                print(f"[BatchPDFProcessor] Removed column: {col}")
+
+        # Find first subject column index (subject headers are numeric strings)
+        subject_col_idx = None
+        for idx, col in enumerate(student_data.columns):
+            if col.isdigit():
+                subject_col_idx = idx
+                break
+
+        # Columns to insert
+        school_info_cols = ['EXAM_TYPE', 'CENTRE_NUMBER', 'EXAM_YEAR', 'SCHOOL_NAME']
+        insert_df = pd.DataFrame({
+            key: [school_info.get(key, '')] * len(student_data)
+            for key in school_info_cols
+        })
+
+        # Insert school info columns before first subject column or at start if no subject found
+        if subject_col_idx is not None:
+            insert_pos = subject_col_idx
+        else:
+            insert_pos = 0  # fallback: insert at beginning
+
+        left = student_data.iloc[:, :insert_pos]
+        right = student_data.iloc[:, insert_pos:]
+        student_data = pd.concat([left, insert_df, right], axis=1)
+
+        report = {
+            'SCHOOL NAME': school_info.get('SCHOOL_NAME', ''),
+            'CENTRE NUMBER': school_info.get('CENTRE_NUMBER', ''),
+            'SCHOOL TYPE': school_info.get('SCHOOL_TYPE', ''),
+            'EXAM TYPE': school_info.get('EXAM_TYPE', ''),
+            'EXAM YEAR': school_info.get('EXAM_YEAR', ''),
+            'STATUS': 'Success',
+            'FILE NAME': os.path.basename(pdf_path),
+            'STUDENT COUNT': len(student_data)
+        }
+
+        print(f"[BatchPDFProcessor] Processed {pdf_path}: {len(student_data)} students")
+        return PDFFileResult(index, pdf_path, student_data, report, None, time.perf_counter() - start_time)
+
+    except Exception as e:
+        error_message = f"Failed to process {pdf_path}: {e}"
+        traceback.print_exc()
+        report = {
+            'SCHOOL NAME': '',
+            'CENTRE NUMBER': '',
+            'SCHOOL TYPE': '',
+            'EXAM TYPE': '',
+            'EXAM YEAR': '',
+            'STATUS': error_message,
+            'FILE NAME': os.path.basename(pdf_path),
+            'STUDENT NAME': 0
+        }
+        print(f"[BatchPDFProcessor] {error_message}")
+        return PDFFileResult(index, pdf_path, None, report, error_message, time.perf_counter() - start_time)
+
+
 class BatchPDFProcessor:
 
     @staticmethod
-    def process_pdf_files(pdf_paths: List[str], split_names: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def combine_results(results: List[PDFFileResult]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Combine per-file results in input order into student data and report data."""
+        results = sorted(results, key=lambda result: result.index)
+        all_student_data = [result.student_data for result in results if result.student_data is not None]
+        student_df = pd.concat(all_student_data, ignore_index=True) if all_student_data else pd.DataFrame()
+        report_df = pd.DataFrame([result.report for result in results])
+        return student_df, report_df
+
+    @staticmethod
+    def iter_pdf_results(pdf_paths: List[str], parallel: bool = True) -> Iterator[PDFFileResult]:
+        """
+        Yield per-file results, failures included. With ``parallel`` the files are
+        fanned out to the process pool and results come in completion order.
+        """
+        if not parallel or len(pdf_paths) < 2:
+            for index, pdf_path in enumerate(pdf_paths):
+                yield process_pdf_file(index, pdf_path)
+            return
+
+        pool = get_process_pool()
+        futures = [pool.submit(process_pdf_file, index, pdf_path) for index, pdf_path in enumerate(pdf_paths)]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    async def iter_pdf_results_async(pdf_paths: List[str]) -> AsyncIterator[PDFFileResult]:
+        """Yield per-file results as the process pool finishes them, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        tasks = [
+            loop.run_in_executor(pool, process_pdf_file, index, pdf_path)
+            for index, pdf_path in enumerate(pdf_paths)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def process_pdf_files(pdf_paths: List[str], split_names: bool = False, parallel: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
         Process multiple PDF files and return combined student data and report data.
+
+        With ``parallel`` the PDFs are parsed on a process pool; the combined
+        frames are the same as for the serial path.
         """
         print(f"[BatchPDFProcessor] Starting processing of {len(pdf_paths)} PDF files...")
-        all_student_data = []
-        report_data = []
-
-        for pdf_path in pdf_paths:
-            print(f"[BatchPDFProcessor] Processing file: {pdf_path}")
-            try:
-                student_data, _, school_info = PDFTableProcessor.extract_tables(pdf_path)
-
-                # Remove repeater column if exists (accepting common typos)
-                for col in ['REPEATER', 'RETAEPER']:
-                    if col in student_data.columns:
-                        student_data = student_data.drop(columns=[col])
-                        print(f"[BatchPDFProcessor] Removed column: {col}")
-
-                # Find first subject column index (subject headers are numeric strings)
-                subject_col_idx = None
-                for idx, col in enumerate(student_data.columns):
-                    if col.isdigit():
-                        subject_col_idx = idx
-                        break
-
-                # Columns to insert
-                school_info_cols = ['EXAM_TYPE', 'CENTRE_NUMBER', 'EXAM_YEAR', 'SCHOOL_NAME']
-                insert_df = pd.DataFrame({
-                    key: [school_info.get(key, '')] * len(student_data)
-                    for key in school_info_cols
-                })
-
-                # Insert school info columns before first subject column or at start if no subject found
-                if subject_col_idx is not None:
-                    insert_pos = subject_col_idx
-                else:
-                    insert_pos = 0  # fallback: insert at beginning
-
-                left = student_data.iloc[:, :insert_pos]
-                right = student_data.iloc[:, insert_pos:]
-                student_data = pd.concat([left, insert_df, right], axis=1)
-
-                all_student_data.append(student_data)
-
-                report_data.append({
-                    'SCHOOL NAME': school_info.get('SCHOOL_NAME', ''),
-                    'CENTRE NUMBER': school_info.get('CENTRE_NUMBER', ''),
-                    'SCHOOL TYPE': school_info.get('SCHOOL_TYPE', ''),
-                    'EXAM TYPE': school_info.get('EXAM_TYPE', ''),
-                    'EXAM YEAR': school_info.get('EXAM_YEAR', ''),
-                    'STATUS': 'Success',
-                    'FILE NAME': os.path.basename(pdf_path),
-                    'STUDENT COUNT': len(student_data)
-                })
-
-                print(f"[BatchPDFProcessor] Processed {pdf_path}: {len(student_data)} students")
-
-            except Exception as e:
-                error_message = f"Failed to process {pdf_path}: {e}"
-                traceback.print_exc()
-                report_data.append({
-                    'SCHOOL NAME': '',
-                    'CENTRE NUMBER': '',
-                    'SCHOOL TYPE': '',
-                    'EXAM TYPE': '',
-                    'EXAM YEAR': '',
-                    'STATUS': error_message,
-                    'FILE NAME': os.path.basename(pdf_path),
-                    'STUDENT NAME': 0
-                })
-                print(f"[BatchPDFProcessor] {error_message}")
-                continue
-
-        student_df = pd.concat(all_student_data, ignore_index=True) if all_student_data else pd.DataFrame()
-        report_df = pd.DataFrame(report_data)
+        results = list(BatchPDFProcessor.iter_pdf_results(pdf_paths, parallel=parallel))
+        student_df, report_df = BatchPDFProcessor.combine_results(results)
+        print("[BatchPDFProcessor] Processing complete.")
+        return student_df, report_df
 
+    @staticmethod
+    async def process_pdf_files_async(pdf_paths: List[str], split_names: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Parallel ``process_pdf_files`` for async callers; the event loop stays free while PDFs are parsed."""
+        print(f"[BatchPDFProcessor] Starting parallel processing of {len(pdf_paths)} PDF files...")
+        results = [result async for result in BatchPDFProcessor.iter_pdf_results_async(pdf_paths)]
+        student_df, report_df = BatchPDFProcessor.combine_results(results)
         print("[BatchPDFProcessor] Processing complete.")
         return student_df, report_df
 
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import logging
+import pandas as pd
+from utils.pdf.batch_processor import BatchPDFProcessor
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def time_call(label: str, func, *args, **kwargs):
+    start_time = time.time()
+    result = func(*args, **kwargs)
+    elapsed_time = time.time() - start_time
+    logging.info(f"{label} completed in {elapsed_time:.3f} seconds")
+    return result, elapsed_time
+
+
+def benchmark_batch_processing(folder_path: str):
+    """Compare serial and process-pool parsing of every PDF in a folder of NECTA results."""
+    pdf_paths = sorted(
+        os.path.join(folder_path, file)
+        for file in os.listdir(folder_path)
+        if file.lower().endswith('.pdf')
+    )
+    if not pdf_paths:
+        raise ValueError(f"No PDF files found in {folder_path}")
+    logging.info(f"Batch PDF benchmark: {len(pdf_paths)} files, {os.cpu_count()} CPUs")
+
+    (serial_students, serial_report), serial_time = time_call(
+        "serial", BatchPDFProcessor.process_pdf_files, pdf_paths
+    )
+    (parallel_students, parallel_report), parallel_time = time_call(
+        "process pool", BatchPDFProcessor.process_pdf_files, pdf_paths, parallel=True
+    )
+
+    pd.testing.assert_frame_equal(serial_students, parallel_students)
+    pd.testing.assert_frame_equal(serial_report, parallel_report)
+    failures = int((serial_report['STATUS'] != 'Success').sum()) if 'STATUS' in serial_report else 0
+    logging.info(
+        f"Outputs identical ({len(serial_students)} students, {failures} failed files), "
+        f"{len(pdf_paths) / max(parallel_time, 1e-9):.1f} PDFs/s, speed-up x{serial_time / max(parallel_time, 1e-9):.1f}"
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m utils.pdf.benchmark <folder of NECTA PDFs>")
+        sys.exit(1)
+    benchmark_batch_processing(sys.argv[1])
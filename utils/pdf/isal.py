@@ -1,6 +1,7 @@
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 import uuid
 from pathlib import Path
 from typing import List, Dict, Tuple
@@ -45,6 +46,23 @@ StudentRecord = Tuple[str, str, str]
 SubjectData = Dict[str, List[StudentRecord]]
 SchoolInfo = Dict[str, str]
 
+def build_school_info(
+    ministry: str,
+    exam_board: str,
+    centre_number: str,
+    school_name: str,
+    council_name: str,
+    region_name: str,
+    report_name: str
+) -> SchoolInfo:
+    """Page header lines for one examination centre"""
+    return {
+        "ministry": ministry.upper(),
+        "exam_board": exam_board.upper(),
+        "school_name": f"EXAMINATION CENTRE:{centre_number} - {school_name.upper()} ({council_name.upper()}, {region_name.upper()})",
+        "report_name": report_name.upper()
+    }
+
 async def get_student_subjects_by_centre_and_exam(
     db: AsyncSession, 
     centre_number: str, 
@@ -130,12 +148,10 @@ async def get_student_subjects_by_centre_and_exam(
 
         school_row = result_proxy_school.first()
         if school_row:
-            school_info = {
-                "ministry": ministry.upper(),
-                "exam_board": school_row.exam_name.upper(),
-                "school_name": f"EXAMINATION CENTRE:{centre_number} - {school_row.school_name.upper()} ({school_row.council_name.upper()}, {school_row.region_name.upper()})",
-                "report_name": report_name.upper()
-            }
+            school_info = build_school_info(
+                ministry, school_row.exam_name, centre_number, school_row.school_name,
+                school_row.council_name, school_row.region_name, report_name
+            )
                 
     except Exception as e:
         raise
@@ -266,15 +282,7 @@ class AsyncAttendancePDFGenerator:
         separate_every: int
     ):
         """Synchronous PDF generation (runs in thread pool)"""
-        generator = _AttendancePDFGeneratorInternal(
-            filename=filename,
-            school_info=school_info,
-            subjects_data=subjects_data,
-            include_score=include_score,
-            underscore_mode=underscore_mode,
-            separate_every=separate_every
-        )
-        generator.generate()
+        render_attendance_pdf(filename, school_info, subjects_data, include_score, underscore_mode, separate_every)
 
 class _AttendancePDFGeneratorInternal:
     def __init__(
@@ -414,4 +422,30 @@ class _AttendancePDFGeneratorInternal:
                 global_page += 1
                 c.showPage()
 
-        c.save()
\ No newline at end of file
+        c.save()
+
+
+def render_attendance_pdf(
+    filename: str,
+    school_info: SchoolInfo,
+    subjects_data: SubjectData,
+    include_score: bool = True,
+    underscore_mode: bool = True,
+    separate_every: int = 10
+) -> Tuple[str, float]:
+    """
+    Render one attendance PDF and return its path and render time in seconds.
+
+    Top-level so it can be pickled into a process pool worker.
+    """
+    start_time = time.perf_counter()
+    generator = _AttendancePDFGeneratorInternal(
+        filename=filename,
+        school_info=school_info,
+        subjects_data=subjects_data,
+        include_score=include_score,
+        underscore_mode=underscore_mode,
+        separate_every=separate_every
+    )
+    generator.generate()
+    return filename, time.perf_counter() - start_time
@@ -10,6 +10,7 @@ import os
 import traceback
 import logging
 from uuid6 import uuid7
+from app.db.database import db_pools
 
 
 import aiomysql
@@ -53,9 +54,7 @@ class PDFTableProcessor:
         Saves processing information to database asynchronously
         """
         try:
-            # Create connection pool
-            pool = await aiomysql.create_pool(**PDFTableProcessor.DB_CONFIG)
-            async with pool.acquire() as connection:
+            async with db_pools.acquire() as connection:
                 async with connection.cursor() as cursor:
                     # Create table if not exists
                     await cursor.execute("""
@@ -90,14 +89,57 @@ class PDFTableProcessor:
         except aiomysql.Error as e:
             print(f"Database error: {e}")
             traceback.print_exc()
-        finally:
-            if 'pool' in locals():
-                pool.close()
-                await pool.wait_closed()
+
+    SCHOOL_HEADER_PATTERN = re.compile(
+        r'(?P<exam_type>STNA|SFNA|PSLE|FTNA|CSEE|ACSEE|DSEE)\s*(?P<year>\d{4})\s*[:;]\s*(?P<centre>[A-Z]\d+)\s*[-–]\s*(?P<school>.+)',
+        re.IGNORECASE
+    )
+
+    SCHOOL_HEADER_ALT_PATTERN = re.compile(
+        r'(?P<centre>[A-Z]\d+)\s*[-–]\s*(?P<school>.+)',
+        re.IGNORECASE
+    )
 
     @staticmethod
-    def extract_school_info(pdf_path: str, first_candidate: Optional[str] = None) -> Dict[str, str]:
-        """Extract school information from PDF text"""
+    def _match_school_header(text: Optional[str]) -> Optional[Dict[str, str]]:
+        """Return the header fields of the first line in ``text`` that names the school, if any"""
+        if not text:
+            return None
+
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+
+            match = PDFTableProcessor.SCHOOL_HEADER_PATTERN.search(line)
+            if match:
+                groups = match.groupdict()
+                header = {}
+                if groups.get('exam_type'):
+                    header['EXAM_TYPE'] = groups['exam_type'].upper()
+                if groups.get('year'):
+                    header['EXAM_YEAR'] = groups['year']
+                if groups.get('centre'):
+                    header['CENTRE_NUMBER'] = groups['centre'].upper()
+                if groups.get('school'):
+                    header['SCHOOL_NAME'] = groups['school'].strip()
+                return header
+
+            match = PDFTableProcessor.SCHOOL_HEADER_ALT_PATTERN.search(line)
+            if match:
+                groups = match.groupdict()
+                header = {}
+                if groups.get('centre'):
+                    header['CENTRE_NUMBER'] = groups['centre'].upper()
+                if groups.get('school'):
+                    header['SCHOOL_NAME'] = groups['school'].strip()
+                return header
+
+        return None
+
+    @staticmethod
+    def _build_school_info(header: Optional[Dict[str, str]]) -> Dict[str, str]:
+        """Clean the matched header fields into the school info dict (empty fields dropped)"""
         school_info = {
             'EXAM_TYPE': '',
             'CENTRE_NUMBER': '',
@@ -105,73 +147,63 @@ class PDFTableProcessor:
             'SCHOOL_NAME': '',
             'SCHOOL_TYPE':''
         }
-        
-        prefix_mapping = {
-            'P': 'PSLE',
-            'S': 'CSEE',
-            'F': 'FTNA',
-            'D': 'DSEE',
-            'A': 'ACSEE',
-            'T': 'STNA',
-            'N': 'SFNA'
-        }
-        
-        # if first_candidate:
-        #     match = re.search(r'([A-Za-z]+)\d+', first_candidate.upper())
-        #     if match and match.group(1) and match.group(1)[0] in prefix_mapping:
-        #         school_info['EXAM_TYPE'] = prefix_mapping[match.group(1)[0]]
+        school_info.update(header or {})
+
+        if school_info['SCHOOL_NAME']:
+            school_info['SCHOOL_NAME'] = re.sub(r'[^\w\s-]', '', school_info['SCHOOL_NAME']).strip()
+            school_info['SCHOOL_NAME'] = re.sub(r'[A-Za-z]?\d{4,}', '', school_info['SCHOOL_NAME']).strip()
 
+        return {k: v for k, v in school_info.items() if v}
+
+    @staticmethod
+    def extract_school_info(pdf_path: str, first_candidate: Optional[str] = None) -> Dict[str, str]:
+        """Extract school information from PDF text, reading pages only until the header line is found"""
         with pdfplumber.open(pdf_path) as pdf:
-            text_lines = []
+            header = None
             for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    text_lines.extend(text.split('\n'))
-            
-            pattern = re.compile(
-                r'(?P<exam_type>STNA|SFNA|PSLE|FTNA|CSEE|ACSEE|DSEE)\s*(?P<year>\d{4})\s*[:;]\s*(?P<centre>[A-Z]\d+)\s*[-–]\s*(?P<school>.+)',
-                re.IGNORECASE
-            )
-            
-            alt_pattern = re.compile(
-                r'(?P<centre>[A-Z]\d+)\s*[-–]\s*(?P<school>.+)',
-                re.IGNORECASE
-            )
-            
-            for line in text_lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                match = pattern.search(line)
-                if match:
-                    groups = match.groupdict()
-                    if groups.get('exam_type'):
-                        school_info['EXAM_TYPE'] = groups['exam_type'].upper()
-                    if groups.get('year'):
-                        school_info['EXAM_YEAR'] = groups['year']
-                    if groups.get('centre'):
-                        school_info['CENTRE_NUMBER'] = groups['centre'].upper()
-                    if groups.get('school'):
-                        school_info['SCHOOL_NAME'] = groups['school'].strip()
-                    break
-                
-                match = alt_pattern.search(line)
-                if match:
-                    groups = match.groupdict()
-                    if groups.get('centre'):
-                        school_info['CENTRE_NUMBER'] = groups['centre'].upper()
-                    if groups.get('school'):
-                        school_info['SCHOOL_NAME'] = groups['school'].strip()
+                header = PDFTableProcessor._match_school_header(page.extract_text())
+                page.close()
+                if header is not None:
                     break
-            
-            if school_info['SCHOOL_NAME']:
-                school_info['SCHOOL_NAME'] = re.sub(r'[^\w\s-]', '', school_info['SCHOOL_NAME']).strip()
-                school_info['SCHOOL_NAME'] = re.sub(r'[A-Za-z]?\d{4,}', '', school_info['SCHOOL_NAME']).strip()
-            
-            school_info = {k: v for k, v in school_info.items() if v}
-            
-            return school_info
+
+            return PDFTableProcessor._build_school_info(header)
+
+    @staticmethod
+    def _clean_page_tables(page_tables: list) -> List[pd.DataFrame]:
+        """Turn the raw tables of one page into DataFrames, dropping blank rows and header-only tables"""
+        tables = []
+        for table in page_tables:
+            if table and len(table) > 1:
+                clean_table = [
+                    [str(c).strip() if c is not None else '' 
+                    for c in row] 
+                    for row in table if any(c and str(c).strip() for c in row)
+                ]
+                if len(clean_table) > 1:
+                    df = pd.DataFrame(clean_table[1:], columns=clean_table[0])
+                    tables.append(df)
+        return tables
+
+    @staticmethod
+    def extract_document(pdf_path: str) -> Tuple[List[pd.DataFrame], Dict[str, str]]:
+        """
+        Open the PDF once and return its cleaned tables together with the school info.
+
+        Each page is laid out once: the same page object serves ``extract_tables``
+        and, until the header line has been found (normally on the first page),
+        ``extract_text``. Pages are closed as soon as they are done so their
+        parsed objects do not pile up.
+        """
+        with pdfplumber.open(pdf_path) as pdf:
+            tables = []
+            header = None
+            for page in pdf.pages:
+                tables.extend(PDFTableProcessor._clean_page_tables(page.extract_tables()))
+                if header is None:
+                    header = PDFTableProcessor._match_school_header(page.extract_text())
+                page.close()
+
+        return tables, PDFTableProcessor._build_school_info(header)
 
     @staticmethod
     def _is_valid_necta(table: pd.DataFrame, table_index: int, is_fee_table: bool) -> Tuple[bool, str]:
@@ -190,58 +222,38 @@ class PDFTableProcessor:
     @staticmethod
     def extract_tables(pdf_path: str) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, str]]:
         """Extract and process tables from PDF"""
-        with pdfplumber.open(pdf_path) as pdf:
-            tables = []
-            for page in pdf.pages:
-                page_tables = page.extract_tables()
-                for table in page_tables:
-                    if table and len(table) > 1:
-                        clean_table = [
-                            [str(c).strip() if c is not None else '' 
-                            for c in row] 
-                            for row in table if any(c and str(c).strip() for c in row)
-                        ]
-                        if len(clean_table) > 1:
-                            df = pd.DataFrame(clean_table[1:], columns=clean_table[0])
-                            tables.append(df)
-            
-            if not tables:
-                raise ValueError("No tables found in PDF")
-            
-            # Check if first table is a fee table
-            fee_columns = {'DEPOSITOR NAME', 'DATE', 'CONTROL NO.', 'AMOUNT', 'CAND NO.'}
-            start_index = 0
-            is_fee_table = False
-            if tables and set(str(c).upper() for c in tables[0].columns).issuperset(fee_columns):
-                start_index = 1
-                is_fee_table = True
-                logger.info("Detected fee table as first table, skipping to second table")
-            else:
-                logger.info("No fee table detected, starting with first table")
-            
-            # Validate NECTA format using the appropriate table
-            if start_index >= len(tables):
-                logger.error("No tables available after skipping fee table")
-                raise ValueError("No valid tables found after fee table")
-            
-            is_valid, school_type = PDFTableProcessor._is_valid_necta(tables[start_index], start_index, is_fee_table)
-            if not is_valid:
-                logger.error(f"Table {start_index + 1} is not a valid NECTA document")
-                raise ValueError("Invalid NECTA document format")
-            
-            # Log columns of all tables for debugging
-            for i, table in enumerate(tables):
-                # logger.info(f"Table {i + 1} columns: {list(table.columns)}")
-                pass
-            
-            first_candidate = tables[start_index].iloc[0, 0] if len(tables[start_index]) > 0 else None
-            school_info = PDFTableProcessor.extract_school_info(pdf_path, first_candidate)
-            school_info['SCHOOL_TYPE'] = school_type
-            
-            main_data = PDFTableProcessor._process_main_tables(tables[start_index:-1])
-            subjects_df = PDFTableProcessor._process_subjects_table(tables[-1])
-            
-            return main_data, subjects_df, school_info
+        tables, school_info = PDFTableProcessor.extract_document(pdf_path)
+
+        if not tables:
+            raise ValueError("No tables found in PDF")
+        
+        # Check if first table is a fee table
+        fee_columns = {'DEPOSITOR NAME', 'DATE', 'CONTROL NO.', 'AMOUNT', 'CAND NO.'}
+        start_index = 0
+        is_fee_table = False
+        if tables and set(str(c).upper() for c in tables[0].columns).issuperset(fee_columns):
+            start_index = 1
+            is_fee_table = True
+            logger.info("Detected fee table as first table, skipping to second table")
+        else:
+            logger.info("No fee table detected, starting with first table")
+        
+        # Validate NECTA format using the appropriate table
+        if start_index >= len(tables):
+            logger.error("No tables available after skipping fee table")
+            raise ValueError("No valid tables found after fee table")
+        
+        is_valid, school_type = PDFTableProcessor._is_valid_necta(tables[start_index], start_index, is_fee_table)
+        if not is_valid:
+            logger.error(f"Table {start_index + 1} is not a valid NECTA document")
+            raise ValueError("Invalid NECTA document format")
+        
+        school_info['SCHOOL_TYPE'] = school_type
+        
+        main_data = PDFTableProcessor._process_main_tables(tables[start_index:-1])
+        subjects_df = PDFTableProcessor._process_subjects_table(tables[-1])
+        
+        return main_data, subjects_df, school_info
 
     @staticmethod
     def _process_main_tables(tables: list) -> pd.DataFrame:
@@ -665,7 +677,6 @@ class PDFTableProcessor:
         if not PDFTableProcessor.DB_CONFIG['password']:
             logger.warning("DB_PASSWORD is empty. This is insecure for production environments.")
 
-        pool = None
         conn = None
         cursor = None
         # Initialize results for tables that might be affected
@@ -674,19 +685,7 @@ class PDFTableProcessor:
         results['errors'] = []
 
         try:
-            # Create connection pool
-            logger.info("Creating MySQL connection pool")
-            pool = await aiomysql.create_pool(
-                host=PDFTableProcessor.DB_CONFIG['host'],
-                port=PDFTableProcessor.DB_CONFIG['port'],
-                user=PDFTableProcessor.DB_CONFIG['user'],
-                password=PDFTableProcessor.DB_CONFIG['password'],
-                db=PDFTableProcessor.DB_CONFIG['db'],
-                maxsize=PDFTableProcessor.DB_CONFIG['pool_size'],
-                charset='utf8mb4'
-            )
-
-            async with pool.acquire() as conn:
+            async with db_pools.acquire() as conn:
                 async with conn.cursor() as cursor:
                     for idx, statement in enumerate(insert_statements):
                         # Identify table type
@@ -742,12 +741,6 @@ class PDFTableProcessor:
         finally:
             if cursor:
                 await cursor.close()
-            if conn:
-                await conn.close()
-            if pool:
-                pool.close()
-                await pool.wait_closed()
-                logger.info("Database connection pool closed")
 
         logger.debug(f"Returning results: {affected_results}")
         return affected_results
@@ -1,6 +1,6 @@
 import os
 import asyncio
-import aiomysql
+from app.db.database import db_pools
 from typing import Dict, List, Optional, Union
 import aiohttp
 from pydantic import BaseModel
@@ -35,18 +35,10 @@ class KiyaboAPIClient:
         await self.initialize_http_session()
     
     async def initialize_db(self):
-        """Initialize the database connection pool"""
+        """Borrow the shared database connection pool"""
         try:
-            self.pool = await aiomysql.create_pool(
-                host=os.getenv("DB_HOST"),
-                port=int(os.getenv("DB_PORT", 3306)),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                db=os.getenv("DB_NAME"),
-                minsize=1,
-                maxsize=int(os.getenv("DB_POOL_SIZE", 5)),
-                autocommit=True
-            )
+            await db_pools.get_pool()
+            self.pool = db_pools.lease(autocommit=True)
         except Exception as e:
             raise RuntimeError(f"Failed to initialize database pool: {str(e)}")
     
@@ -66,15 +58,8 @@ class KiyaboAPIClient:
             logger.error(f"Error during cleanup: {str(e)}")
     
     async def close_db(self):
-        """Close the database connection pool"""
-        if self.pool:
-            try:
-                self.pool.close()
-                await self.pool.wait_closed()
-            except Exception as e:
-                logger.error(f"Error closing database pool: {str(e)}")
-            finally:
-                self.pool = None
+        """Release the shared database pool (it stays open for other users)"""
+        self.pool = None
     
     async def close_http_session(self):
         """Close aiohttp client session"""
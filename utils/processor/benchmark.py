@@ -0,0 +1,316 @@
+import asyncio
+import time
+import logging
+import tracemalloc
+import aiomysql
+import numpy as np
+import pandas as pd
+from uuid6 import uuid6
+from utils.processor.columnar import read_frame
+from utils.processor.encoding import RANK_SENTINEL, decode_ranks, encode_frame
+from utils.processor.lookup import ThresholdLookup
+from utils.processor.ranking import RESULT_RANK_COLUMNS, RESULT_RANK_LEVELS, rank_levels
+from utils.processor.subjects import SubjectProcessor
+
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# CSEE style bands used for the synthetic runs
+GRADE_BANDS = pd.DataFrame({
+    'grade': ['A', 'B', 'C', 'D', 'F'],
+    'lower_value': [75.0, 65.0, 45.0, 30.0, 0.0],
+    'division_points': [1, 2, 3, 4, 5],
+})
+DIVISION_BANDS = pd.DataFrame({
+    'division': ['I', 'II', 'III', 'IV', '0'],
+    'lowest_points': [7, 18, 22, 26, 34],
+})
+
+
+def synthetic_marks(n_rows: int, seed: int = 0) -> np.ndarray:
+    """Marks with ~5% nulls and a sprinkle of outliers, like a real upload."""
+    rng = np.random.default_rng(seed)
+    marks = rng.uniform(-2, 102, n_rows).round(1)
+    marks[rng.random(n_rows) < 0.05] = np.nan
+    return marks
+
+
+def time_call(label: str, func, *args):
+    start_time = time.time()
+    result = func(*args)
+    elapsed_time = time.time() - start_time
+    logging.info(f"{label} completed in {elapsed_time:.3f} seconds")
+    return result, elapsed_time
+
+
+def legacy_threshold_scan(values, bands, missing=np.nan, valid_range=None):
+    """Per-row band scan as previously done in DivisionProcessor.process_data."""
+    results = []
+    for value in values:
+        if pd.isna(value):
+            results.append(missing)
+            continue
+        if valid_range and (value < valid_range[0] or value > valid_range[1]):
+            results.append(missing)
+            continue
+        for lower, label in bands:
+            if value >= lower:
+                results.append(label)
+                break
+        else:
+            results.append(missing)
+    return results
+
+
+def benchmark_threshold_lookup(n_rows: int = 600_000, n_columns: int = 8):
+    """Compare per-row band scans against ThresholdLookup for best-N points and divisions."""
+    logging.info(f"Threshold lookup benchmark: {n_rows} rows x {n_columns} best columns")
+    columns = [synthetic_marks(n_rows, seed) for seed in range(n_columns)]
+    points_bands = list(GRADE_BANDS.sort_values('lower_value', ascending=False)[['lower_value', 'division_points']].itertuples(index=False, name=None))
+    division_bands = list(DIVISION_BANDS.sort_values('lowest_points', ascending=False)[['lowest_points', 'division']].itertuples(index=False, name=None))
+
+    def run_legacy():
+        points = [legacy_threshold_scan(col, points_bands, valid_range=(0, 100)) for col in columns]
+        totals = np.nansum(np.array(points, dtype=np.float64), axis=0)
+        return points, legacy_threshold_scan(totals, division_bands, missing='ABS')
+
+    def run_lookup():
+        points_lookup = ThresholdLookup.from_frame(GRADE_BANDS, 'lower_value', 'division_points', valid_range=(0, 100))
+        division_lookup = ThresholdLookup.from_frame(DIVISION_BANDS, 'lowest_points', 'division', missing='ABS')
+        points = [points_lookup.lookup(col) for col in columns]
+        totals = np.nansum(np.array(points), axis=0)
+        return points, division_lookup.lookup(totals)
+
+    (legacy_points, legacy_divisions), legacy_time = time_call("legacy row loops", run_legacy)
+    (new_points, new_divisions), new_time = time_call("ThresholdLookup", run_lookup)
+
+    for old, new in zip(legacy_points, new_points):
+        np.testing.assert_array_equal(np.array(old, dtype=np.float64), new)
+    assert list(legacy_divisions) == list(new_divisions), "Division mapping differs"
+    logging.info(f"Outputs identical, speed-up x{legacy_time / max(new_time, 1e-9):.1f}")
+
+
+def synthetic_results(n_rows: int, n_schools: int = 4000, seed: int = 0) -> pd.DataFrame:
+    """Results-like frame with the location hierarchy and school types."""
+    rng = np.random.default_rng(seed)
+    school = rng.integers(0, n_schools, n_rows)
+    ward = school // 4
+    council = ward // 20
+    avg_marks = rng.uniform(0, 100, n_rows).round(2)
+    avg_marks[rng.random(n_rows) < 0.03] = np.nan
+    return pd.DataFrame({
+        'centre_number': pd.Series(school).map(lambda x: f"S{x:04d}"),
+        'ward_name': pd.Series(ward).map(lambda x: f"W{x}"),
+        'council_name': pd.Series(council).map(lambda x: f"C{x}"),
+        'region_name': pd.Series(council // 8).map(lambda x: f"R{x}"),
+        'school_type': np.where(school % 3 == 0, 'PRIVATE', 'GOVERNMENT'),
+        'avg_marks': avg_marks,
+    })
+
+
+def legacy_rank_in_groups(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-group ranking loop as previously done in DivisionProcessor.process_data."""
+    df = df.copy()
+    df_valid = df[df['avg_marks'] >= 0]
+    df[RESULT_RANK_COLUMNS] = np.nan
+    df.loc[df_valid.index, 'pos'] = df_valid['avg_marks'].rank(method='min', ascending=False)
+    df.loc[df_valid.index, 'out_of'] = len(df_valid)
+    for prefix, group_cols, with_splits in RESULT_RANK_LEVELS:
+        for _, sub in df_valid.groupby(list(group_cols)):
+            df.loc[sub.index, f'{prefix}_pos'] = sub['avg_marks'].rank(method='min', ascending=False)
+            df.loc[sub.index, f'{prefix}_out_of'] = len(sub)
+            if not with_splits:
+                continue
+            for sch_type, suffix in [('GOVERNMENT', 'gvt'), ('PRIVATE', 'pvt')]:
+                mask = sub['school_type'] == sch_type
+                if mask.any():
+                    df.loc[sub[mask].index, f'{prefix}_pos_{suffix}'] = sub.loc[mask, 'avg_marks'].rank(method='min', ascending=False)
+    return df[RESULT_RANK_COLUMNS]
+
+
+def benchmark_rank_levels(n_rows: int = 600_000):
+    """Compare per-group .loc ranking against the rank_levels kernel."""
+    logging.info(f"Ranking benchmark: {n_rows} result rows")
+    df = synthetic_results(n_rows)
+    legacy, legacy_time = time_call("legacy group loops", legacy_rank_in_groups, df)
+    kernel, new_time = time_call("rank_levels", lambda frame: rank_levels(frame)[RESULT_RANK_COLUMNS], df)
+    pd.testing.assert_frame_equal(legacy, kernel, check_dtype=False)
+    logging.info(f"Outputs identical, speed-up x{legacy_time / max(new_time, 1e-9):.1f}")
+
+
+STUDENT_SUBJECT_KINDS = {
+    'id': 'text', 'exam_id': 'str', 'student_global_id': 'str', 'centre_number': 'str', 'subject_code': 'str',
+    'theory_marks': 'float', 'practical_marks': 'float', 'overall_marks': 'float',
+}
+
+
+class SyntheticCursor:
+    """
+    Stands in for an aiomysql cursor over ``student_subjects``.
+
+    Rows are generated on demand with fresh strings per row, as the driver
+    decodes them, so ``fetchall`` pays for the whole result while
+    ``fetchmany`` only holds one chunk. Ids are 36-character uuid6 strings
+    like the real ``student_subjects.id``; they share the time-ordered prefix
+    of one generated id, so every cursor yields the same rows.
+    """
+
+    ID_PREFIX = str(uuid6())[:24]
+
+    def __init__(self, n_rows: int, as_dicts: bool):
+        self.n_rows = n_rows
+        self.as_dicts = as_dicts
+        self.next_row = 0
+        self.marks = synthetic_marks(n_rows)
+        self.description = [(name,) for name in STUDENT_SUBJECT_KINDS]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.next_row = 0
+
+    def _row(self, i: int):
+        mark = self.marks[i]
+        mark = None if np.isnan(mark) else float(mark)
+        row = (f"{self.ID_PREFIX}{i:012x}", 'EXAM-1', f"S{i // 8:07d}", f"S{(i // 8) % 4000:04d}", f"0{i % 8}1", mark, None, mark)
+        return dict(zip(STUDENT_SUBJECT_KINDS, row)) if self.as_dicts else row
+
+    async def fetchmany(self, size: int):
+        stop = min(self.next_row + size, self.n_rows)
+        rows = [self._row(i) for i in range(self.next_row, stop)]
+        self.next_row = stop
+        return rows
+
+    async def fetchall(self):
+        return await self.fetchmany(self.n_rows - self.next_row)
+
+
+class SyntheticConnection:
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+
+    def cursor(self, cursor_class=None):
+        return SyntheticCursor(self.n_rows, as_dicts=cursor_class is aiomysql.DictCursor)
+
+
+def measure_peak(label: str, func):
+    """Run ``func`` once timed and once under tracemalloc for its peak allocation."""
+    result, elapsed_time = time_call(label, func)
+    del result
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    logging.info(f"{label} peak memory {peak / 2 ** 20:.0f} MiB")
+    return result, elapsed_time, peak
+
+
+def benchmark_streamed_read(n_rows: int = 5_000_000):
+    """Compare DictCursor fetchall + DataFrame against read_frame on a synthetic student_subjects read."""
+    logging.info(f"Streamed read benchmark: {n_rows} student subject rows")
+    conn = SyntheticConnection(n_rows)
+
+    async def fetch_dicts():
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute("SELECT ...")
+            return pd.DataFrame(await cursor.fetchall())
+
+    legacy, legacy_time, legacy_peak = measure_peak("DictCursor fetchall", lambda: asyncio.run(fetch_dicts()))
+    streamed, new_time, new_peak = measure_peak(
+        "read_frame", lambda: asyncio.run(read_frame(conn, "SELECT ...", (), STUDENT_SUBJECT_KINDS))
+    )
+    pd.testing.assert_frame_equal(legacy.astype({'practical_marks': 'float64'}), streamed)
+    logging.info(
+        f"Outputs identical, speed-up x{legacy_time / max(new_time, 1e-9):.1f}, "
+        f"peak memory x{legacy_peak / max(new_peak, 1):.1f} lower"
+    )
+
+
+def benchmark_encoded_ranking(n_rows: int = 1_000_000):
+    """Compare ranking an object-column frame against its dictionary-encoded, float32, int32-rank form."""
+    logging.info(f"Encoded ranking benchmark: {n_rows} result rows")
+    df = synthetic_results(n_rows)
+    df['avg_marks'] = df['avg_marks'].astype(np.float32).astype(np.float64)
+    encoded = encode_frame(
+        df, categorical=('centre_number', 'ward_name', 'council_name', 'region_name', 'school_type'), marks=('avg_marks',)
+    )
+    plain, plain_time = time_call("object columns, float ranks", rank_levels, df)
+    compact, new_time = time_call("encoded columns, int32 ranks", lambda frame: rank_levels(frame, sentinel=RANK_SENTINEL), encoded)
+    pd.testing.assert_frame_equal(plain, decode_ranks(compact, compact.columns).astype(np.float64))
+    frame_memory = df.memory_usage(deep=True).sum() + plain.memory_usage().sum()
+    encoded_memory = encoded.memory_usage(deep=True).sum() + compact.memory_usage().sum()
+    logging.info(
+        f"Outputs identical, speed-up x{plain_time / max(new_time, 1e-9):.1f}, "
+        f"memory {frame_memory / 2 ** 20:.0f} MiB -> {encoded_memory / 2 ** 20:.0f} MiB"
+    )
+
+
+# exam_grades rows as SubjectProcessor loads them: exam, grade, lower, highest, grade points, division points
+GRADES_DATA = [
+    ('EXAM-1', 'A', 75.0, 100.0, 1, 1),
+    ('EXAM-1', 'B', 65.0, 74.9, 2, 2),
+    ('EXAM-1', 'C', 45.0, 64.9, 3, 3),
+    ('EXAM-1', 'D', 30.0, 44.9, 4, 4),
+    ('EXAM-1', 'F', 0.0, 29.9, 5, 5),
+]
+
+
+def synthetic_student_subjects(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Student subject rows merged with has_practical, a third of them practical subjects."""
+    rng = np.random.default_rng(seed)
+    practical = synthetic_marks(n_rows, seed + 1) / 2
+    has_practical = rng.integers(0, 3, n_rows) == 0
+    return pd.DataFrame({
+        'theory_marks': synthetic_marks(n_rows, seed) / np.where(has_practical, 2, 1),
+        'practical_marks': np.where(has_practical, practical, np.nan),
+        'has_practical': has_practical.astype(np.int64),
+    })
+
+
+def legacy_marks_and_grades(processor: SubjectProcessor, df: pd.DataFrame):
+    """Row-wise apply as previously done in SubjectProcessor.calculate_grades_and_marks."""
+    def calculate_overall_marks(row):
+        if row['has_practical']:
+            if pd.notnull(row['theory_marks']) or pd.notnull(row['practical_marks']):
+                theory = row['theory_marks'] if pd.notnull(row['theory_marks']) else 0
+                practical = row['practical_marks'] if pd.notnull(row['practical_marks']) else 0
+                return (theory + practical) * 2 / 3
+            return None
+        return row['theory_marks']
+
+    overall = df.apply(calculate_overall_marks, axis=1)
+    grades = overall.apply(
+        lambda marks: processor.lookup_grade_and_division(marks=marks, return_type="grade") if pd.notnull(marks) else None
+    )
+    return overall.to_numpy(dtype=np.float64), grades.to_numpy(dtype=object)
+
+
+def benchmark_subject_grades(n_rows: int = 500_000):
+    """Compare the per-row overall marks and grade scan against the vectorized SubjectProcessor stage."""
+    logging.info(f"Subject marks and grades benchmark: {n_rows} student subject rows")
+    processor = SubjectProcessor('EXAM-1', settings=None)
+    processor.GRADES_DATA = GRADES_DATA
+    df = synthetic_student_subjects(n_rows)
+
+    def run_vectorized():
+        overall = processor.calculate_overall_marks(df)
+        return overall, processor.calculate_subject_grades(overall)
+
+    (legacy_overall, legacy_grades), legacy_time = time_call("row-wise apply", legacy_marks_and_grades, processor, df)
+    (new_overall, new_grades), new_time = time_call("vectorized", run_vectorized)
+    np.testing.assert_array_equal(legacy_overall, new_overall)
+    assert list(legacy_grades) == list(new_grades), "Subject grades differ"
+    logging.info(f"Outputs identical, speed-up x{legacy_time / max(new_time, 1e-9):.1f}")
+
+
+if __name__ == "__main__":
+    benchmark_threshold_lookup()
+    benchmark_rank_levels()
+    benchmark_streamed_read()
+    benchmark_encoded_ranking()
+    benchmark_subject_grades()
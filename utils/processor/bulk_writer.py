@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import time
+import uuid
+import aiomysql
+import numpy as np
+import pandas as pd
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from pymysql.converters import escape_item
+from pymysql.err import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# MySQL deadlock / lock wait timeout
+RETRYABLE_ERRORS = (1213, 1205)
+
+# Rows formatted into SQL literals at a time, bounds the memory held as statement text
+FORMAT_SLICE_ROWS = 100_000
+
+# Kept free of max_allowed_packet for the statement head/tail and protocol overhead
+PACKET_HEADROOM = 64 * 1024
+
+
+def _python_value(value: Any) -> Any:
+    """Unwrap NumPy/pandas scalars into the Python types the driver can escape."""
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def sql_literals(values: pd.Series, charset: str = 'utf8mb4') -> List[str]:
+    """
+    Format a column as SQL literals, one string per row.
+
+    Numeric columns are formatted from their NumPy values in one pass; only
+    text and other object columns go through the driver's per-value escaping.
+    Nulls and non-finite floats become ``NULL``.
+    """
+    dtype = values.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        literals = list(map(str, values.to_numpy(dtype=np.int64, na_value=0).tolist()))
+        nulls = values.isna().to_numpy()
+    elif pd.api.types.is_float_dtype(dtype):
+        array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        nulls = ~np.isfinite(array)
+        finite = array[~nulls]
+        if np.array_equal(finite, np.trunc(finite)) and (finite.size == 0 or np.abs(finite).max() < 2 ** 53):
+            # Whole numbers (ranks, counts held as float because of NaN) are written as integers
+            literals = list(map(str, np.where(nulls, 0, array).astype(np.int64).tolist()))
+        else:
+            # Same double literal the driver writes for a Python float
+            literals = [text if 'e' in text else text + 'e0' for text in map(repr, array.tolist())]
+    else:
+        if dtype == object:
+            # Object columns holding only numbers (e.g. after replace/where) take the numeric path
+            inferred = values.infer_objects()
+            if inferred.dtype != object:
+                return sql_literals(inferred, charset)
+        nulls = values.isna().to_numpy()
+        literals = [
+            'NULL' if null else escape_item(_python_value(value), charset)
+            for value, null in zip(values.astype(object).tolist(), nulls)
+        ]
+    for idx in np.flatnonzero(nulls):
+        literals[idx] = 'NULL'
+    return literals
+
+
+class BulkColumnWriter:
+    """
+    Apply column values to existing rows of a table in bulk.
+
+    Two strategies are available:
+
+    * ``staging``: the frame (key columns plus the columns to write) is loaded
+      into a temporary staging table with multi-row INSERTs, then applied with
+      ``UPDATE table JOIN staging`` in chunked transactions.
+    * ``upsert``: rows are written with multi-row
+      ``INSERT ... ON DUPLICATE KEY UPDATE``, one transaction per statement.
+      ``key`` must be the primary key or a unique key, and the frame must only
+      hold keys that already exist: unknown keys are inserted as new rows.
+
+    Either way this replaces one ``UPDATE ... WHERE id = ...`` round trip per
+    row. Statements are packed up to the server's ``max_allowed_packet`` so a
+    batch never exceeds what the connection can send.
+
+    Args:
+        table: Target table.
+        columns: Columns to write.
+        key: Columns identifying a target row (joined on equality).
+        strategy: ``'staging'`` or ``'upsert'``.
+        chunk_size: Staged rows applied per UPDATE JOIN transaction.
+        max_batch_rows: Upper bound on rows per multi-row statement.
+        max_statement_bytes: Upper bound on statement size, on top of
+            ``max_allowed_packet``.
+        max_retries: Attempts per transaction on deadlock / lock wait timeout.
+    """
+
+    STRATEGIES = ('staging', 'upsert')
+
+    def __init__(
+        self,
+        table: str,
+        columns: Sequence[str],
+        key: Sequence[str] = ('id',),
+        strategy: str = 'staging',
+        chunk_size: int = 50000,
+        max_batch_rows: int = 20000,
+        max_statement_bytes: int = 16 * 1024 * 1024,
+        max_retries: int = 3,
+    ):
+        if not columns:
+            raise ValueError("BulkColumnWriter needs at least one column to write")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Invalid strategy {strategy}, expected one of {self.STRATEGIES}")
+        self.table = table
+        self.columns = list(columns)
+        self.key = list(key)
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.max_batch_rows = max_batch_rows
+        self.max_statement_bytes = max_statement_bytes
+        self.max_retries = max_retries
+
+    @property
+    def col_list(self) -> str:
+        return ', '.join(f'`{col}`' for col in self.key + self.columns)
+
+    async def statement_budget(self, conn: aiomysql.Connection) -> int:
+        """Bytes available for the VALUES part of one statement."""
+        async with conn.cursor() as cursor:
+            await cursor.execute("SELECT @@max_allowed_packet")
+            (max_packet,) = await cursor.fetchone()
+        budget = min(int(max_packet) - PACKET_HEADROOM, self.max_statement_bytes)
+        logger.debug(f"max_allowed_packet={max_packet}, statement budget={budget}")
+        return max(budget, PACKET_HEADROOM)
+
+    def format_batches(self, part: pd.DataFrame, budget: int, charset: str = 'utf8mb4') -> List[Tuple[str, int]]:
+        """``(VALUES list, row count)`` batches of ``part`` that fit in ``budget`` bytes."""
+        literals = [sql_literals(part[col], charset) for col in self.key + self.columns]
+        batches: List[Tuple[str, int]] = []
+        batch: List[str] = []
+        size = 0
+        for row in zip(*literals):
+            text = '(' + ','.join(row) + ')'
+            # Numeric literals are ASCII; text is measured encoded so multi-byte rows are not undercounted
+            row_size = (len(text) if text.isascii() else len(text.encode('utf-8'))) + 1
+            if batch and (size + row_size > budget or len(batch) >= self.max_batch_rows):
+                batches.append((','.join(batch), len(batch)))
+                batch, size = [], 0
+            batch.append(text)
+            size += row_size
+        if batch:
+            batches.append((','.join(batch), len(batch)))
+        return batches
+
+    async def value_batches(self, df: pd.DataFrame, budget: int, charset: str = 'utf8mb4') -> AsyncIterator[Tuple[str, int]]:
+        """
+        Yield ``(VALUES list, row count)`` batches that fit in ``budget`` bytes.
+
+        Each slice of ``FORMAT_SLICE_ROWS`` rows is formatted in a worker
+        thread, so large writes do not hold the event loop.
+        """
+        for start in range(0, len(df), FORMAT_SLICE_ROWS):
+            part = df.iloc[start:start + FORMAT_SLICE_ROWS]
+            for batch in await asyncio.to_thread(self.format_batches, part, budget, charset):
+                yield batch
+
+    async def _run_transaction(self, conn: aiomysql.Connection, sql: str, params: Optional[Tuple] = None, label: str = '') -> int:
+        for attempt in range(self.max_retries):
+            try:
+                await conn.begin()
+                async with conn.cursor() as cursor:
+                    await cursor.execute(sql, params)
+                    affected = cursor.rowcount
+                await conn.commit()
+                return affected
+            except OperationalError as e:
+                await conn.rollback()
+                if e.args and e.args[0] in RETRYABLE_ERRORS and attempt < self.max_retries - 1:
+                    logger.warning(f"Retry {attempt + 1} for {label} of {self.table}: {e}")
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                raise
+
+    async def _write_staging(self, conn: aiomysql.Connection, df: pd.DataFrame, budget: int, charset: str) -> int:
+        staging = f"stg_{self.table}_{uuid.uuid4().hex[:8]}"
+        async with conn.cursor() as cursor:
+            # Staging columns copy their types from the target table
+            await cursor.execute(
+                f"CREATE TEMPORARY TABLE `{staging}` (`_seq` BIGINT AUTO_INCREMENT PRIMARY KEY) "
+                f"SELECT {self.col_list} FROM `{self.table}` LIMIT 0"
+            )
+        try:
+            start_time = time.time()
+            await conn.begin()
+            async with conn.cursor() as cursor:
+                async for values, _ in self.value_batches(df, budget, charset):
+                    # Values are already literals, so no driver-side formatting
+                    await cursor.execute(f"INSERT INTO `{staging}` ({self.col_list}) VALUES {values}")
+            await conn.commit()
+            logger.info(f"Staged {len(df)} rows for {self.table} in {time.time() - start_time:.2f} seconds")
+
+            join_on = ' AND '.join(f't.`{col}` = s.`{col}`' for col in self.key)
+            assignments = ', '.join(f't.`{col}` = s.`{col}`' for col in self.columns)
+            update_sql = (
+                f"UPDATE `{self.table}` t JOIN `{staging}` s ON {join_on} "
+                f"SET {assignments} WHERE s.`_seq` BETWEEN %s AND %s"
+            )
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"SELECT COALESCE(MAX(`_seq`), 0) FROM `{staging}`")
+                (max_seq,) = await cursor.fetchone()
+            affected = 0
+            for first in range(1, max_seq + 1, self.chunk_size):
+                last = min(first + self.chunk_size - 1, max_seq)
+                affected += await self._run_transaction(conn, update_sql, (first, last), f"staged rows {first}-{last}")
+                logger.info(f"Applied staged rows {first}-{last} of {max_seq} to {self.table}")
+            return affected
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            async with conn.cursor() as cursor:
+                await cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS `{staging}`")
+
+    async def _write_upsert(self, conn: aiomysql.Connection, df: pd.DataFrame, budget: int, charset: str) -> int:
+        updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in self.columns)
+        affected = 0
+        written = 0
+        async for values, count in self.value_batches(df, budget, charset):
+            sql = f"INSERT INTO `{self.table}` ({self.col_list}) VALUES {values} ON DUPLICATE KEY UPDATE {updates}"
+            affected += await self._run_transaction(conn, sql, None, f"rows {written + 1}-{written + count}")
+            written += count
+            logger.info(f"Upserted {written} of {len(df)} rows to {self.table}")
+        return affected
+
+    async def write(self, conn: aiomysql.Connection, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Write ``df`` to the table over ``conn``.
+
+        Returns:
+            Dict with the ``strategy``, ``rows`` written, ``affected`` rows
+            reported by MySQL, ``seconds`` taken and ``rows_per_second``.
+        """
+        start_time = time.time()
+        missing = [col for col in self.key + self.columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Frame is missing columns for {self.table}: {missing}")
+
+        affected = 0
+        if not df.empty:
+            budget = await self.statement_budget(conn)
+            charset = getattr(conn, 'charset', None) or 'utf8mb4'
+            if self.strategy == 'staging':
+                affected = await self._write_staging(conn, df, budget, charset)
+            else:
+                affected = await self._write_upsert(conn, df, budget, charset)
+
+        duration = time.time() - start_time
+        rows_per_second = len(df) / duration if duration > 0 else float(len(df))
+        logger.info(f"Wrote {len(df)} rows to {self.table} ({self.strategy}) in {duration:.2f} seconds ({rows_per_second:,.0f} rows/s)")
+        return {
+            'strategy': self.strategy,
+            'rows': len(df),
+            'affected': affected,
+            'seconds': duration,
+            'rows_per_second': rows_per_second,
+        }
@@ -0,0 +1,122 @@
+import logging
+import time
+import aiomysql
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Rows pulled from the server per fetchmany; bounds the Python tuples alive at once
+FETCH_CHUNK_ROWS = 50_000
+
+# Column kinds understood by read_frame and the NumPy dtype they are stored with
+NUMERIC_KINDS = {'int': np.int64, 'float': np.float64, 'float32': np.float32}
+TEXT_KINDS = ('str', 'text', 'category')
+
+
+class _ColumnBuffer:
+    """
+    Preallocated storage of one column, grown by doubling as chunks arrive.
+
+    ``str`` values are interned per column, so repeated text (centre numbers,
+    subject codes) shares one object instead of one per row; ``text`` values
+    (unique keys such as UUIDs, where interning saves nothing) are stored as
+    they arrive; ``category`` values are stored as int32 codes.
+    """
+
+    def __init__(self, kind: str, capacity: int):
+        if kind not in NUMERIC_KINDS and kind not in TEXT_KINDS:
+            raise ValueError(f"Unknown column kind {kind}, expected one of {list(NUMERIC_KINDS) + list(TEXT_KINDS)}")
+        self.kind = kind
+        if kind in NUMERIC_KINDS:
+            dtype = NUMERIC_KINDS[kind]
+        elif kind == 'category':
+            dtype = np.int32
+        else:
+            dtype = object
+        self.data = np.empty(capacity, dtype=dtype)
+        self.values: Dict[object, object] = {}
+
+    def grow(self, capacity: int, filled: int) -> None:
+        data = np.empty(capacity, dtype=self.data.dtype)
+        data[:filled] = self.data[:filled]
+        self.data = data
+
+    def put(self, start: int, values: Sequence) -> None:
+        end = start + len(values)
+        if self.kind in NUMERIC_KINDS:
+            # NumPy turns None into NaN for float columns
+            self.data[start:end] = values
+        elif self.kind == 'text':
+            self.data[start:end] = values
+        elif self.kind == 'str':
+            lookup = self.values
+            self.data[start:end] = [None if value is None else lookup.setdefault(value, value) for value in values]
+        else:
+            lookup = self.values
+            self.data[start:end] = [-1 if value is None else lookup.setdefault(value, len(lookup)) for value in values]
+
+    def finish(self, filled: int):
+        data = self.data[:filled]
+        if filled < len(self.data):
+            # Release the unused tail of the last doubling
+            data = data.copy()
+        if self.kind == 'category':
+            return pd.Categorical.from_codes(data, categories=list(self.values))
+        return data
+
+
+async def read_frame(
+    conn,
+    query: str,
+    params: Sequence,
+    columns: Dict[str, str],
+    chunk_size: int = FETCH_CHUNK_ROWS,
+    expected_rows: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Stream a query into a DataFrame without materialising the whole result.
+
+    Rows are read through an unbuffered ``SSCursor`` with ``fetchmany`` and
+    copied chunk by chunk into preallocated typed arrays, so only one chunk of
+    row tuples is alive at a time instead of the full ``fetchall`` list (or
+    one dict per row with ``DictCursor``).
+
+    Args:
+        conn: aiomysql connection; no other query may run on it until the read finishes.
+        query: SELECT whose columns are, in order, the keys of ``columns``.
+        params: Query parameters.
+        columns: Column name to kind: ``int`` (non-null integers), ``float``
+            (float64, None as NaN), ``float32``, ``str`` (object, repeated
+            values shared), ``text`` (object, for unique keys such as the
+            UUID ``id`` columns) or ``category`` (pandas categorical).
+        chunk_size: Rows per ``fetchmany``.
+        expected_rows: Initial capacity of the arrays, e.g. a known row count.
+
+    Returns:
+        Frame with one column per entry of ``columns``.
+    """
+    start_time = time.time()
+    names: List[str] = list(columns)
+    capacity = max(expected_rows or chunk_size, 1)
+    buffers = [_ColumnBuffer(columns[name], capacity) for name in names]
+    filled = 0
+    async with conn.cursor(aiomysql.SSCursor) as cur:
+        await cur.execute(query, params)
+        if cur.description and len(cur.description) != len(names):
+            raise ValueError(f"Query returns {len(cur.description)} columns, expected {len(names)}: {names}")
+        while True:
+            rows = await cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            if filled + len(rows) > capacity:
+                capacity = max(capacity * 2, filled + len(rows))
+                for buffer in buffers:
+                    buffer.grow(capacity, filled)
+            for buffer, values in zip(buffers, zip(*rows)):
+                buffer.put(filled, values)
+            filled += len(rows)
+    frame = pd.DataFrame({name: buffer.finish(filled) for name, buffer in zip(names, buffers)}, columns=names)
+    logger.debug(f"Streamed {filled} rows x {len(names)} columns in {time.time() - start_time:.2f} seconds")
+    return frame
@@ -6,7 +6,15 @@ import uuid
 import time
 from typing import Dict, List, Any, Tuple
 import logging
-from app.core.config import settings
+from app.db.database import PoolLease, db_pools
+from utils.processor.columnar import read_frame
+from utils.processor.encoding import RANK_SENTINEL, decode_frame, encode_frame
+from utils.processor.lookup import ThresholdLookup
+from utils.processor.ranking import RESULT_RANK_COLUMNS, RESULT_RANK_LEVELS, rank_levels
+from utils.processor.snapshot_cache import exam_snapshots
+
+# Text columns of the results frame held dictionary-encoded while ranking
+RANKING_TEXT_COLUMNS = ('centre_number', 'sex', 'region_name', 'council_name', 'ward_name', 'school_type')
 
 # Configure logging to file
 logging.basicConfig(
@@ -22,20 +30,11 @@ class DivisionProcessor:
         self.logger = logging.getLogger(__name__)
         self.logger.debug(f"Initialized DivisionProcessor with exam_id: {exam_id}")
 
-    async def get_pool(self) -> aiomysql.Pool:
-        self.logger.debug("Creating aiomysql connection pool")
-        pool = await aiomysql.create_pool(
-            host=settings.DB_HOST,
-            port=settings.DB_PORT,
-            user=settings.DB_USER,
-            password=settings.DB_PASSWORD,
-            db=settings.DB_NAME,
-            autocommit=True
-        )
-        self.logger.debug("Connection pool created successfully")
-        return pool
+    async def get_pool(self) -> PoolLease:
+        self.logger.debug("Borrowing the shared database pool")
+        return db_pools.lease(autocommit=True)
 
-    async def validate_centres(self, pool: aiomysql.Pool) -> List[str]:
+    async def validate_centres(self, pool: PoolLease) -> List[str]:
         self.logger.debug("Starting centre validation")
         async with pool.acquire() as conn:
             async with conn.cursor() as cursor:
@@ -51,22 +50,30 @@ class DivisionProcessor:
                 self.logger.debug(f"Found {len(invalid_centres)} invalid centres: {invalid_centres}")
                 return invalid_centres
 
-    async def load_data(self, pool: aiomysql.Pool) -> Tuple[pd.DataFrame, ...]:
+    async def load_data(self, pool: PoolLease) -> Tuple[pd.DataFrame, ...]:
         self.logger.debug("Starting data loading")
+        # Students and marks come from the local snapshot when it is available and current
+        cached = await exam_snapshots.load(self.exam_id)
         async with pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cursor:
                 # Students data
                 self.logger.debug(f"Loading students data for exam_id: {self.exam_id}")
-                await cursor.execute("""
-                    SELECT s.student_global_id, s.student_id, s.full_name, s.sex, s.exam_id, 
-                           s.centre_number, sc.region_name, sc.council_name, sc.ward_name, 
-                           sc.school_type
-                    FROM students s
-                    INNER JOIN schools sc ON s.centre_number = sc.centre_number
-                    WHERE s.exam_id = %s
-                """, (self.exam_id,))
-                students_data = await cursor.fetchall()
-                students = pd.DataFrame(students_data)
+                if cached is not None:
+                    students = cached['students'].merge(
+                        cached['schools'][['centre_number', 'region_name', 'council_name', 'ward_name', 'school_type']],
+                        on='centre_number', how='inner'
+                    )
+                else:
+                    await cursor.execute("""
+                        SELECT s.student_global_id, s.student_id, s.full_name, s.sex, s.exam_id, 
+                               s.centre_number, sc.region_name, sc.council_name, sc.ward_name, 
+                               sc.school_type
+                        FROM students s
+                        INNER JOIN schools sc ON s.centre_number = sc.centre_number
+                        WHERE s.exam_id = %s
+                    """, (self.exam_id,))
+                    students_data = await cursor.fetchall()
+                    students = pd.DataFrame(students_data)
                 self.logger.debug(f"Loaded students: {students.shape[0]} rows, columns: {list(students.columns)}")
                 if not students.empty:
                     self.logger.debug(f"Students sample: {students.head(2).to_dict(orient='records')}")
@@ -91,13 +98,17 @@ class DivisionProcessor:
 
                 # Student subjects
                 self.logger.debug("Loading student subjects")
-                await cursor.execute("""
-                    SELECT student_global_id, exam_id, centre_number, subject_code, overall_marks 
-                    FROM student_subjects 
-                    WHERE exam_id = %s
-                """, (self.exam_id,))
-                student_subjects_data = await cursor.fetchall()
-                student_subjects = pd.DataFrame(student_subjects_data)
+                if cached is not None:
+                    student_subjects = cached['student_subjects'][
+                        ['student_global_id', 'exam_id', 'centre_number', 'subject_code', 'overall_marks']
+                    ]
+                else:
+                    student_subjects = await read_frame(conn, """
+                        SELECT student_global_id, exam_id, centre_number, subject_code, overall_marks 
+                        FROM student_subjects 
+                        WHERE exam_id = %s
+                    """, (self.exam_id,), {'student_global_id': 'str', 'exam_id': 'str', 'centre_number': 'str',
+                                           'subject_code': 'str', 'overall_marks': 'float'})
                 self.logger.debug(f"Loaded student subjects: {student_subjects.shape[0]} rows, columns: {list(student_subjects.columns)}")
                 if not student_subjects.empty:
                     self.logger.debug(f"Student subjects sample: {student_subjects.head(2).to_dict(orient='records')}")
@@ -135,13 +146,7 @@ class DivisionProcessor:
     def handle_absent_cases(self, df: pd.DataFrame, is_old_curriculum: bool, min_subjects: int) -> pd.DataFrame:
         self.logger.debug("Handling absent and invalid cases")
         best_cols = [f'best_{i}' for i in range(1, min_subjects + 1)]
-        rank_cols = [
-            'pos', 'out_of', 'ward_pos', 'ward_out_of', 'ward_pos_gvt', 'ward_pos_pvt',
-            'council_pos', 'council_out_of', 'council_pos_gvt', 'council_pos_pvt',
-            'region_pos', 'region_out_of', 'region_pos_gvt', 'region_pos_pvt', 
-            'school_pos', 'school_out_of'
-        ]
-        null_cols = ['avg_marks', 'total_marks', 'avg_grade', 'total_points'] + rank_cols
+        null_cols = ['avg_marks', 'total_marks', 'avg_grade', 'total_points'] + RESULT_RANK_COLUMNS
         
         # Count valid marks
         valid_marks_count = df[best_cols].count(axis=1)
@@ -178,6 +183,14 @@ class DivisionProcessor:
     async def process_data(self, students: pd.DataFrame, exams: pd.DataFrame, 
                           exam_subjects: pd.DataFrame, student_subjects: pd.DataFrame,
                           exam_grades: pd.DataFrame, exam_divisions: pd.DataFrame) -> pd.DataFrame:
+        """Compute the results frame in a worker thread, so the pandas work does not hold the event loop."""
+        return await asyncio.to_thread(
+            self.compute_results, students, exams, exam_subjects, student_subjects, exam_grades, exam_divisions
+        )
+
+    def compute_results(self, students: pd.DataFrame, exams: pd.DataFrame,
+                        exam_subjects: pd.DataFrame, student_subjects: pd.DataFrame,
+                        exam_grades: pd.DataFrame, exam_divisions: pd.DataFrame) -> pd.DataFrame:
         self.logger.debug("Starting data processing")
         
         # Check curriculum based on subject '011'
@@ -213,6 +226,10 @@ class DivisionProcessor:
 
         # Fill best subjects
         self.logger.debug(f"Calculating top {n_subjects} subject marks and subjects")
+        # A subject nobody in this set of students sat has no pivot column
+        for code in subject_codes:
+            if code not in df.columns:
+                df[code] = np.nan
         marks_matrix = df[subject_codes].to_numpy()
         subject_indices = np.arange(len(subject_codes))
         filled = np.where(np.isnan(marks_matrix), -1e9, marks_matrix)
@@ -232,50 +249,22 @@ class DivisionProcessor:
         if exam_grades.empty or exam_grades[['lower_value', 'division_points']].isna().any().any():
             self.logger.error("Exam grades empty or contains nulls, cannot create division lookup")
             raise ValueError("Invalid exam_grades data: empty or contains null values")
-        division_lookup = {
-            exam_id: [(lower, points) for lower, points in group.sort_values('lower_value', ascending=False)[['lower_value', 'division_points']].itertuples(index=False, name=None) if lower is not None and points is not None]
-            for exam_id, group in exam_grades.groupby('exam_id')
-        }
-        self.logger.debug(f"Division lookup keys: {list(division_lookup.keys())}")
-        if self.exam_id in division_lookup:
-            self.logger.debug(f"Division lookup sample for {self.exam_id}: {division_lookup[self.exam_id][:2]}")
-        else:
+        exam_grade_bands = exam_grades[exam_grades['exam_id'] == self.exam_id]
+        if exam_grade_bands.empty:
             self.logger.error(f"No division lookup data for exam_id {self.exam_id}")
             raise ValueError(f"No division lookup data for exam_id {self.exam_id}")
-
-        def map_points_vectorized(best_marks: pd.Series, exam_ids: pd.Series, col_name: str) -> List[float]:
-            self.logger.debug(f"Mapping points for column {col_name}, marks count: {best_marks.count()}")
-            results = []
-            for idx, (mark, exam_id) in enumerate(zip(best_marks, exam_ids)):
-                if pd.isna(mark) or exam_id not in division_lookup:
-                    results.append(np.nan)
-                    continue
-                if mark < 0 or mark > 100:
-                    self.logger.warning(f"Outlier mark {mark} for student at index {idx} in {col_name}, assigned null points")
-                    results.append(np.nan)
-                    continue
-                try:
-                    lookup = division_lookup[exam_id]
-                    for lower, points in lookup:
-                        if mark >= lower:
-                            results.append(points)
-                            if idx < 2:
-                                self.logger.debug(f"Assigned points {points} for mark {mark} in {col_name}")
-                            break
-                    else:
-                        results.append(np.nan)
-                        if idx < 2:
-                            self.logger.debug(f"Assigned null points for mark {mark} in {col_name} (below lowest threshold)")
-                except Exception as e:
-                    self.logger.error(f"Error mapping points at index {idx}, mark {mark}, exam_id {exam_id}: {str(e)}", exc_info=True)
-                    results.append(np.nan)
-            self.logger.debug(f"Completed mapping points for {col_name}, results length: {len(results)}")
-            return results
+        points_lookup = ThresholdLookup.from_frame(
+            exam_grade_bands, 'lower_value', 'division_points', valid_range=(0, 100)
+        )
+        self.logger.debug(f"Division points bands for {self.exam_id}: {list(zip(points_lookup.lower, points_lookup.labels))}")
 
         for i in range(1, n_subjects + 1):
-            self.logger.debug(f"Calculating points for best_{i}")
-            df[f'best_{i}_points'] = map_points_vectorized(df[f'best_{i}'], df['exam_id'], f'best_{i}')
-            self.logger.debug(f"best_{i}_points assigned, non-null count: {df[f'best_{i}_points'].count()}")
+            col = f'best_{i}'
+            n_outliers = points_lookup.outliers(df[col]).sum()
+            if n_outliers:
+                self.logger.warning(f"{n_outliers} outlier marks in {col}, assigned null points")
+            df[f'{col}_points'] = points_lookup.lookup(df[col])
+            self.logger.debug(f"{col}_points assigned, non-null count: {df[f'{col}_points'].count()}")
 
         # Define points_cols before calculating total_points
         points_cols = [f'best_{i}_points' for i in range(1, n_subjects + 1)]
@@ -294,50 +283,17 @@ class DivisionProcessor:
         if exam_divisions.empty or exam_divisions[['lowest_points', 'division']].isna().any().any():
             self.logger.error("Exam divisions empty or contains nulls, cannot create division lookup")
             raise ValueError("Invalid exam_divisions data: empty or contains null values")
-        division_lookup = {
-            exam_id: [(low, div) for low, div in group.sort_values('lowest_points', ascending=False)[['lowest_points', 'division']].itertuples(index=False, name=None) if low is not None and div is not None]
-            for exam_id, group in exam_divisions.groupby('exam_id')
-        }
-        self.logger.debug(f"Division lookup keys: {list(division_lookup.keys())}")
-        if self.exam_id in division_lookup:
-            self.logger.debug(f"Division lookup sample for {self.exam_id}: {division_lookup[self.exam_id][:2]}")
-        else:
+        exam_division_bands = exam_divisions[exam_divisions['exam_id'] == self.exam_id]
+        if exam_division_bands.empty:
             self.logger.error(f"No division lookup data for exam_id {self.exam_id}")
             raise ValueError(f"No division lookup data for exam_id {self.exam_id}")
+        division_lookup = ThresholdLookup.from_frame(
+            exam_division_bands, 'lowest_points', 'division', missing='ABS'
+        )
 
-        def map_divisions_vectorized(total_points: pd.Series, exam_ids: pd.Series) -> List[Any]:
-            self.logger.debug(f"Mapping divisions, points count: {total_points.count()}")
-            results = []
-            for idx, (points, exam_id) in enumerate(zip(total_points, exam_ids)):
-                if points == -1:
-                    results.append('INC')
-                    if idx < 2:
-                        self.logger.debug(f"Assigned division INC for total_points {points}")
-                    continue
-                if pd.isna(points) or exam_id not in division_lookup:
-                    results.append('ABS')
-                    if idx < 2:
-                        self.logger.debug(f"Assigned division ABS for total_points {points}")
-                    continue
-                try:
-                    lookup = division_lookup[exam_id]
-                    for low, div in lookup:
-                        if points >= low:
-                            results.append(div)
-                            if idx < 2:
-                                self.logger.debug(f"Assigned division {div} for total_points {points}")
-                            break
-                    else:
-                        results.append('ABS')
-                        if idx < 2:
-                            self.logger.debug(f"Assigned division ABS for total_points {points} (below lowest threshold)")
-                except Exception as e:
-                    self.logger.error(f"Error mapping division at index {idx}, points {points}, exam_id {exam_id}: {str(e)}", exc_info=True)
-                    results.append('ABS')
-            self.logger.debug(f"Completed mapping divisions, results length: {len(results)}")
-            return results
-
-        df['division'] = map_divisions_vectorized(df['total_points'], df['exam_id'])
+        divisions = division_lookup.lookup(df['total_points'])
+        divisions[(df['total_points'] == -1).to_numpy()] = 'INC'
+        df['division'] = divisions
         self.logger.debug(f"Divisions assigned, non-null count: {df['division'].count()}")
         sample_divisions = df[['student_global_id', 'total_points', 'division']].head(2)
         self.logger.debug(f"Sample divisions: {sample_divisions.to_dict(orient='records')}")
@@ -390,45 +346,14 @@ class DivisionProcessor:
         if exam_grades.empty or exam_grades[['lower_value', 'grade']].isna().any().any():
             self.logger.error("Exam grades empty or contains nulls, cannot create grade lookup")
             raise ValueError("Invalid exam_grades data: empty or contains null values")
-        avg_grade_lookup = {
-            exam_id: [(lower, grade) for lower, grade in group.sort_values('lower_value', ascending=False)[['lower_value', 'grade']].itertuples(index=False, name=None) if lower is not None and grade is not None]
-            for exam_id, group in exam_grades.groupby('exam_id')
-        }
-        self.logger.debug(f"Average grade lookup keys: {list(avg_grade_lookup.keys())}")
-        if self.exam_id in avg_grade_lookup:
-            self.logger.debug(f"Average grade lookup sample for {self.exam_id}: {avg_grade_lookup[self.exam_id][:2]}")
-        else:
-            self.logger.error(f"No grade lookup data for exam_id {self.exam_id}")
-            raise ValueError(f"No grade lookup data for exam_id {self.exam_id}")
-
-        def map_avg_grade_vectorized(avg_marks: pd.Series, exam_ids: pd.Series) -> List[Any]:
-            self.logger.debug(f"Mapping average grades, marks count: {avg_marks.count()}")
-            grades = []
-            for idx, (mark, exam_id) in enumerate(zip(avg_marks, exam_ids)):
-                if pd.isna(mark) or exam_id not in avg_grade_lookup or mark < 0 or mark > 100:
-                    if not pd.isna(mark) and (mark < 0 or mark > 100):
-                        self.logger.warning(f"Outlier avg_mark {mark} for student at index {idx}, assigned null grade")
-                    grades.append(np.nan)
-                    continue
-                try:
-                    lookup = avg_grade_lookup[exam_id]
-                    for lower, grade in lookup:
-                        if mark >= lower:
-                            grades.append(grade)
-                            if idx < 2:
-                                self.logger.debug(f"Assigned grade {grade} for avg_mark {mark}")
-                            break
-                    else:
-                        grades.append(np.nan)
-                        if idx < 2:
-                            self.logger.debug(f"Assigned null grade for avg_mark {mark} (below lowest threshold)")
-                except Exception as e:
-                    self.logger.error(f"Error mapping grade at index {idx}, mark {mark}, exam_id {exam_id}: {str(e)}", exc_info=True)
-                    grades.append(np.nan)
-            self.logger.debug(f"Completed mapping grades, results length: {len(grades)}")
-            return grades
-
-        df['avg_grade'] = map_avg_grade_vectorized(df['avg_marks'], df['exam_id'])
+        avg_grade_lookup = ThresholdLookup.from_frame(
+            exam_grade_bands, 'lower_value', 'grade', valid_range=(0, 100)
+        )
+
+        n_outliers = avg_grade_lookup.outliers(df['avg_marks']).sum()
+        if n_outliers:
+            self.logger.warning(f"{n_outliers} outlier avg_marks, assigned null grade")
+        df['avg_grade'] = avg_grade_lookup.lookup(df['avg_marks'])
         self.logger.debug(f"Average grades assigned, non-null count: {df['avg_grade'].count()}")
         sample_grades = df[['student_global_id', 'avg_marks', 'avg_grade']].head(2)
         self.logger.debug(f"Sample avg_grade: {sample_grades.to_dict(orient='records')}")
@@ -436,52 +361,16 @@ class DivisionProcessor:
         # Handle absent and invalid cases
         df = self.handle_absent_cases(df, is_old_curriculum, min_subjects)
 
-        # Calculate rankings
+        # Calculate rankings on dictionary-encoded locations and float32 averages;
+        # unranked rows hold RANK_SENTINEL until the results are saved
         self.logger.debug("Calculating rankings")
-        df_valid = df[(df['avg_marks'] >= 0) & (~df['avg_marks'].isna())].copy()
-        self.logger.debug(f"Valid rows for ranking: {df_valid.shape[0]}")
-        rank_cols = [
-            'pos', 'out_of', 'ward_pos', 'ward_out_of', 'ward_pos_gvt', 'ward_pos_pvt',
-            'council_pos', 'council_out_of', 'council_pos_gvt', 'council_pos_pvt',
-            'region_pos', 'region_out_of', 'region_pos_gvt', 'region_pos_pvt', 
-            'school_pos', 'school_out_of'
-        ]
-        df[rank_cols] = np.nan
-
-        df.loc[df_valid.index, 'pos'] = df_valid['avg_marks'].rank(method='min', ascending=False)
-        df.loc[df_valid.index, 'out_of'] = len(df_valid)
-        self.logger.debug(f"Overall ranking assigned, pos non-null: {df['pos'].count()}")
-
-        def rank_in_group(df_main: pd.DataFrame, df_sub: pd.DataFrame, level_prefix: str):
-            idx = df_sub.index
-            ranks = df_sub['avg_marks'].rank(method='min', ascending=False)
-            df_main.loc[idx, f'{level_prefix}_pos'] = ranks
-            df_main.loc[idx, f'{level_prefix}_out_of'] = len(df_sub)
-            self.logger.debug(f"Ranked {level_prefix}, rows: {len(df_sub)}")
-            for sch_type, suffix in [('GOVERNMENT', 'gvt'), ('PRIVATE', 'pvt')]:
-                mask = df_sub['school_type'] == sch_type
-                if mask.any():
-                    sub_idx = df_sub[mask].index
-                    sub_ranks = df_sub.loc[mask, 'avg_marks'].rank(method='min', ascending=False)
-                    df_main.loc[sub_idx, f'{level_prefix}_pos_{suffix}'] = sub_ranks
-                    self.logger.debug(f"Ranked {level_prefix}_pos_{suffix}, rows: {mask.sum()}")
-
-        for level, group in [
-            ('council', df_valid.groupby('council_name')),
-            ('region', df_valid.groupby('region_name')),
-            ('ward', df_valid.groupby(['council_name', 'ward_name'])),
-            ('school', df_valid.groupby('centre_number'))
-        ]:
-            self.logger.debug(f"Processing rankings for level: {level}")
-            for key, subgroup in group:
-                if isinstance(key, tuple) and any(pd.isna(x) for x in key):
-                    self.logger.debug(f"Skipping group with null key: {key}")
-                    continue
-                if not isinstance(key, tuple) and pd.isna(key):
-                    self.logger.debug(f"Skipping group with null key: {key}")
-                    continue
-                prefix = 'ward' if level == 'ward' else level
-                rank_in_group(df, subgroup, prefix)
+        df = encode_frame(df, categorical=RANKING_TEXT_COLUMNS, marks=('avg_marks',))
+        valid_mask = (df['avg_marks'] >= 0) & (~df['avg_marks'].isna())
+        self.logger.debug(f"Valid rows for ranking: {valid_mask.sum()}")
+        df[RESULT_RANK_COLUMNS] = rank_levels(
+            df, 'avg_marks', RESULT_RANK_LEVELS, valid=valid_mask, sentinel=RANK_SENTINEL
+        )[RESULT_RANK_COLUMNS]
+        self.logger.debug(f"Rankings assigned, pos ranked: {(df['pos'] != RANK_SENTINEL).sum()}")
 
         # Rename best subject columns
         self.logger.debug("Renaming best subject columns")
@@ -507,7 +396,7 @@ class DivisionProcessor:
 
         return df
 
-    async def save_results(self, df: pd.DataFrame, pool: aiomysql.Pool) -> Tuple[int, int, int]:
+    async def save_results(self, df: pd.DataFrame, pool: PoolLease) -> Tuple[int, int, int]:
         self.logger.debug("Starting save_results")
         columns_to_keep = [
             'id', 'exam_id', 'student_global_id', 'centre_number', 'avg_marks',
@@ -516,7 +405,8 @@ class DivisionProcessor:
             'ward_pos_gvt', 'ward_pos_pvt', 'council_pos_gvt', 'council_pos_pvt',
             'region_pos_gvt', 'region_pos_pvt', 'avg_grade', 'school_pos', 'school_out_of'
         ]
-        insert_df = df[columns_to_keep].copy().replace({np.nan: None})
+        insert_df = decode_frame(df[columns_to_keep], RESULT_RANK_COLUMNS).astype({'avg_marks': np.float64})
+        insert_df = insert_df.astype(object).where(insert_df.notna(), None)
         self.logger.debug(f"Prepared insert DataFrame, shape: {insert_df.shape}, columns: {columns_to_keep}")
 
         table_name = 'results'
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable
+
+# Positions and group sizes start at 1, so 0 marks an unranked row in an int32 rank column
+RANK_SENTINEL = 0
+
+
+def encode_frame(df: pd.DataFrame, categorical: Iterable[str] = (), marks: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Compact in-memory representation of a ranking frame.
+
+    Repeated text (students, schools, subjects, sex, school type, locations)
+    is dictionary-encoded as categoricals, whose integer codes are as narrow
+    as the number of distinct values allows (int8 for sex or school type,
+    int32 for students), and marks are stored as float32, the precision of
+    their FLOAT columns. Columns missing from ``df`` are skipped.
+    """
+    df = df.copy(deep=False)
+    for col in categorical:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    for col in marks:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+    return df
+
+
+def decode_ranks(df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    """
+    Rank columns as nullable integers for writing or display, ``RANK_SENTINEL`` becoming null.
+
+    Only ``columns`` are converted; the mask is built without copying the
+    int32 values into a float or object column.
+    """
+    df = df.copy(deep=False)
+    for col in columns:
+        values = df[col].to_numpy()
+        if values.dtype.kind not in 'iu':
+            continue
+        df[col] = pd.arrays.IntegerArray(values.astype(np.int32, copy=False), values == RANK_SENTINEL)
+    return df
+
+
+def decode_frame(df: pd.DataFrame, rank_columns: Iterable[str]) -> pd.DataFrame:
+    """``decode_ranks`` plus categoricals back to plain text, e.g. for exports."""
+    df = decode_ranks(df, rank_columns)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+    return df
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Optional, Sequence, Tuple
+
+
+class ThresholdLookup:
+    """
+    Resolve whole columns of values against a sorted set of lower bounds.
+
+    Grade bands (``exam_grades.lower_value``) and division bands
+    (``exam_divisions.lowest_points``) are both "largest lower bound not above
+    the value" lookups. The bounds are sorted once when the lookup is built and
+    every call resolves a full column with ``np.searchsorted`` instead of
+    scanning the bands row by row.
+
+    Args:
+        lower: Lower bound of every band.
+        labels: Value returned for each band (grade, points, division, ...).
+        upper: Optional inclusive upper bound of every band. Values above the
+            upper bound of their band resolve to ``missing``.
+        lower_inclusive: ``True`` matches ``value >= lower``, ``False`` matches
+            ``value > lower``.
+        below: ``"missing"`` resolves values under the lowest band to
+            ``missing``; ``"clip"`` resolves them to the lowest band.
+        valid_range: Optional inclusive ``(low, high)`` range; values outside it
+            are outliers and resolve to ``missing``.
+        missing: Value used for null, outlier and unmatched inputs.
+    """
+
+    def __init__(
+        self,
+        lower: Sequence[float],
+        labels: Sequence[Any],
+        upper: Optional[Sequence[float]] = None,
+        lower_inclusive: bool = True,
+        below: str = "missing",
+        valid_range: Optional[Tuple[float, float]] = None,
+        missing: Any = np.nan,
+    ):
+        if below not in ("missing", "clip"):
+            raise ValueError(f"Invalid below mode: {below}")
+        lower = np.asarray(lower, dtype=np.float64)
+        if lower.size == 0:
+            raise ValueError("Cannot build a threshold lookup without bands")
+        if len(labels) != lower.size or (upper is not None and len(upper) != lower.size):
+            raise ValueError("Bounds and labels must have the same length")
+
+        # Stable sort keeps the original band order among equal lower bounds
+        order = np.argsort(lower, kind="stable")
+        self.lower = lower[order]
+        self.upper = None if upper is None else np.asarray(upper, dtype=np.float64)[order]
+
+        labels = np.asarray(labels)
+        self.numeric = labels.dtype.kind in "iufb"
+        self.labels = labels[order].astype(np.float64 if self.numeric else object)
+
+        self.side = "right" if lower_inclusive else "left"
+        self.below = below
+        self.valid_range = valid_range
+        self.missing = missing
+
+    @classmethod
+    def from_frame(
+        cls,
+        frame: pd.DataFrame,
+        bound_col: str,
+        label_col: str,
+        upper_col: Optional[str] = None,
+        **kwargs,
+    ) -> "ThresholdLookup":
+        """Build a lookup from band rows, ignoring rows with a null bound or label."""
+        cols = [bound_col, label_col] + ([upper_col] if upper_col else [])
+        bands = frame[cols].dropna()
+        return cls(
+            bands[bound_col].to_numpy(),
+            bands[label_col].to_numpy(),
+            upper=bands[upper_col].to_numpy() if upper_col else None,
+            **kwargs,
+        )
+
+    def outliers(self, values) -> np.ndarray:
+        """Mask of non-null values that fall outside ``valid_range``."""
+        values = np.asarray(values, dtype=np.float64)
+        if self.valid_range is None:
+            return np.zeros(values.shape, dtype=bool)
+        low, high = self.valid_range
+        return (values < low) | (values > high)
+
+    def band_index(self, values) -> np.ndarray:
+        """Band position for every value, or -1 where no band applies."""
+        values = np.asarray(values, dtype=np.float64)
+        idx = np.searchsorted(self.lower, values, side=self.side) - 1
+        if self.below == "clip":
+            idx = np.maximum(idx, 0)
+
+        matched = ~np.isnan(values) & (idx >= 0) & ~self.outliers(values)
+        if self.upper is not None:
+            matched &= values <= self.upper[np.maximum(idx, 0)]
+        return np.where(matched, idx, -1)
+
+    def lookup(self, values) -> np.ndarray:
+        """Resolve every value to its band label (float array for numeric labels)."""
+        idx = self.band_index(values)
+        hit = idx >= 0
+        if self.numeric and isinstance(self.missing, float):
+            result = np.full(idx.shape, self.missing, dtype=np.float64)
+        else:
+            result = np.full(idx.shape, self.missing, dtype=object)
+        result[hit] = self.labels[idx[hit]]
+        return result
+
+
+def first_matching_band(
+    values,
+    lower: Sequence[float],
+    upper: Sequence[float],
+    labels: Sequence[Any],
+    lower_inclusive: bool = True,
+    missing: Any = None,
+) -> np.ndarray:
+    """
+    Label of the first band, in the given order, whose bounds contain each value.
+
+    This is the vectorized form of scanning band rows until one matches
+    ``lower <= value <= upper`` (``lower < value <= upper`` when
+    ``lower_inclusive`` is False). Disjoint bands are resolved with one
+    ``ThresholdLookup``; when bands overlap the band order decides, so each
+    band is matched in turn over the values left unmatched.
+    """
+    values = np.asarray(pd.to_numeric(pd.Series(values), errors='coerce'), dtype=np.float64)
+    lower = np.asarray(lower, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    labels = np.asarray(labels)
+    numeric = labels.dtype.kind in "iufb" and isinstance(missing, float)
+    if lower.size == 0:
+        return np.full(values.shape, missing, dtype=np.float64 if numeric else object)
+
+    order = np.argsort(lower, kind="stable")
+    sorted_lower, sorted_upper = lower[order], upper[order]
+    disjoint = sorted_upper[:-1] < sorted_lower[1:] if lower_inclusive else sorted_upper[:-1] <= sorted_lower[1:]
+    if np.all(disjoint):
+        return ThresholdLookup(lower, labels, upper=upper, lower_inclusive=lower_inclusive, missing=missing).lookup(values)
+
+    result = np.full(values.shape, missing, dtype=np.float64 if numeric else object)
+    unmatched = ~np.isnan(values)
+    for low, high, label in zip(lower, upper, labels):
+        hit = unmatched & (values >= low if lower_inclusive else values > low) & (values <= high)
+        result[hit] = label
+        unmatched &= ~hit
+    return result
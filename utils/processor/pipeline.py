@@ -0,0 +1,645 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from app.db.database import AsyncSessionLocal, db_pools
+from app.db.models.pipeline_checkpoint import PipelineCheckpoint
+from utils.processor.bulk_writer import BulkColumnWriter
+from utils.processor.division import DivisionProcessor
+from utils.processor.lookup import first_matching_band
+from utils.processor.ranking import (
+    RESULT_RANK_COLUMNS, SUBJECT_LEVELS, SUBJECT_RANK_COLUMNS, RankLevel, rank_changed_partitions,
+    rank_partitions, result_rank_columns
+)
+from utils.processor.results_ranker import RANKING_COLUMNS, SEX_RANK_LEVELS
+from utils.processor.subjects_ranker import SUBJECT_RANK_LEVELS, SUBJECT_SEX_RANK_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Stages in run order; each one is written and checkpointed before the next starts
+STAGES = (
+    'overall_marks', 'subject_grades', 'subject_ranks', 'sex_subject_ranks',
+    'divisions', 'result_ranks', 'sex_result_ranks'
+)
+
+# Stages whose output later stages read, so they are recomputed even when resumed past
+_INPUT_STAGES = {'overall_marks', 'divisions'}
+
+# results columns set by the division stage; rows are matched on the unique exam/student/centre key
+DIVISION_COLUMNS = [
+    'exam_id', 'student_global_id', 'centre_number', 'avg_marks', 'total_marks',
+    'division', 'total_points', 'avg_grade'
+]
+RESULT_KEY = ('exam_id', 'student_global_id', 'centre_number')
+
+# Everything the stages read, loaded once. Computed columns (overall_marks, ranks, results)
+# are left out so writing a stage does not change the fingerprint of a resumed run.
+SNAPSHOT_QUERIES: Dict[str, Tuple[str, List[str]]] = {
+    'student_subjects': (
+        """SELECT id, exam_id, student_global_id, centre_number, subject_code, theory_marks, practical_marks
+        FROM student_subjects WHERE exam_id = %s ORDER BY id""",
+        ['id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code', 'theory_marks', 'practical_marks']
+    ),
+    'students': (
+        """SELECT student_global_id, student_id, full_name, sex, exam_id, centre_number
+        FROM students WHERE exam_id = %s ORDER BY student_global_id""",
+        ['student_global_id', 'student_id', 'full_name', 'sex', 'exam_id', 'centre_number']
+    ),
+    'schools': (
+        """SELECT centre_number, region_name, council_name, ward_name, school_type FROM schools
+        WHERE centre_number IN (SELECT centre_number FROM students WHERE exam_id = %s) ORDER BY centre_number""",
+        ['centre_number', 'region_name', 'council_name', 'ward_name', 'school_type']
+    ),
+    'exams': (
+        "SELECT exam_id, avg_style FROM exams WHERE exam_id = %s",
+        ['exam_id', 'avg_style']
+    ),
+    'exam_subjects': (
+        "SELECT exam_id, subject_code, has_practical FROM exam_subjects WHERE exam_id = %s ORDER BY subject_code",
+        ['exam_id', 'subject_code', 'has_practical']
+    ),
+    'exam_grades': (
+        """SELECT exam_id, grade, lower_value, highest_value, grade_points, division_points
+        FROM exam_grades WHERE exam_id = %s ORDER BY id""",
+        ['exam_id', 'grade', 'lower_value', 'highest_value', 'grade_points', 'division_points']
+    ),
+    'exam_divisions': (
+        """SELECT exam_id, division, lowest_points, highest_points
+        FROM exam_divisions WHERE exam_id = %s ORDER BY lowest_points, division""",
+        ['exam_id', 'division', 'lowest_points', 'highest_points']
+    ),
+}
+
+# Exam-wide settings; any change to them affects every student
+EXAM_TABLES = ('exams', 'exam_subjects', 'exam_grades', 'exam_divisions')
+
+# Student tables, loaded only once the run knows which centres it reprocesses
+CENTRE_TABLES = ('student_subjects', 'students')
+
+
+def _centre_digest_query(table: str, columns: Sequence[str]) -> str:
+    # MD5 of every row folded into 64 bits and XORed per centre, so the digest does not depend on row order
+    row = ", ".join(f"IFNULL({col}, CHAR(0))" for col in columns)
+    return f"""SELECT centre_number, COUNT(*),
+        BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT_WS(CHAR(31), {row})), 16), 16, 10) AS UNSIGNED))
+        FROM {table} WHERE exam_id = %s AND centre_number IS NOT NULL GROUP BY centre_number"""
+
+
+# Row count and digest of every centre's input rows, computed by the database so that
+# change detection neither transfers nor hashes the rows of unchanged centres
+CENTRE_DIGEST_QUERIES: Dict[str, str] = {
+    'student_subjects': _centre_digest_query(
+        'student_subjects', ['id', 'student_global_id', 'subject_code', 'theory_marks', 'practical_marks']
+    ),
+    'students': _centre_digest_query('students', ['student_global_id', 'student_id', 'full_name', 'sex']),
+}
+
+# Bumped whenever the change log format changes; older logs only allow a full run
+CHANGE_LOG_VERSION = 2
+
+# Values written by an earlier run, compared against in incremental mode so only changed rows are written
+_STORED_SUBJECT_COLUMNS = ['overall_marks', 'subject_grade'] + SUBJECT_RANK_COLUMNS + SUBJECT_SEX_RANK_COLUMNS
+_STORED_RESULT_COLUMNS = DIVISION_COLUMNS + RESULT_RANK_COLUMNS + RANKING_COLUMNS
+# Stored rows of unchanged centres stand in for their inputs, so they carry the keys ranking partitions on
+_STORED_SUBJECT_KEYS = ['id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code']
+STORED_QUERIES: Dict[str, Tuple[str, List[str]]] = {
+    'student_subjects': (
+        f"SELECT {', '.join(_STORED_SUBJECT_KEYS + _STORED_SUBJECT_COLUMNS)} FROM student_subjects WHERE exam_id = %s",
+        _STORED_SUBJECT_KEYS + _STORED_SUBJECT_COLUMNS
+    ),
+    'results': (
+        f"SELECT {', '.join(_STORED_RESULT_COLUMNS)} FROM results WHERE exam_id = %s",
+        _STORED_RESULT_COLUMNS
+    ),
+}
+
+# Values read back from FLOAT columns only carry single precision
+_RTOL = 1e-6
+
+
+def as_stored(values: pd.Series) -> pd.Series:
+    """
+    Round marks to the single precision of the FLOAT columns they are stored in.
+
+    Marks are ranked at the precision they are stored with, so students shown
+    the same marks share a position and incremental runs, which rank fresh
+    marks together with marks read back from the database, agree with full runs.
+    """
+    return pd.to_numeric(values, errors='coerce').astype(np.float32).astype(np.float64)
+
+
+def filtered_query(query: str, column: str, count: int) -> str:
+    """``query`` restricted to rows whose ``column`` is one of ``count`` further parameters."""
+    head, order, tail = query.partition(' ORDER BY')
+    return f"{head} AND {column} IN ({', '.join(['%s'] * count)}){order}{tail}"
+
+
+async def load_snapshot(
+    exam_id: str,
+    queries: Dict[str, Tuple[str, List[str]]] = SNAPSHOT_QUERIES,
+    filters: Optional[Dict[str, Tuple[str, Sequence[Any]]]] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Load tables the pipeline reads for one exam into DataFrames, over one connection.
+
+    ``filters`` maps a query name to ``(column, values)`` and loads only the
+    rows whose ``column`` holds one of ``values``.
+    """
+    filters = filters or {}
+    snapshot = {}
+    async with db_pools.acquire() as conn:
+        async with conn.cursor() as cur:
+            for name, (query, columns) in queries.items():
+                params: Tuple[Any, ...] = (exam_id,)
+                if name in filters:
+                    column, values = filters[name]
+                    if not len(values):
+                        snapshot[name] = pd.DataFrame(columns=columns)
+                        continue
+                    query, params = filtered_query(query, column, len(values)), params + tuple(values)
+                await cur.execute(query, params)
+                snapshot[name] = pd.DataFrame(list(await cur.fetchall()), columns=columns)
+    return snapshot
+
+
+async def load_centre_digests(exam_id: str) -> Dict[str, pd.DataFrame]:
+    """``centre_number``, ``rows`` and ``digest`` of every centre in each of ``CENTRE_TABLES``."""
+    return await load_snapshot(exam_id, {
+        name: (query, ['centre_number', 'rows', 'digest']) for name, query in CENTRE_DIGEST_QUERIES.items()
+    })
+
+
+def snapshot_fingerprint(snapshot: Dict[str, pd.DataFrame]) -> str:
+    """SHA-256 of the snapshot contents."""
+    digest = hashlib.sha256()
+    for name in sorted(snapshot):
+        frame = snapshot[name]
+        digest.update(f"{name}:{len(frame)}".encode())
+        if not frame.empty:
+            digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def centre_change_log(snapshot: Dict[str, pd.DataFrame], digests: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+    """
+    Hash of the exam settings, plus the input digest and location of every centre.
+
+    ``snapshot`` holds the exam settings and schools, ``digests`` the
+    per-centre digests of ``CENTRE_TABLES`` from ``load_centre_digests``.
+    """
+    exam = snapshot_fingerprint({name: snapshot[name] for name in EXAM_TABLES})
+    by_table = {
+        name: {str(centre): f"{int(rows):x}:{int(digest):016x}" for centre, rows, digest in frame.itertuples(index=False)}
+        for name, frame in digests.items()
+    }
+    schools = snapshot['schools'].drop_duplicates('centre_number').set_index('centre_number')
+    centres = {}
+    for centre in sorted(set().union(*by_table.values())):
+        location = schools.loc[centre].tolist() if centre in schools.index else []
+        centres[centre] = {
+            'inputs': '/'.join(by_table[name].get(centre, '0') for name in CENTRE_TABLES),
+            'location': '|'.join('' if pd.isna(value) else str(value) for value in location),
+        }
+    return {'version': CHANGE_LOG_VERSION, 'exam': exam, 'centres': centres}
+
+
+def change_log_fingerprint(change_log: Dict[str, Any]) -> str:
+    """SHA-256 of a change log; it covers every input, so a resumed run must see the same one."""
+    return hashlib.sha256(json.dumps(change_log, sort_keys=True).encode()).hexdigest()
+
+
+def changed_centres(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Optional[set]:
+    """
+    Centres whose inputs changed since ``previous``, or None when only a full run is correct.
+
+    Changed exam settings, a centre that moved location and a centre that no
+    longer has students all alter partitions the current inputs cannot
+    identify, so they need a full run, as does a change log of an older format.
+    """
+    if not previous or previous.get('version') != current['version'] or previous.get('exam') != current['exam']:
+        return None
+    before, after = previous.get('centres', {}), current['centres']
+    if set(before) - set(after):
+        return None
+    changed = set()
+    for centre, state in after.items():
+        old = before.get(centre)
+        if old is None:
+            changed.add(centre)
+        elif old['location'] != state['location']:
+            return None
+        elif old['inputs'] != state['inputs']:
+            changed.add(centre)
+    return changed
+
+
+def values_differ(new: pd.DataFrame, old: pd.DataFrame) -> np.ndarray:
+    """Rows where any column of ``new`` differs from the aligned row of ``old`` (nulls compare equal)."""
+    differ = np.zeros(len(new), dtype=bool)
+    for col in new.columns:
+        if pd.api.types.is_numeric_dtype(new[col]):
+            a = pd.to_numeric(new[col], errors='coerce').to_numpy(dtype=np.float64)
+            b = pd.to_numeric(old[col], errors='coerce').to_numpy(dtype=np.float64)
+            same = (np.isnan(a) & np.isnan(b)) | np.isclose(a, b, rtol=_RTOL, atol=0)
+        else:
+            a, b = new[col], old[col]
+            same = ((a.isna() & b.isna()) | (a.astype(object) == b.astype(object))).to_numpy()
+        differ |= ~same
+    return differ
+
+
+def compute_overall_marks(student_subjects: pd.DataFrame, exam_subjects: pd.DataFrame) -> pd.Series:
+    """
+    Overall marks of every student subject row.
+
+    Subjects with a practical combine both papers as ``(theory + practical) * 2 / 3``
+    (a missing paper counts as 0, both missing stays null); other subjects take
+    the theory marks.
+    """
+    practical_subjects = exam_subjects.loc[exam_subjects['has_practical'].astype(bool), 'subject_code']
+    has_practical = student_subjects['subject_code'].isin(practical_subjects).to_numpy()
+    theory = pd.to_numeric(student_subjects['theory_marks'], errors='coerce').to_numpy(dtype=np.float64)
+    practical = pd.to_numeric(student_subjects['practical_marks'], errors='coerce').to_numpy(dtype=np.float64)
+
+    combined = (np.nan_to_num(theory) + np.nan_to_num(practical)) * 2 / 3
+    combined[np.isnan(theory) & np.isnan(practical)] = np.nan
+    return pd.Series(np.where(has_practical, combined, theory), index=student_subjects.index, name='overall_marks')
+
+
+def compute_subject_grades(overall_marks: pd.Series, exam_grades: pd.DataFrame) -> pd.Series:
+    """
+    Grade of every overall mark, None when unmatched.
+
+    Like ``SubjectProcessor``, the first band in table order with
+    ``lower_value <= marks <= highest_value`` wins, so a mark on the boundary
+    of two bands gets the grade of the band entered first.
+    """
+    bands = exam_grades.dropna(subset=['lower_value', 'highest_value', 'grade'])
+    grades = first_matching_band(
+        overall_marks, bands['lower_value'], bands['highest_value'], bands['grade'].to_numpy(dtype=object)
+    )
+    return pd.Series(grades, index=overall_marks.index, dtype=object, name='subject_grade')
+
+
+def _ranked_marks(values: pd.Series) -> pd.Series:
+    marks = pd.to_numeric(values, errors='coerce')
+    return marks.notnull() & (marks >= 0) & np.isfinite(marks)
+
+
+class ExamPipeline:
+    """
+    Process an exam end to end from one in-memory snapshot.
+
+    The tables the stages read are loaded once; every stage is then computed in
+    memory and written with ``BulkColumnWriter``. After each write the stage is
+    recorded in ``pipeline_checkpoints``, so a run that fails part way can be
+    started again and skips the stages already written, provided the snapshot
+    fingerprint is unchanged. Any change to the inputs restarts from the first
+    stage.
+
+    In incremental mode only the centres whose inputs changed since the last
+    successful run are reprocessed: marks, grades and divisions are recomputed
+    for their students, only the ranking partitions holding one of them are
+    re-ranked, and only rows whose values differ from the stored ones are
+    written. Changed centres are found from per-centre digests the database
+    computes, and only their input rows are loaded. Changes that move
+    partitions (exam settings, school locations, removed centres) fall back
+    to a full run.
+
+    Args:
+        exam_id: Exam to process.
+        resume: Skip the stages an unfinished earlier run already wrote.
+        strategy: ``BulkColumnWriter`` strategy for the update-only writes.
+        progress: Optional ``(fraction, message)`` callback, called after every stage.
+        incremental: Reprocess only the centres changed since the last successful run.
+    """
+
+    def __init__(
+        self,
+        exam_id: str,
+        resume: bool = True,
+        strategy: str = 'staging',
+        progress: Optional[Callable[[float, str], Any]] = None,
+        incremental: bool = False
+    ):
+        if strategy not in BulkColumnWriter.STRATEGIES:
+            raise ValueError(f"Invalid strategy {strategy}, expected one of {BulkColumnWriter.STRATEGIES}")
+        self.exam_id = exam_id
+        self.resume = resume
+        self.strategy = strategy
+        self.progress = progress
+        self.incremental = incremental
+        self.snapshot: Dict[str, pd.DataFrame] = {}
+        self.subjects: Optional[pd.DataFrame] = None
+        self.results: Optional[pd.DataFrame] = None
+        # Incremental mode: changed centres, their rows, and the stored values aligned with each frame
+        self.changed: Optional[set] = None
+        self.stored: Dict[str, pd.DataFrame] = {}
+        self.changed_subjects: Optional[np.ndarray] = None
+        self.current_subjects: Optional[pd.DataFrame] = None
+        self.changed_results: Optional[np.ndarray] = None
+        self.current_results: Optional[pd.DataFrame] = None
+
+    async def load_checkpoint(self) -> Optional[PipelineCheckpoint]:
+        async with AsyncSessionLocal() as db:
+            return await db.get(PipelineCheckpoint, self.exam_id)
+
+    async def save_checkpoint(
+        self,
+        fingerprint: str,
+        completed: List[str],
+        timings: Dict[str, Any],
+        status: str = "RUNNING",
+        error: Optional[str] = None,
+        change_log: Optional[Dict[str, Any]] = None
+    ):
+        async with AsyncSessionLocal() as db:
+            checkpoint = await db.get(PipelineCheckpoint, self.exam_id)
+            if checkpoint is None:
+                checkpoint = PipelineCheckpoint(exam_id=self.exam_id)
+                db.add(checkpoint)
+            checkpoint.fingerprint = fingerprint
+            checkpoint.completed_stages = list(completed)
+            checkpoint.timings = timings
+            checkpoint.status = status
+            checkpoint.error = error
+            if change_log is not None:
+                checkpoint.change_log = change_log
+            await db.commit()
+
+    async def load_inputs(self):
+        """
+        Load the student rows the stages read.
+
+        A full run loads every row. An incremental run loads the input rows of
+        the changed centres only; the other rows of the subjects they sit come
+        from the stored values, since every subject ranking partition is within
+        one subject. Results and students are read whole, as every result shares
+        the exam-wide ranking partition.
+        """
+        student_queries = {name: SNAPSHOT_QUERIES[name] for name in CENTRE_TABLES}
+        if self.changed is None:
+            self.snapshot.update(await load_snapshot(self.exam_id, student_queries))
+            return
+        centres = sorted(self.changed)
+        self.snapshot.update(await load_snapshot(
+            self.exam_id, student_queries, filters={'student_subjects': ('centre_number', centres)}
+        ))
+        subject_codes = sorted(self.snapshot['student_subjects']['subject_code'].dropna().unique())
+        self.stored = await load_snapshot(
+            self.exam_id, STORED_QUERIES, filters={'student_subjects': ('subject_code', subject_codes)}
+        )
+
+    def prepare(self):
+        """Attach location, school type and sex to the student subject rows."""
+        schools = self.snapshot['schools'].drop_duplicates('centre_number')
+        students = self.snapshot['students']
+        subjects = self.snapshot['student_subjects']
+        if self.changed is not None:
+            # Rows of unchanged centres are taken as stored; their inputs were not loaded
+            stored = self.stored['student_subjects']
+            kept = stored.loc[~stored['centre_number'].isin(self.changed), _STORED_SUBJECT_KEYS]
+            subjects = pd.concat([subjects, kept], ignore_index=True)
+        subjects = subjects.merge(schools, on='centre_number', how='left')
+        self.subjects = subjects.merge(
+            students[['student_global_id', 'sex']].drop_duplicates('student_global_id'),
+            on='student_global_id', how='left'
+        )
+        if self.changed:
+            self.changed_subjects = self.subjects['centre_number'].isin(self.changed).to_numpy()
+            self.current_subjects = self.subjects[['id']].merge(self.stored['student_subjects'], on='id', how='left')
+            self.current_subjects.index = self.subjects.index
+
+    def changed_only(self, frame: pd.DataFrame, current: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """In incremental mode, keep only the rows of ``frame`` whose ``columns`` differ from ``current``."""
+        if self.changed is None:
+            return frame
+        return frame.loc[values_differ(frame[columns], current[columns])]
+
+    # Stage computations: each returns the (writer, frame) pairs it writes
+
+    def overall_marks(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        if self.changed is None:
+            self.subjects['overall_marks'] = as_stored(compute_overall_marks(self.subjects, self.snapshot['exam_subjects']))
+        else:
+            rows = self.changed_subjects
+            overall = as_stored(self.current_subjects['overall_marks'])
+            overall[rows] = as_stored(compute_overall_marks(self.subjects.loc[rows], self.snapshot['exam_subjects']))
+            self.subjects['overall_marks'] = overall
+        writer = BulkColumnWriter('student_subjects', ['overall_marks'], strategy=self.strategy)
+        frame = self.subjects[['id', 'overall_marks']]
+        return [(writer, self.changed_only(frame, self.current_subjects, ['overall_marks']))]
+
+    def subject_grades(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        if self.changed is None:
+            grades = compute_subject_grades(self.subjects['overall_marks'], self.snapshot['exam_grades'])
+        else:
+            rows = self.changed_subjects
+            grades = self.current_subjects['subject_grade'].astype(object)
+            grades[rows] = compute_subject_grades(self.subjects.loc[rows, 'overall_marks'], self.snapshot['exam_grades'])
+        self.subjects['subject_grade'] = grades
+        writer = BulkColumnWriter('student_subjects', ['subject_grade'], strategy=self.strategy)
+        frame = self.subjects[['id', 'subject_grade']]
+        return [(writer, self.changed_only(frame, self.current_subjects, ['subject_grade']))]
+
+    def rank(
+        self,
+        frame: pd.DataFrame,
+        value_col: str,
+        levels: Dict[str, RankLevel],
+        columns: List,
+        valid: pd.Series,
+        changed: Optional[np.ndarray],
+        current: Optional[pd.DataFrame]
+    ) -> pd.DataFrame:
+        """Rank every partition, or in incremental mode only the partitions holding a changed row."""
+        if self.changed is None:
+            return rank_partitions(frame, value_col, levels, columns, valid=valid)
+        return rank_changed_partitions(frame, value_col, levels, columns, changed, current, valid=valid)
+
+    def subject_ranks(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        # SubjectProcessor matches school types case-insensitively
+        frame = self.subjects.assign(school_type=self.subjects['school_type'].str.upper())
+        valid = self.subjects['overall_marks'].notnull() & (self.subjects['overall_marks'] >= 0)
+        ranks = self.rank(
+            frame, 'overall_marks', SUBJECT_LEVELS, SUBJECT_RANK_COLUMNS, valid,
+            self.changed_subjects, self.current_subjects
+        )
+        writer = BulkColumnWriter('student_subjects', SUBJECT_RANK_COLUMNS, strategy=self.strategy)
+        frame = pd.concat([self.subjects[['id']], ranks], axis=1)
+        return [(writer, self.changed_only(frame, self.current_subjects, SUBJECT_RANK_COLUMNS))]
+
+    def sex_subject_ranks(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        valid = _ranked_marks(self.subjects['overall_marks'])
+        ranks = self.rank(
+            self.subjects, 'overall_marks', SUBJECT_RANK_LEVELS, SUBJECT_SEX_RANK_COLUMNS, valid,
+            self.changed_subjects, self.current_subjects
+        )
+        writer = BulkColumnWriter('student_subjects', SUBJECT_SEX_RANK_COLUMNS, strategy=self.strategy)
+        frame = pd.concat([self.subjects[['id']], ranks], axis=1)
+        return [(writer, self.changed_only(frame, self.current_subjects, SUBJECT_SEX_RANK_COLUMNS))]
+
+    def divisions(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        students = self.snapshot['students']
+        schools = self.snapshot['schools'].drop_duplicates('centre_number')
+        invalid_centres = sorted(set(students['centre_number']) - set(schools['centre_number']))
+        if invalid_centres:
+            raise ValueError(f"Found {len(invalid_centres)} invalid centre numbers: {invalid_centres[:20]}")
+
+        subjects = self.subjects
+        if self.changed is not None:
+            students = students[students['centre_number'].isin(self.changed)]
+            subjects = subjects.loc[self.changed_subjects]
+
+        processor = DivisionProcessor(self.exam_id)
+        results = processor.compute_results(
+            students.merge(schools, on='centre_number', how='inner'),
+            self.snapshot['exams'],
+            self.snapshot['exam_subjects'][['exam_id', 'subject_code']],
+            subjects[['student_global_id', 'exam_id', 'centre_number', 'subject_code', 'overall_marks']],
+            self.snapshot['exam_grades'],
+            self.snapshot['exam_divisions'],
+        )
+        # New rows are inserted; existing results are updated through the unique exam/student/centre key
+        writer = BulkColumnWriter('results', DIVISION_COLUMNS, strategy='upsert')
+        if self.changed is None:
+            self.results = results
+            self.results['avg_marks'] = as_stored(self.results['avg_marks'])
+            return [(writer, results[['id'] + DIVISION_COLUMNS])]
+
+        # Stored results of students at unchanged centres, with the attributes ranking needs
+        key = list(RESULT_KEY)
+        stored = self.stored['results']
+        kept = stored[~stored['centre_number'].isin(self.changed)].merge(
+            self.snapshot['students'][['student_global_id', 'centre_number', 'student_id', 'full_name', 'sex']],
+            on=['student_global_id', 'centre_number'], how='inner'
+        ).merge(schools, on='centre_number', how='left')
+        # Ranks of the recomputed rows are left out; the ranking stages compute them again
+        recomputed = [col for col in results.columns if col in kept.columns and col not in RESULT_RANK_COLUMNS]
+        self.results = pd.concat([kept, results[recomputed]], ignore_index=True)
+        self.results['avg_marks'] = as_stored(self.results['avg_marks'])
+        self.changed_results = np.arange(len(self.results)) >= len(kept)
+        self.current_results = self.results[key].merge(stored, on=key, how='left')
+        self.current_results.index = self.results.index
+
+        frame = results[['id'] + DIVISION_COLUMNS]
+        current = frame[key].merge(stored, on=key, how='left')
+        current.index = frame.index
+        return [(writer, self.changed_only(frame, current, DIVISION_COLUMNS))]
+
+    def result_ranks(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        key = list(RESULT_KEY)
+        writer = BulkColumnWriter('results', RESULT_RANK_COLUMNS, key=RESULT_KEY, strategy=self.strategy)
+        levels, columns = result_rank_columns()
+        valid = (self.results['avg_marks'] >= 0) & self.results['avg_marks'].notna()
+        ranks = self.rank(self.results, 'avg_marks', levels, columns, valid, self.changed_results, self.current_results)
+        frame = pd.concat([self.results[key], ranks[RESULT_RANK_COLUMNS]], axis=1)
+        return [(writer, self.changed_only(frame, self.current_results, RESULT_RANK_COLUMNS))]
+
+    def sex_result_ranks(self) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        valid = _ranked_marks(self.results['avg_marks'])
+        ranks = self.rank(
+            self.results, 'avg_marks', SEX_RANK_LEVELS, RANKING_COLUMNS, valid,
+            self.changed_results, self.current_results
+        )
+        writer = BulkColumnWriter('results', RANKING_COLUMNS, key=RESULT_KEY, strategy=self.strategy)
+        frame = pd.concat([self.results[list(RESULT_KEY)], ranks], axis=1)
+        return [(writer, self.changed_only(frame, self.current_results, RANKING_COLUMNS))]
+
+    async def compute(self, stage: str) -> List[Tuple[BulkColumnWriter, pd.DataFrame]]:
+        # Stages are pure pandas work on the snapshot; run them off the event loop
+        return await asyncio.to_thread(getattr(self, stage))
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage that is not already checkpointed.
+
+        Returns:
+            Dict with the ``fingerprint``, the ``mode`` (``full`` or ``incremental``),
+            the number of ``changed_centres`` in incremental mode, whether the run
+            ``resumed``, the ``load_seconds`` of the snapshot, per-stage ``rows``,
+            ``compute_seconds``, ``write_seconds`` and ``skipped`` under ``stages``,
+            and ``total_seconds``.
+        """
+        start_time = time.time()
+        self.snapshot = await load_snapshot(
+            self.exam_id, {name: SNAPSHOT_QUERIES[name] for name in EXAM_TABLES + ('schools',)}
+        )
+        digests = await load_centre_digests(self.exam_id)
+        if digests['students'].empty:
+            raise ValueError(f"No student data found for exam_id {self.exam_id}")
+        change_log = centre_change_log(self.snapshot, digests)
+        fingerprint = change_log_fingerprint(change_log)
+
+        checkpoint = await self.load_checkpoint() if self.resume or self.incremental else None
+        done = set()
+        if checkpoint is not None and checkpoint.status != "SUCCEEDED":
+            # An unfinished run is resumed, or redone in full; never continued incrementally
+            if self.resume and checkpoint.fingerprint == fingerprint:
+                done = set(checkpoint.completed_stages or [])
+            elif self.resume:
+                logger.info(f"Inputs of exam {self.exam_id} changed since the last run, starting from the first stage")
+        elif checkpoint is not None and self.incremental:
+            self.changed = changed_centres(checkpoint.change_log, change_log)
+        if self.incremental and self.changed is None:
+            logger.info(f"Exam {self.exam_id} has no successful run to compare against or changed structurally, running in full")
+        if self.changed is None or self.changed:
+            await self.load_inputs()
+            self.prepare()
+        load_seconds = time.time() - start_time
+        subject_rows = 0 if self.subjects is None else len(self.subjects)
+        logger.info(f"Loaded snapshot of exam {self.exam_id} ({subject_rows} subject rows) in {load_seconds:.2f} seconds")
+        summary = {
+            'exam_id': self.exam_id,
+            'fingerprint': fingerprint,
+            'mode': 'full' if self.changed is None else 'incremental',
+            'changed_centres': None if self.changed is None else len(self.changed),
+            'resumed': bool(done),
+            'load_seconds': load_seconds,
+        }
+
+        completed = [stage for stage in STAGES if stage in done]
+        stages: Dict[str, Dict[str, Any]] = {}
+        if self.changed is not None and not self.changed:
+            # Nothing changed since the last successful run
+            done = set(STAGES)
+            completed = list(STAGES)
+        await self.save_checkpoint(fingerprint, completed, stages)
+        try:
+            for number, stage in enumerate(STAGES, 1):
+                skipped = stage in done
+                if skipped and (self.changed is not None or stage not in _INPUT_STAGES):
+                    stages[stage] = {'rows': 0, 'compute_seconds': 0.0, 'write_seconds': 0.0, 'skipped': True}
+                else:
+                    stage_start = time.time()
+                    writes = await self.compute(stage)
+                    compute_seconds = time.time() - stage_start
+
+                    rows, write_start = 0, time.time()
+                    if not skipped:
+                        async with db_pools.acquire() as conn:
+                            for writer, frame in writes:
+                                rows += (await writer.write(conn, frame))['rows']
+                        completed.append(stage)
+                    stages[stage] = {
+                        'rows': rows,
+                        'compute_seconds': compute_seconds,
+                        'write_seconds': time.time() - write_start,
+                        'skipped': skipped,
+                    }
+                    if not skipped:
+                        await self.save_checkpoint(fingerprint, completed, stages)
+                logger.info(f"Stage {stage} of exam {self.exam_id}: {stages[stage]}")
+                if self.progress:
+                    self.progress(number / len(STAGES), f"{stage} {'skipped' if skipped else 'done'}")
+        except Exception as e:
+            logger.error(f"Pipeline of exam {self.exam_id} failed: {e}", exc_info=True)
+            await self.save_checkpoint(fingerprint, completed, stages, status="FAILED", error=str(e))
+            raise
+
+        await self.save_checkpoint(fingerprint, completed, stages, status="SUCCEEDED", change_log=change_log)
+        return {**summary, 'stages': stages, 'total_seconds': time.time() - start_time}
@@ -0,0 +1,307 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# School type splits ranked alongside every location level
+SCHOOL_TYPE_SUFFIXES = {'GOVERNMENT': 'gvt', 'PRIVATE': 'pvt'}
+SCHOOL_TYPES_BY_SUFFIX = {suffix: sch_type for sch_type, suffix in SCHOOL_TYPE_SUFFIXES.items()}
+
+# {level}[_subject]_{pos|out_of}[_{gvt|pvt}][_{F|M}]; a bare pos/out_of is the overall level
+_RANK_COLUMN_RE = re.compile(
+    r'^(?:(?P<level>[a-z]+)_)?(?:subject_)?(?P<stat>pos|out_of)(?:_(?P<suffix>gvt|pvt))?(?:_(?P<sex>[FM]))?$'
+)
+
+
+class RankLevel(NamedTuple):
+    """Grouping of a ranking level: rows are ranked within equal ``keys``."""
+    keys: Tuple[str, ...]
+    # Extra columns that must be non-null for a row to be ranked at this level
+    required: Tuple[str, ...] = ()
+
+
+class RankColumn(NamedTuple):
+    """One output column: a position or group size for a level/sex/school type partition."""
+    name: str
+    level: str
+    stat: str
+    sex: Optional[str] = None
+    school_type: Optional[str] = None
+
+    @classmethod
+    def parse(cls, name: str) -> "RankColumn":
+        """Derive the partition from a column name such as ``ward_subject_pos_gvt_F``."""
+        match = _RANK_COLUMN_RE.match(name)
+        if not match:
+            raise ValueError(f"Unrecognised ranking column: {name}")
+        suffix = match.group('suffix')
+        return cls(
+            name=name,
+            level=match.group('level') or 'overall',
+            stat=match.group('stat'),
+            sex=match.group('sex'),
+            school_type=SCHOOL_TYPES_BY_SUFFIX[suffix] if suffix else None,
+        )
+
+
+OVERALL_LEVEL = RankLevel(keys=())
+
+# (prefix, group columns, rank GOVERNMENT/PRIVATE splits)
+RESULT_RANK_LEVELS: Tuple[Tuple[str, Tuple[str, ...], bool], ...] = (
+    ('region', ('region_name',), True),
+    ('council', ('council_name',), True),
+    ('ward', ('council_name', 'ward_name'), True),
+    ('school', ('centre_number',), False),
+)
+
+RESULT_RANK_COLUMNS = [
+    'pos', 'out_of', 'ward_pos', 'ward_out_of', 'ward_pos_gvt', 'ward_pos_pvt',
+    'council_pos', 'council_out_of', 'council_pos_gvt', 'council_pos_pvt',
+    'region_pos', 'region_out_of', 'region_pos_gvt', 'region_pos_pvt',
+    'school_pos', 'school_out_of'
+]
+
+# Ranking columns of student_subjects written by SubjectProcessor
+SUBJECT_RANK_COLUMNS = [
+    'subject_pos', 'subject_out_of',
+    'ward_subject_pos', 'ward_subject_out_of',
+    'council_subject_pos', 'council_subject_out_of',
+    'region_subject_pos', 'region_subject_out_of',
+    'ward_subject_pos_gvt', 'ward_subject_out_of_gvt',
+    'ward_subject_pos_pvt', 'ward_subject_out_of_pvt',
+    'council_subject_pos_gvt', 'council_subject_out_of_gvt',
+    'council_subject_pos_pvt', 'council_subject_out_of_pvt',
+    'region_subject_pos_gvt', 'region_subject_out_of_gvt',
+    'region_subject_pos_pvt', 'region_subject_out_of_pvt'
+]
+
+# SubjectProcessor ranks each subject nationally and within every location on its own
+SUBJECT_LEVELS = {
+    'subject': RankLevel(('subject_code',)),
+    'ward': RankLevel(('ward_name', 'subject_code')),
+    'council': RankLevel(('council_name', 'subject_code')),
+    'region': RankLevel(('region_name', 'subject_code')),
+}
+
+
+def _codes(values: pd.Series) -> Tuple[np.ndarray, Dict[object, int]]:
+    """Integer codes (-1 for null) and the code of every distinct value."""
+    codes, uniques = pd.factorize(values)
+    return codes.astype(np.int64), {value: code for code, value in enumerate(uniques)}
+
+
+def _level_codes(sub: pd.DataFrame, level: RankLevel) -> np.ndarray:
+    """Composite key of a level as one integer code per row (-1 when not ranked)."""
+    if level.keys:
+        groups = sub.groupby([sub[key] for key in level.keys], sort=False, dropna=True, observed=True).ngroup()
+        codes = np.nan_to_num(groups.to_numpy(dtype=np.float64), nan=-1).astype(np.int64)
+    else:
+        codes = np.zeros(len(sub), dtype=np.int64)
+    for required in level.required:
+        codes[sub[required].isna().to_numpy()] = -1
+    return codes
+
+
+def rank_partitions(
+    df: pd.DataFrame,
+    value_col: str,
+    levels: Dict[str, RankLevel],
+    columns: Iterable,
+    valid: Optional[pd.Series] = None,
+    sex_col: str = 'sex',
+    type_col: str = 'school_type',
+    sentinel: Optional[int] = None,
+    method: str = 'min',
+) -> pd.DataFrame:
+    """
+    Rank ``value_col`` (highest first, ``method='min'`` by default) for every
+    requested level × sex × school type partition.
+
+    Each level's composite key is encoded once as an integer code. All the
+    partitions a level needs (e.g. every ``_F``/``_M`` and ``_gvt``/``_pvt``
+    combination) are then ranked together by one ``groupby().rank()`` and one
+    ``transform('count')`` over a combined key.
+
+    Args:
+        df: Frame holding the value, level, sex and school type columns.
+        value_col: Column to rank.
+        levels: Level name to ``RankLevel``; ``'overall'`` defaults to one group.
+        columns: Output columns as ``RankColumn`` or names understood by
+            ``RankColumn.parse``.
+        valid: Rows taking part in the ranking; defaults to ``value_col >= 0``.
+        sex_col: Sex column used by ``_F``/``_M`` columns.
+        type_col: School type column used by ``_gvt``/``_pvt`` columns.
+        sentinel: When given, return int32 columns holding ``sentinel``
+            instead of NaN for rows without a value.
+        method: Tie method of ``rank``, e.g. ``'dense'``.
+
+    Returns:
+        Float frame aligned with ``df.index`` with one column per requested
+        column, NaN outside the column's partition or for unranked rows.
+    """
+    columns = [col if isinstance(col, RankColumn) else RankColumn.parse(col) for col in columns]
+    levels = {'overall': OVERALL_LEVEL, **levels}
+    for col in columns:
+        if col.level not in levels:
+            raise ValueError(f"No ranking level defined for column {col.name}")
+
+    if valid is None:
+        valid = df[value_col] >= 0
+    sub = df.loc[valid]
+    values = sub[value_col].to_numpy(dtype=np.float64)
+    n_rows = len(sub)
+
+    # Sex and school type are encoded once and shared by every level
+    no_codes = (np.zeros(n_rows, dtype=np.int64), {})
+    sex_codes, sex_lookup = _codes(sub[sex_col]) if any(col.sex for col in columns) else no_codes
+    if any(col.school_type for col in columns):
+        type_codes, type_lookup = _codes(sub[type_col].where(sub[type_col].isin(list(SCHOOL_TYPE_SUFFIXES))))
+    else:
+        type_codes, type_lookup = no_codes
+    n_sex, n_types = max(len(sex_lookup), 1), max(len(type_lookup), 1)
+
+    fill, dtype = (np.nan, np.float64) if sentinel is None else (sentinel, np.int32)
+    level_codes: Dict[str, np.ndarray] = {}
+    partitions: Dict[Tuple[str, bool, bool], Tuple[np.ndarray, np.ndarray]] = {}
+    output: Dict[str, np.ndarray] = {}
+
+    for col in columns:
+        if col.level not in level_codes:
+            level_codes[col.level] = _level_codes(sub, levels[col.level])
+
+        by_sex, by_type = col.sex is not None, col.school_type is not None
+        partition_key = (col.level, by_sex, by_type)
+        if partition_key not in partitions:
+            codes = level_codes[col.level]
+            ranked = codes >= 0
+            combined = codes * (n_sex * n_types)
+            if by_sex:
+                ranked &= sex_codes >= 0
+                combined = combined + sex_codes * n_types
+            if by_type:
+                ranked &= type_codes >= 0
+                combined = combined + type_codes
+            rows = np.flatnonzero(ranked)
+            grouped = pd.Series(values[rows]).groupby(combined[rows], sort=False)
+            pos = np.full(n_rows, fill, dtype=dtype)
+            out_of = np.full(n_rows, fill, dtype=dtype)
+            pos[rows] = grouped.rank(method=method, ascending=False).to_numpy()
+            out_of[rows] = grouped.transform('count').to_numpy()
+            partitions[partition_key] = (pos, out_of)
+
+        pos, out_of = partitions[partition_key]
+        mask = np.ones(n_rows, dtype=bool)
+        if by_sex:
+            mask &= sex_codes == sex_lookup.get(col.sex, -2)
+        if by_type:
+            mask &= type_codes == type_lookup.get(col.school_type, -2)
+        output[col.name] = np.where(mask, pos if col.stat == 'pos' else out_of, fill).astype(dtype, copy=False)
+
+    frame = pd.DataFrame(output, index=sub.index, columns=[col.name for col in columns])
+    if sentinel is None:
+        return frame.reindex(df.index)
+    return frame.reindex(df.index, fill_value=sentinel)
+
+
+def affected_rows(df: pd.DataFrame, level: RankLevel, changed: np.ndarray) -> np.ndarray:
+    """Rows that share a partition of ``level`` with at least one ``changed`` row."""
+    changed = np.asarray(changed, dtype=bool)
+    if not level.keys:
+        return np.full(len(df), changed.any())
+    codes = _level_codes(df, level)
+    hit = np.unique(codes[changed & (codes >= 0)])
+    return np.isin(codes, hit)
+
+
+def rank_changed_partitions(
+    df: pd.DataFrame,
+    value_col: str,
+    levels: Dict[str, RankLevel],
+    columns: Iterable,
+    changed: np.ndarray,
+    current: pd.DataFrame,
+    valid: Optional[pd.Series] = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Re-rank only the partitions that hold a ``changed`` row.
+
+    For every level, the rows sharing a partition with a changed row are ranked
+    again with ``rank_partitions``; all other rows keep their value from
+    ``current`` (the ranks stored by an earlier run, aligned with ``df``).
+
+    Returns:
+        Frame aligned with ``df.index`` with one column per requested column.
+    """
+    columns = [col if isinstance(col, RankColumn) else RankColumn.parse(col) for col in columns]
+    all_levels = {'overall': OVERALL_LEVEL, **levels}
+    if valid is None:
+        valid = df[value_col] >= 0
+
+    by_level: Dict[str, List[RankColumn]] = {}
+    for col in columns:
+        if col.level not in all_levels:
+            raise ValueError(f"No ranking level defined for column {col.name}")
+        by_level.setdefault(col.level, []).append(col)
+
+    output = current[[col.name for col in columns]].astype(np.float64).copy()
+    for level, level_columns in by_level.items():
+        rows = affected_rows(df, all_levels[level], changed)
+        if not rows.any():
+            continue
+        ranks = rank_partitions(df.loc[rows], value_col, levels, level_columns, valid=valid.loc[rows], **kwargs)
+        names = [col.name for col in level_columns]
+        output.loc[rows, names] = ranks[names].to_numpy()
+    return output
+
+
+def result_rank_columns(
+    levels: Sequence[Tuple[str, Sequence[str], bool]] = RESULT_RANK_LEVELS,
+) -> Tuple[Dict[str, RankLevel], List[RankColumn]]:
+    """Ranking levels and ``pos``/``out_of`` columns for ``(prefix, group columns, with splits)`` levels."""
+    rank_levels_by_name = {}
+    columns: List[RankColumn] = [
+        RankColumn('pos', 'overall', 'pos'),
+        RankColumn('out_of', 'overall', 'out_of'),
+    ]
+    for prefix, group_cols, with_splits in levels:
+        rank_levels_by_name[prefix] = RankLevel(tuple(group_cols))
+        columns += [
+            RankColumn(f'{prefix}_pos', prefix, 'pos'),
+            RankColumn(f'{prefix}_out_of', prefix, 'out_of'),
+        ]
+        if with_splits:
+            columns += [
+                RankColumn(f'{prefix}_pos_{suffix}', prefix, 'pos', school_type=sch_type)
+                for sch_type, suffix in SCHOOL_TYPE_SUFFIXES.items()
+            ]
+    return rank_levels_by_name, columns
+
+
+def rank_levels(
+    df: pd.DataFrame,
+    value_col: str = 'avg_marks',
+    levels: Sequence[Tuple[str, Sequence[str], bool]] = RESULT_RANK_LEVELS,
+    valid: Optional[pd.Series] = None,
+    type_col: str = 'school_type',
+    sentinel: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Rank ``value_col`` (highest first, ``method='min'``) overall and within every level.
+
+    Args:
+        df: Frame holding the value, level and school type columns.
+        value_col: Column to rank.
+        levels: ``(prefix, group columns, with splits)`` for every level.
+        valid: Rows taking part in the ranking; defaults to ``value_col >= 0``.
+        type_col: School type column used for the ``_gvt``/``_pvt`` splits.
+        sentinel: When given, int32 columns holding ``sentinel`` for rows
+            that are not ranked, as in ``rank_partitions``.
+
+    Returns:
+        Frame aligned with ``df.index`` holding ``pos``/``out_of`` and
+        ``{prefix}_pos``/``{prefix}_out_of``/``{prefix}_pos_{gvt,pvt}`` columns,
+        NaN for rows that are not ranked.
+    """
+    rank_levels_by_name, columns = result_rank_columns(levels)
+    return rank_partitions(df, value_col, rank_levels_by_name, columns, valid=valid, type_col=type_col, sentinel=sentinel)
@@ -1,17 +1,38 @@
 import pandas as pd
+import numpy as np
 import asyncio
 import time
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import text
 from app.core.config import Settings
 from sqlalchemy.exc import OperationalError
+from utils.processor.ranking import RankLevel, rank_partitions
+
+RANKING_COLUMNS = [
+    'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M',
+    'ward_pos_F', 'ward_pos_M', 'ward_out_of_F', 'ward_out_of_M',
+    'ward_pos_gvt_F', 'ward_pos_gvt_M', 'ward_pos_pvt_F', 'ward_pos_pvt_M',
+    'council_pos_F', 'council_pos_M', 'council_out_of_F', 'council_out_of_M',
+    'council_pos_gvt_F', 'council_pos_gvt_M', 'council_pos_pvt_F', 'council_pos_pvt_M',
+    'region_pos_F', 'region_pos_M', 'region_out_of_F', 'region_out_of_M',
+    'region_pos_gvt_F', 'region_pos_gvt_M', 'region_pos_pvt_F', 'region_pos_pvt_M'
+]
+
+# A student is ranked at a location level only when the location chain above it is known
+SEX_RANK_LEVELS = {
+    'school': RankLevel(('centre_number',)),
+    'ward': RankLevel(('ward_name',), required=('council_name', 'region_name')),
+    'council': RankLevel(('council_name',), required=('region_name',)),
+    'region': RankLevel(('region_name',)),
+}
 
 class RankingSexWise:
     def __init__(self, settings: Settings):
         """Initialize with database settings."""
         self.settings = settings
-        self.engine = create_async_engine(settings.DATABASE_URL, echo=False)
+        self.engine = async_engine
         self.async_session = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
         self.chunk_size = 10000  # Adjustable chunk size
         self.max_retries = 3
@@ -60,76 +81,11 @@ class RankingSexWise:
     def compute_rankings(self, df: pd.DataFrame) -> pd.DataFrame:
         """Compute school-wise and location-wise rankings."""
         # Filter for valid avg_marks (>= 0 and finite)
-        df_valid = df[df['avg_marks'].notnull() & (df['avg_marks'] >= 0) & 
-                      df['avg_marks'].apply(lambda x: not pd.isna(x) and x != float('inf') and x != -float('inf'))].copy()
-
-        # Initialize ranking columns to NaN
-        ranking_columns = [
-            'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M',
-            'ward_pos_F', 'ward_pos_M', 'ward_out_of_F', 'ward_out_of_M',
-            'ward_pos_gvt_F', 'ward_pos_gvt_M', 'ward_pos_pvt_F', 'ward_pos_pvt_M',
-            'council_pos_F', 'council_pos_M', 'council_out_of_F', 'council_out_of_M',
-            'council_pos_gvt_F', 'council_pos_gvt_M', 'council_pos_pvt_F', 'council_pos_pvt_M',
-            'region_pos_F', 'region_pos_M', 'region_out_of_F', 'region_out_of_M',
-            'region_pos_gvt_F', 'region_pos_gvt_M', 'region_pos_pvt_F', 'region_pos_pvt_M'
-        ]
-        df[ranking_columns] = pd.NA
-
-        # School-wise rankings
-        df_valid.loc[df_valid['sex'] == 'F', 'school_pos_F'] = df_valid[df_valid['sex'] == 'F'].groupby('centre_number')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid.loc[df_valid['sex'] == 'M', 'school_pos_M'] = df_valid[df_valid['sex'] == 'M'].groupby('centre_number')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid.loc[df_valid['sex'] == 'F', 'school_out_of_F'] = df_valid[df_valid['sex'] == 'F'].groupby('centre_number')['avg_marks'].transform('count').astype('Int64')
-        df_valid.loc[df_valid['sex'] == 'M', 'school_out_of_M'] = df_valid[df_valid['sex'] == 'M'].groupby('centre_number')['avg_marks'].transform('count').astype('Int64')
-
-        # Filter for valid location hierarchies
-        df_valid_region = df_valid[df_valid['region_name'].notnull()]
-        df_valid_council = df_valid[df_valid['council_name'].notnull() & df_valid['region_name'].notnull()]
-        df_valid_ward = df_valid[df_valid['ward_name'].notnull() & df_valid['council_name'].notnull() & df_valid['region_name'].notnull()]
-
-        # Ward rankings
-        df_valid_ward.loc[df_valid_ward['sex'] == 'F', 'ward_pos_F'] = df_valid_ward[df_valid_ward['sex'] == 'F'].groupby('ward_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_ward.loc[df_valid_ward['sex'] == 'M', 'ward_pos_M'] = df_valid_ward[df_valid_ward['sex'] == 'M'].groupby('ward_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_ward.loc[df_valid_ward['sex'] == 'F', 'ward_out_of_F'] = df_valid_ward[df_valid_ward['sex'] == 'F'].groupby('ward_name')['avg_marks'].transform('count').astype('Int64')
-        df_valid_ward.loc[df_valid_ward['sex'] == 'M', 'ward_out_of_M'] = df_valid_ward[df_valid_ward['sex'] == 'M'].groupby('ward_name')['avg_marks'].transform('count').astype('Int64')
-
-        # Ward government/private rankings
-        df_valid_ward.loc[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'GOVERNMENT'), 'ward_pos_gvt_F'] = df_valid_ward[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'GOVERNMENT')].groupby('ward_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_ward.loc[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'GOVERNMENT'), 'ward_pos_gvt_M'] = df_valid_ward[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'GOVERNMENT')].groupby('ward_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_ward.loc[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'PRIVATE'), 'ward_pos_pvt_F'] = df_valid_ward[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'PRIVATE')].groupby('ward_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_ward.loc[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'PRIVATE'), 'ward_pos_pvt_M'] = df_valid_ward[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'PRIVATE')].groupby('ward_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-
-        # Council rankings
-        df_valid_council.loc[df_valid_council['sex'] == 'F', 'council_pos_F'] = df_valid_council[df_valid_council['sex'] == 'F'].groupby('council_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_council.loc[df_valid_council['sex'] == 'M', 'council_pos_M'] = df_valid_council[df_valid_council['sex'] == 'M'].groupby('council_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_council.loc[df_valid_council['sex'] == 'F', 'council_out_of_F'] = df_valid_council[df_valid_council['sex'] == 'F'].groupby('council_name')['avg_marks'].transform('count').astype('Int64')
-        df_valid_council.loc[df_valid_council['sex'] == 'M', 'council_out_of_M'] = df_valid_council[df_valid_council['sex'] == 'M'].groupby('council_name')['avg_marks'].transform('count').astype('Int64')
-
-        # Council government/private rankings
-        df_valid_council.loc[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'GOVERNMENT'), 'council_pos_gvt_F'] = df_valid_council[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'GOVERNMENT')].groupby('council_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_council.loc[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'GOVERNMENT'), 'council_pos_gvt_M'] = df_valid_council[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'GOVERNMENT')].groupby('council_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_council.loc[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'PRIVATE'), 'council_pos_pvt_F'] = df_valid_council[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'PRIVATE')].groupby('council_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_council.loc[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'PRIVATE'), 'council_pos_pvt_M'] = df_valid_council[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'PRIVATE')].groupby('council_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-
-        # Region rankings
-        df_valid_region.loc[df_valid_region['sex'] == 'F', 'region_pos_F'] = df_valid_region[df_valid_region['sex'] == 'F'].groupby('region_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_region.loc[df_valid_region['sex'] == 'M', 'region_pos_M'] = df_valid_region[df_valid_region['sex'] == 'M'].groupby('region_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_region.loc[df_valid_region['sex'] == 'F', 'region_out_of_F'] = df_valid_region[df_valid_region['sex'] == 'F'].groupby('region_name')['avg_marks'].transform('count').astype('Int64')
-        df_valid_region.loc[df_valid_region['sex'] == 'M', 'region_out_of_M'] = df_valid_region[df_valid_region['sex'] == 'M'].groupby('region_name')['avg_marks'].transform('count').astype('Int64')
-
-        # Region government/private rankings
-        df_valid_region.loc[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'GOVERNMENT'), 'region_pos_gvt_F'] = df_valid_region[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'GOVERNMENT')].groupby('region_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_region.loc[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'GOVERNMENT'), 'region_pos_gvt_M'] = df_valid_region[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'GOVERNMENT')].groupby('region_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_region.loc[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'PRIVATE'), 'region_pos_pvt_F'] = df_valid_region[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'PRIVATE')].groupby('region_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-        df_valid_region.loc[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'PRIVATE'), 'region_pos_pvt_M'] = df_valid_region[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'PRIVATE')].groupby('region_name')['avg_marks'].rank(ascending=False, method='min').astype('Int64')
-
-        # Update original DataFrame
-        df.update(df_valid_ward[['student_global_id', 'ward_pos_F', 'ward_pos_M', 'ward_out_of_F', 'ward_out_of_M',
-                                'ward_pos_gvt_F', 'ward_pos_gvt_M', 'ward_pos_pvt_F', 'ward_pos_pvt_M']])
-        df.update(df_valid_council[['student_global_id', 'council_pos_F', 'council_pos_M', 'council_out_of_F', 'council_out_of_M',
-                                   'council_pos_gvt_F', 'council_pos_gvt_M', 'council_pos_pvt_F', 'council_pos_pvt_M']])
-        df.update(df_valid_region[['student_global_id', 'region_pos_F', 'region_pos_M', 'region_out_of_F', 'region_out_of_M',
-                                  'region_pos_gvt_F', 'region_pos_gvt_M', 'region_pos_pvt_F', 'region_pos_pvt_M']])
-        df.update(df_valid[['student_global_id', 'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M']])
+        marks = pd.to_numeric(df['avg_marks'], errors='coerce')
+        valid = marks.notnull() & (marks >= 0) & np.isfinite(marks)
+
+        ranks = rank_partitions(df, 'avg_marks', SEX_RANK_LEVELS, RANKING_COLUMNS, valid=valid)
+        df[RANKING_COLUMNS] = ranks.astype('Int64').astype(object)
         return df
 
     async def update_rankings(self, df: pd.DataFrame, exam_id: str):
@@ -229,5 +185,4 @@ class RankingSexWise:
         return df
 
     async def close(self):
-        """Dispose of the engine."""
-        await self.engine.dispose()
\ No newline at end of file
+        """Nothing to release: the engine is the application's shared engine."""
\ No newline at end of file
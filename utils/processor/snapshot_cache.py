@@ -0,0 +1,198 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.db.database import db_pools
+from utils.processor.columnar import read_frame
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the cached tables or their dtypes change, so old files are never read
+SNAPSHOT_FORMAT = 2
+
+
+class SnapshotTable(NamedTuple):
+    """One cached table: its query, its columns, and how they are stored."""
+    query: str
+    columns: List[str]
+    # Repeated text stored dictionary-encoded (category in pandas)
+    categorical: Tuple[str, ...] = ()
+    # Marks, stored as the values the database returns and loaded as float32 when compact
+    marks: Tuple[str, ...] = ()
+    # Unique text keys (UUIDs), read without sharing values; all other columns are shared text
+    keys: Tuple[str, ...] = ()
+    # Cheap server-side checksum of the same rows; any change to them changes the data version
+    version_query: str = ""
+
+
+SNAPSHOT_TABLES: Dict[str, SnapshotTable] = {
+    'student_subjects': SnapshotTable(
+        query="""SELECT id, exam_id, student_global_id, centre_number, subject_code,
+        theory_marks, practical_marks, overall_marks
+        FROM student_subjects WHERE exam_id = %s ORDER BY id""",
+        columns=['id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code',
+                 'theory_marks', 'practical_marks', 'overall_marks'],
+        categorical=('exam_id', 'centre_number', 'subject_code'),
+        marks=('theory_marks', 'practical_marks', 'overall_marks'),
+        keys=('id',),
+        version_query="""SELECT COUNT(*), COALESCE(SUM(h), 0), COALESCE(BIT_XOR(h), 0) FROM (
+            SELECT CRC32(CONCAT_WS('|', id, student_global_id, centre_number, subject_code,
+                IFNULL(theory_marks, '-'), IFNULL(practical_marks, '-'), IFNULL(overall_marks, '-'))) AS h
+            FROM student_subjects WHERE exam_id = %s) rows_""",
+    ),
+    'students': SnapshotTable(
+        query="""SELECT student_global_id, student_id, full_name, sex, exam_id, centre_number
+        FROM students WHERE exam_id = %s ORDER BY student_global_id""",
+        columns=['student_global_id', 'student_id', 'full_name', 'sex', 'exam_id', 'centre_number'],
+        categorical=('sex', 'exam_id', 'centre_number'),
+        version_query="""SELECT COUNT(*), COALESCE(SUM(h), 0), COALESCE(BIT_XOR(h), 0) FROM (
+            SELECT CRC32(CONCAT_WS('|', student_global_id, student_id, IFNULL(full_name, '-'),
+                IFNULL(sex, '-'), centre_number)) AS h
+            FROM students WHERE exam_id = %s) rows_""",
+    ),
+    'schools': SnapshotTable(
+        query="""SELECT centre_number, school_name, region_name, council_name, ward_name, school_type FROM schools
+        WHERE centre_number IN (SELECT centre_number FROM students WHERE exam_id = %s) ORDER BY centre_number""",
+        columns=['centre_number', 'school_name', 'region_name', 'council_name', 'ward_name', 'school_type'],
+        categorical=('region_name', 'council_name', 'ward_name', 'school_type'),
+        version_query="""SELECT COUNT(*), COALESCE(SUM(h), 0), COALESCE(BIT_XOR(h), 0) FROM (
+            SELECT CRC32(CONCAT_WS('|', centre_number, IFNULL(school_name, '-'), IFNULL(region_name, '-'),
+                IFNULL(council_name, '-'), IFNULL(ward_name, '-'), IFNULL(school_type, '-'))) AS h
+            FROM schools WHERE centre_number IN (SELECT centre_number FROM students WHERE exam_id = %s)) rows_""",
+    ),
+}
+
+
+def _arrow():
+    """pyarrow modules, or None when pyarrow is not installed (the cache is then disabled)."""
+    try:
+        import pyarrow
+        import pyarrow.feather
+    except ImportError:
+        return None
+    return pyarrow
+
+
+class ExamSnapshotCache:
+    """
+    Local cache of an exam's students, student subject marks and schools as Arrow files.
+
+    Each table is written once per data version to
+    ``{cache_dir}/{exam_id}/{version}/{table}.arrow`` (uncompressed Arrow IPC,
+    so it is read memory-mapped), with repeated text dictionary-encoded. The data version is derived from a ``COUNT``/``CRC32``
+    checksum the database computes over the same rows, so any change to the
+    marks, students or schools of the exam invalidates the files without
+    transferring the rows. Without pyarrow the cache is disabled and
+    ``load`` returns None.
+
+    Args:
+        cache_dir: Root directory of the cached files.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+
+    @property
+    def enabled(self) -> bool:
+        return _arrow() is not None
+
+    def exam_dir(self, exam_id: str) -> Path:
+        return self.cache_dir / exam_id
+
+    async def data_version(self, conn, exam_id: str) -> str:
+        """Version of the exam's cached tables as currently stored in the database."""
+        digest = hashlib.sha256(f"format:{SNAPSHOT_FORMAT}".encode())
+        async with conn.cursor() as cur:
+            for name, table in SNAPSHOT_TABLES.items():
+                await cur.execute(table.version_query, (exam_id,))
+                digest.update(f"{name}:{await cur.fetchone()}".encode())
+        return digest.hexdigest()[:16]
+
+    async def fetch_table(self, conn, exam_id: str, name: str):
+        """Stream one table into an Arrow table with its compact types."""
+        pa = _arrow()
+        table = SNAPSHOT_TABLES[name]
+        kinds = {
+            col: 'float' if col in table.marks else 'text' if col in table.keys
+            else 'category' if col in table.categorical else 'str'
+            for col in table.columns
+        }
+        df = await read_frame(conn, table.query, (exam_id,), kinds)
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def write_table(self, path: Path, table) -> None:
+        """Write atomically, so a concurrent reader never sees a partial file."""
+        pa = _arrow()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+        pa.feather.write_feather(table, str(tmp_path), compression='uncompressed')
+        os.replace(tmp_path, path)
+
+    def read_table(self, path: Path, name: str, compact: bool) -> pd.DataFrame:
+        pa = _arrow()
+        df = pa.feather.read_table(str(path), memory_map=True).to_pandas()
+        if compact:
+            for col in SNAPSHOT_TABLES[name].marks:
+                df[col] = df[col].astype('float32')
+        else:
+            # Same dtypes as a direct query: text as object
+            for col in SNAPSHOT_TABLES[name].categorical:
+                df[col] = df[col].astype(object)
+        return df
+
+    def prune(self, exam_id: str, keep: Optional[str] = None) -> None:
+        """Remove the cached versions of an exam other than ``keep``."""
+        exam_dir = self.exam_dir(exam_id)
+        if not exam_dir.is_dir():
+            return
+        for version_dir in exam_dir.iterdir():
+            if version_dir.name != keep:
+                shutil.rmtree(version_dir, ignore_errors=True)
+
+    async def load(self, exam_id: str, tables: Optional[List[str]] = None, compact: bool = False) -> Optional[Dict[str, pd.DataFrame]]:
+        """
+        Load cached tables of an exam, refreshing the files first when the data changed.
+
+        Args:
+            exam_id: Exam to load.
+            tables: Names from ``SNAPSHOT_TABLES``; all of them by default.
+            compact: Keep text as categoricals and load marks as float32
+                instead of the dtypes of a direct query.
+
+        Returns:
+            Table name to DataFrame, or None when pyarrow is not installed.
+        """
+        if not self.enabled:
+            return None
+        tables = list(tables or SNAPSHOT_TABLES)
+        start_time = time.time()
+        async with db_pools.acquire() as conn:
+            version = await self.data_version(conn, exam_id)
+            version_dir = self.exam_dir(exam_id) / version
+            refreshed = []
+            for name in tables:
+                path = version_dir / f"{name}.arrow"
+                if not path.exists():
+                    self.write_table(path, await self.fetch_table(conn, exam_id, name))
+                    refreshed.append(name)
+        if refreshed:
+            self.prune(exam_id, keep=version)
+        frames = {name: self.read_table(version_dir / f"{name}.arrow", name, compact) for name in tables}
+        logger.info(
+            f"Loaded snapshot {version} of exam {exam_id} in {time.time() - start_time:.2f} seconds"
+            + (f" (refreshed {', '.join(refreshed)})" if refreshed else "")
+        )
+        return frames
+
+    def invalidate(self, exam_id: str) -> None:
+        """Drop every cached version of an exam."""
+        shutil.rmtree(self.exam_dir(exam_id), ignore_errors=True)
+
+
+exam_snapshots = ExamSnapshotCache(settings.SNAPSHOT_CACHE_DIR)
@@ -1,9 +1,17 @@
-import aiomysql
+import asyncio
 import pandas as pd
 import numpy as np
 import time
 import logging
 import nest_asyncio
+from typing import Any, Callable, Optional
+from app.db.database import db_pools
+from utils.processor.bulk_writer import BulkColumnWriter
+from utils.processor.columnar import read_frame
+from utils.processor.encoding import RANK_SENTINEL, decode_frame, decode_ranks, encode_frame
+from utils.processor.lookup import first_matching_band
+from utils.processor.ranking import SUBJECT_LEVELS, SUBJECT_RANK_COLUMNS, rank_partitions
+from utils.processor.snapshot_cache import exam_snapshots
 try:
     from app.core.config import Settings
 except ImportError:
@@ -38,38 +46,22 @@ class SubjectProcessor:
         self.STUDENT_SUBJECTS_DF = None
 
     async def load_grades(self):
-        async with aiomysql.create_pool(
-            host=self.settings.DB_HOST,
-            port=self.settings.DB_PORT,
-            user=self.settings.DB_USER,
-            password=self.settings.DB_PASSWORD,
-            db=self.settings.DB_NAME,
-            maxsize=5
-        ) as pool:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(
-                        "SELECT exam_id, grade, lower_value, highest_value, grade_points, division_points FROM exam_grades WHERE exam_id = %s",
-                        (self.exam_id,)
-                    )
-                    return await cur.fetchall()
+        async with db_pools.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT exam_id, grade, lower_value, highest_value, grade_points, division_points FROM exam_grades WHERE exam_id = %s ORDER BY id",
+                    (self.exam_id,)
+                )
+                return await cur.fetchall()
 
     async def load_divisions(self):
-        async with aiomysql.create_pool(
-            host=self.settings.DB_HOST,
-            port=self.settings.DB_PORT,
-            user=self.settings.DB_USER,
-            password=self.settings.DB_PASSWORD,
-            db=self.settings.DB_NAME,
-            maxsize=5
-        ) as pool:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(
-                        "SELECT exam_id, division, lowest_points, highest_points FROM exam_divisions WHERE exam_id = %s",
-                        (self.exam_id,)
-                    )
-                    return await cur.fetchall()
+        async with db_pools.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT exam_id, division, lowest_points, highest_points FROM exam_divisions WHERE exam_id = %s",
+                    (self.exam_id,)
+                )
+                return await cur.fetchall()
 
     def lookup_grade_and_division(self, marks: float | None = None, grade: str | None = None, points: int | None = None, return_type: str = "grade"):
         if not self.exam_id or (self.GRADES_DATA is None and return_type != "division") or (self.DIVISIONS_DATA is None and return_type == "division"):
@@ -106,81 +98,90 @@ class SubjectProcessor:
 
         return None
 
+    def calculate_overall_marks(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Overall marks of every row: ``(theory + practical) * 2 / 3`` for subjects with a
+        practical (a missing paper counts as 0, both missing stays null), else the theory marks.
+
+        ``has_practical`` is tested for truth as the former per-row check did, so the
+        NaN flag of a subject missing from exam_subjects counts as a practical subject.
+        """
+        flags = df['has_practical']
+        if pd.api.types.is_numeric_dtype(flags):
+            values = flags.to_numpy(dtype=np.float64)
+            has_practical = np.isnan(values) | (values != 0)
+        else:
+            has_practical = flags.map(bool).to_numpy(dtype=bool)
+        theory = pd.to_numeric(df['theory_marks'], errors='coerce').to_numpy(dtype=np.float64)
+        practical = pd.to_numeric(df['practical_marks'], errors='coerce').to_numpy(dtype=np.float64)
+
+        combined = (np.nan_to_num(theory) + np.nan_to_num(practical)) * 2 / 3
+        combined[np.isnan(theory) & np.isnan(practical)] = np.nan
+        return np.where(has_practical, combined, theory)
+
+    def calculate_subject_grades(self, marks) -> np.ndarray:
+        """
+        Grade of every overall mark: the first ``GRADES_DATA`` band with
+        ``lower_value <= marks <= highest_value``, None for null or unmatched marks.
+
+        Resolved for the whole column by ``first_matching_band``.
+        """
+        bands = [row for row in (self.GRADES_DATA or []) if row[0] == self.exam_id]
+        return first_matching_band(
+            marks,
+            [row[2] for row in bands],
+            [row[3] for row in bands],
+            np.array([row[1] for row in bands], dtype=object),
+        )
+
     async def load_student_subjects(self):
-        async with aiomysql.create_pool(
-            host=self.settings.DB_HOST,
-            port=self.settings.DB_PORT,
-            user=self.settings.DB_USER,
-            password=self.settings.DB_PASSWORD,
-            db=self.settings.DB_NAME,
-            maxsize=5
-        ) as pool:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(
-                        """SELECT id, exam_id, student_global_id, centre_number, subject_code,
-                        theory_marks, practical_marks, overall_marks, subject_pos, subject_out_of,
-                        ward_subject_pos, ward_subject_out_of, council_subject_pos, council_subject_out_of,
-                        region_subject_pos, region_subject_out_of, ward_subject_pos_gvt, ward_subject_pos_pvt,
-                        council_subject_pos_gvt, council_subject_pos_pvt, region_subject_pos_gvt,
-                        region_subject_pos_pvt, subject_grade,
-                        ward_subject_out_of_gvt, ward_subject_out_of_pvt,
-                        council_subject_out_of_gvt, council_subject_out_of_pvt,
-                        region_subject_out_of_gvt, region_subject_out_of_pvt
-                        FROM student_subjects 
-                        WHERE exam_id = %s""",
-                        (self.exam_id,)
-                    )
-                    rows = await cur.fetchall()
-                    columns = [
-                        'id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code',
-                        'theory_marks', 'practical_marks', 'overall_marks', 'subject_pos', 'subject_out_of',
-                        'ward_subject_pos', 'ward_subject_out_of', 'council_subject_pos', 'council_subject_out_of',
-                        'region_subject_pos', 'region_subject_out_of', 'ward_subject_pos_gvt', 'ward_subject_pos_pvt',
-                        'council_subject_pos_gvt', 'council_subject_pos_pvt', 'region_subject_pos_gvt',
-                        'region_subject_pos_pvt', 'subject_grade',
-                        'ward_subject_out_of_gvt', 'ward_subject_out_of_pvt',
-                        'council_subject_out_of_gvt', 'council_subject_out_of_pvt',
-                        'region_subject_out_of_gvt', 'region_subject_out_of_pvt'
-                    ]
-                    return pd.DataFrame(rows, columns=columns)
+        columns = [
+            'id', 'exam_id', 'student_global_id', 'centre_number', 'subject_code',
+            'theory_marks', 'practical_marks', 'overall_marks', 'subject_pos', 'subject_out_of',
+            'ward_subject_pos', 'ward_subject_out_of', 'council_subject_pos', 'council_subject_out_of',
+            'region_subject_pos', 'region_subject_out_of', 'ward_subject_pos_gvt', 'ward_subject_pos_pvt',
+            'council_subject_pos_gvt', 'council_subject_pos_pvt', 'region_subject_pos_gvt',
+            'region_subject_pos_pvt', 'subject_grade',
+            'ward_subject_out_of_gvt', 'ward_subject_out_of_pvt',
+            'council_subject_out_of_gvt', 'council_subject_out_of_pvt',
+            'region_subject_out_of_gvt', 'region_subject_out_of_pvt'
+        ]
+        # Marks come from the local snapshot when it is available and current; grades
+        # and rankings are recomputed, so they are not read back
+        cached = await exam_snapshots.load(self.exam_id, tables=['student_subjects'])
+        if cached is not None:
+            return cached['student_subjects'].reindex(columns=columns)
+        # Streamed into typed columns: UUID ids as text, other text as shared strings, marks and positions as floats
+        text_columns = ('exam_id', 'student_global_id', 'centre_number', 'subject_code', 'subject_grade')
+        kinds = {col: 'text' if col == 'id' else 'str' if col in text_columns else 'float' for col in columns}
+        async with db_pools.acquire() as conn:
+            return await read_frame(
+                conn,
+                f"SELECT {', '.join(columns)} FROM student_subjects WHERE exam_id = %s",
+                (self.exam_id,),
+                kinds
+            )
 
     async def load_schools(self):
-        async with aiomysql.create_pool(
-            host=self.settings.DB_HOST,
-            port=self.settings.DB_PORT,
-            user=self.settings.DB_USER,
-            password=self.settings.DB_PASSWORD,
-            db=self.settings.DB_NAME,
-            maxsize=5
-        ) as pool:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(
-                        "SELECT centre_number, school_name, region_id, council_id, ward_id, region_name, council_name, ward_name, school_type FROM schools"
-                    )
-                    rows = await cur.fetchall()
-                    columns = ['centre_number', 'school_name', 'region_id', 'council_id', 'ward_id', 'region_name', 'council_name', 'ward_name', 'school_type']
-                    return pd.DataFrame(rows, columns=columns)
+        async with db_pools.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT centre_number, school_name, region_id, council_id, ward_id, region_name, council_name, ward_name, school_type FROM schools"
+                )
+                rows = await cur.fetchall()
+                columns = ['centre_number', 'school_name', 'region_id', 'council_id', 'ward_id', 'region_name', 'council_name', 'ward_name', 'school_type']
+                return pd.DataFrame(rows, columns=columns)
 
     async def load_exam_subjects(self):
-        async with aiomysql.create_pool(
-            host=self.settings.DB_HOST,
-            port=self.settings.DB_PORT,
-            user=self.settings.DB_USER,
-            password=self.settings.DB_PASSWORD,
-            db=self.settings.DB_NAME,
-            maxsize=5
-        ) as pool:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(
-                        "SELECT exam_id, subject_code, has_practical FROM exam_subjects WHERE exam_id = %s",
-                        (self.exam_id,)
-                    )
-                    rows = await cur.fetchall()
-                    columns = ['exam_id', 'subject_code', 'has_practical']
-                    return pd.DataFrame(rows, columns=columns)
+        async with db_pools.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT exam_id, subject_code, has_practical FROM exam_subjects WHERE exam_id = %s",
+                    (self.exam_id,)
+                )
+                rows = await cur.fetchall()
+                columns = ['exam_id', 'subject_code', 'has_practical']
+                return pd.DataFrame(rows, columns=columns)
 
     async def calculate_grades_and_marks(self):
         self.GRADES_DATA = await self.load_grades()
@@ -192,38 +193,30 @@ class SubjectProcessor:
         exam_subjects_df = await self.load_exam_subjects()
         logging.info(f"Loaded {len(exam_subjects_df)} exam subject records")
 
+        # Grading is pure pandas/NumPy work; run it off the event loop
+        await asyncio.to_thread(self.grade_student_subjects, student_subjects_df, schools_df, exam_subjects_df)
+
+    def grade_student_subjects(self, student_subjects_df: pd.DataFrame, schools_df: pd.DataFrame, exam_subjects_df: pd.DataFrame):
+        """Overall marks, grades and locations of every student subject row, into ``STUDENT_SUBJECTS_DF``."""
         # Merge student_subjects with exam_subjects to get has_practical
         df = student_subjects_df.merge(exam_subjects_df, on=['exam_id', 'subject_code'], how='left')
         logging.info(f"Merged DataFrame has {len(df)} records")
 
-        # Calculate overall_marks
-        def calculate_overall_marks(row):
-            if row['has_practical']:
-                if pd.notnull(row['theory_marks']) or pd.notnull(row['practical_marks']):
-                    theory = row['theory_marks'] if pd.notnull(row['theory_marks']) else 0
-                    practical = row['practical_marks'] if pd.notnull(row['practical_marks']) else 0
-                    return (theory + practical) * 2 / 3
-                return None
-            return row['theory_marks']
-
-        df['overall_marks'] = df.apply(calculate_overall_marks, axis=1)
-
-        # Calculate subject_grade
-        def calculate_subject_grade(row):
-            if pd.notnull(row['overall_marks']):
-                return self.lookup_grade_and_division(
-                    marks=row['overall_marks'],
-                    return_type="grade"
-                )
-            return None
-
-        df['subject_grade'] = df.apply(calculate_subject_grade, axis=1)
+        # Calculate overall_marks and subject_grade over whole columns
+        df['overall_marks'] = self.calculate_overall_marks(df)
+        df['subject_grade'] = self.calculate_subject_grades(df['overall_marks'])
 
         # Merge with schools to get region_name, council_name, ward_name, school_type
         df = df.merge(schools_df[['centre_number', 'region_name', 'council_name', 'ward_name', 'school_type']],
                       on='centre_number', how='left')
 
-        self.STUDENT_SUBJECTS_DF = df
+        # Held dictionary-encoded with float32 marks for ranking and until written
+        self.STUDENT_SUBJECTS_DF = encode_frame(
+            df,
+            categorical=('exam_id', 'student_global_id', 'centre_number', 'subject_code', 'subject_grade',
+                         'region_name', 'council_name', 'ward_name', 'school_type'),
+            marks=('theory_marks', 'practical_marks', 'overall_marks')
+        )
 
     def calculate_rankings(self):
         start_time = time.time()
@@ -231,75 +224,14 @@ class SubjectProcessor:
 
         df = self.STUDENT_SUBJECTS_DF
         valid_mask = df['overall_marks'].notnull() & (df['overall_marks'] >= 0)
-        df_valid = df[valid_mask].copy()
-        logging.info(f"Valid records: {len(df_valid)}")
-
-        # Initialize ranking columns
-        def init_columns(columns):
-            for col in columns:
-                df[col] = pd.NA
-
-        rank_cols = [
-            'subject_pos', 'subject_out_of',
-            'ward_subject_pos', 'ward_subject_out_of',
-            'council_subject_pos', 'council_subject_out_of',
-            'region_subject_pos', 'region_subject_out_of',
-            'ward_subject_pos_gvt', 'ward_subject_out_of_gvt',
-            'ward_subject_pos_pvt', 'ward_subject_out_of_pvt',
-            'council_subject_pos_gvt', 'council_subject_out_of_gvt',
-            'council_subject_pos_pvt', 'council_subject_out_of_pvt',
-            'region_subject_pos_gvt', 'region_subject_out_of_gvt',
-            'region_subject_pos_pvt', 'region_subject_out_of_pvt'
-        ]
-        init_columns(rank_cols)
-
-        # Apply ranking with optional filtering
-        def apply_ranking(group_keys, rank_col, out_of_col=None, mask=None):
-            if mask is not None:
-                data = df[mask]
-            else:
-                data = df_valid
-
-            grouped = data.groupby(group_keys, sort=False)
-            df.loc[data.index, rank_col] = grouped['overall_marks'].rank(method='min', ascending=False).astype('Int32')
-            if out_of_col:
-                df.loc[data.index, out_of_col] = grouped['overall_marks'].transform('count').astype('Int32')
-
-        # Subject-level
-        apply_ranking(['subject_code'], 'subject_pos', 'subject_out_of')
-
-        # Ward-level
-        ward_mask = valid_mask & df['ward_name'].notnull()
-        apply_ranking(['subject_code', 'ward_name'], 'ward_subject_pos', 'ward_subject_out_of', mask=ward_mask)
-
-        # Council-level
-        council_mask = valid_mask & df['council_name'].notnull()
-        apply_ranking(['subject_code', 'council_name'], 'council_subject_pos', 'council_subject_out_of', mask=council_mask)
-
-        # Region-level
-        region_mask = valid_mask & df['region_name'].notnull()
-        apply_ranking(['subject_code', 'region_name'], 'region_subject_pos', 'region_subject_out_of', mask=region_mask)
-
-        # Rank by school type (GOVERNMENT/PRIVATE) within area
-        def rank_by_type(level, area_column):
-            for school_type in ['GOVERNMENT', 'PRIVATE']:
-                suffix = 'gvt' if school_type == 'GOVERNMENT' else 'pvt'
-                mask = (
-                    valid_mask &
-                    df[area_column].notnull() &
-                    df['school_type'].notnull() &
-                    (df['school_type'].str.upper() == school_type)
-                )
-                rank_col = f"{level}_subject_pos_{suffix}"
-                out_of_col = f"{level}_subject_out_of_{suffix}"
-                apply_ranking(['subject_code', area_column], rank_col, out_of_col=out_of_col, mask=mask)
+        logging.info(f"Valid records: {valid_mask.sum()}")
 
-        rank_by_type('ward', 'ward_name')
-        rank_by_type('council', 'council_name')
-        rank_by_type('region', 'region_name')
-
-        # Convert <NA> to None for export or compatibility
-        df = df.where(pd.notna(df), None)
+        # Rank by subject nationally and within every location, with the GOVERNMENT/PRIVATE
+        # splits matched case-insensitively; unranked rows hold RANK_SENTINEL until written
+        frame = df.assign(school_type=df['school_type'].map(str.upper, na_action='ignore'))
+        df[SUBJECT_RANK_COLUMNS] = rank_partitions(
+            frame, 'overall_marks', SUBJECT_LEVELS, SUBJECT_RANK_COLUMNS, valid=valid_mask, sentinel=RANK_SENTINEL
+        )
 
         # Final selection of fields
         self.STUDENT_SUBJECTS_DF = df[[
@@ -320,68 +252,56 @@ class SubjectProcessor:
 
         logging.info(f"Ranking calculation completed in {time.time() - start_time:.2f} seconds")
 
-    async def update_student_subjects_rankings(self, batch_size: int = 5000) -> int:
-        df = self.STUDENT_SUBJECTS_DF.copy()
-        df = df.replace({np.nan: None})  # Replace NaN with None for MySQL
-
-        updated_count = 0
-        total = len(df)
-
-        pool = await aiomysql.create_pool(
-            host=self.settings.DB_HOST,
-            port=self.settings.DB_PORT,
-            user=self.settings.DB_USER,
-            password=self.settings.DB_PASSWORD,
-            db=self.settings.DB_NAME,
-            maxsize=5,
-            autocommit=True
+    async def update_student_subjects_rankings(self, batch_size: int = 5000, strategy: str = 'staging') -> int:
+        """
+        Write ranking columns, grades and overall marks back to student_subjects.
+
+        Uses BulkColumnWriter: a staging table plus UPDATE JOIN by default, or a
+        multi-row INSERT ... ON DUPLICATE KEY UPDATE with ``strategy='upsert'``.
+        ``batch_size`` caps the rows per multi-row statement.
+        """
+        df = await asyncio.to_thread(
+            decode_ranks, self.STUDENT_SUBJECTS_DF[['id'] + self.RANKING_COLUMNS], SUBJECT_RANK_COLUMNS
         )
+        writer = BulkColumnWriter('student_subjects', self.RANKING_COLUMNS, strategy=strategy, max_batch_rows=batch_size)
 
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                for start in range(0, total, batch_size):
-                    end = min(start + batch_size, total)
-                    batch = df.iloc[start:end]
-
-                    update_values = []
-                    for _, row in batch.iterrows():
-                        update_values.append([
-                            *(row.get(col) for col in self.RANKING_COLUMNS),
-                            row['id']
-                        ])
-
-                    set_clause = ", ".join([f"{col} = %s" for col in self.RANKING_COLUMNS])
-                    query = f"""
-                        UPDATE student_subjects
-                        SET {set_clause}
-                        WHERE id = %s
-                    """
-
-                    await cur.executemany(query, update_values)
-                    logging.info(f"Updated batch {start}–{end - 1}: {len(update_values)} records")
-                    updated_count += len(update_values)
-
-        pool.close()
-        await pool.wait_closed()
-        return updated_count
+        async with db_pools.acquire() as conn:
+            stats = await writer.write(conn, df)
+
+        logging.info(f"Updated {stats['rows']} student_subjects records in {stats['seconds']:.2f} seconds "
+                     f"({stats['rows_per_second']:,.0f} rows/s)")
+        return stats['rows']
 
     async def export_subject_data(self, subject_code: str, filename: str = "subject_011_only.csv"):
         if self.STUDENT_SUBJECTS_DF is not None:
-            self.STUDENT_SUBJECTS_DF[self.STUDENT_SUBJECTS_DF['subject_code'] == subject_code].to_csv(filename, index=False)
+            df = self.STUDENT_SUBJECTS_DF[self.STUDENT_SUBJECTS_DF['subject_code'] == subject_code]
+            await asyncio.to_thread(decode_frame(df, SUBJECT_RANK_COLUMNS).to_csv, filename, index=False)
             logging.info(f"Exported data for subject {subject_code} to {filename}")
             return filename
         return None
 
     def get_first_row(self):
         if self.STUDENT_SUBJECTS_DF is not None:
-            first_row = self.STUDENT_SUBJECTS_DF.iloc[0]
-            return {column: value for column, value in first_row.items()}
+            first_row = decode_frame(self.STUDENT_SUBJECTS_DF.iloc[:1], SUBJECT_RANK_COLUMNS).astype(object)
+            return first_row.where(first_row.notna(), None).to_dict(orient='records')[0]
         return None
 
-    async def process_all(self, subject_code: str = "011", export_filename: str = "subject_011_only.csv") -> dict:
+    async def process_all(
+        self,
+        subject_code: str = "011",
+        export_filename: str = "subject_011_only.csv",
+        progress: Optional[Callable[[float, str], Any]] = None
+    ) -> dict:
         """
         Performs the entire processing workflow and returns a dictionary with basic data.
+
+        The CPU-bound steps run in worker threads. ``progress`` is an optional
+        ``(fraction, message)`` callback, called after every step.
         """
+        def report(fraction: float, message: str):
+            if progress:
+                progress(fraction, message)
+
         start_time = time.time()
         logging.info(f"Starting process_all for exam_id: {self.exam_id}")
 
@@ -404,15 +324,19 @@ class SubjectProcessor:
             result["student_subjects_count"] = len(self.STUDENT_SUBJECTS_DF) if self.STUDENT_SUBJECTS_DF is not None else 0
             result["schools_count"] = len(await self.load_schools())
             result["exam_subjects_count"] = len(await self.load_exam_subjects())
+            report(0.25, "Grades and marks calculated")
 
             # Calculate rankings
-            self.calculate_rankings()
+            await asyncio.to_thread(self.calculate_rankings)
+            report(0.5, "Rankings calculated")
 
             # Update database
             result["updated_records"] = await self.update_student_subjects_rankings(batch_size=5000)
+            report(0.75, "Rankings written")
 
             # Export data
             result["exported_file"] = await self.export_subject_data(subject_code, export_filename)
+            report(1.0, "Subject data exported")
 
             # Get first row
             result["first_row"] = self.get_first_row()
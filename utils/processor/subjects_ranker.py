@@ -1,11 +1,18 @@
 import pandas as pd
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import async_engine, db_pools
 from sqlalchemy.sql import text
 import asyncio
 import time
 import logging
 from sqlalchemy.exc import OperationalError
 from app.core.config import Settings
+from utils.processor.bulk_writer import BulkColumnWriter
+from utils.processor.columnar import read_frame
+from utils.processor.encoding import RANK_SENTINEL, decode_ranks, encode_frame
+from utils.processor.ranking import RankLevel, rank_partitions
+from utils.processor.snapshot_cache import exam_snapshots
 
 # Configure logging
 logger = logging.getLogger('utils.processor.subjects_ranker')
@@ -16,22 +23,43 @@ handler.setFormatter(formatter)
 if not logger.handlers:
     logger.addHandler(handler)
 
+# Subject rankings are per subject within each level; a student is ranked at a
+# location level only when the location chain above it is known
+SUBJECT_RANK_LEVELS = {
+    'school': RankLevel(('centre_number', 'subject_code')),
+    'ward': RankLevel(('ward_name', 'subject_code'), required=('council_name', 'region_name')),
+    'council': RankLevel(('council_name', 'subject_code'), required=('region_name',)),
+    'region': RankLevel(('region_name', 'subject_code')),
+}
+
+# Text columns of the ranking frame, held dictionary-encoded
+TEXT_COLUMNS = ('student_global_id', 'centre_number', 'subject_code', 'sex',
+                'ward_name', 'council_name', 'region_name', 'school_type')
+
+# Sex-wise subject ranking columns of student_subjects
+SUBJECT_SEX_RANK_COLUMNS = [
+    'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M',
+    'ward_subject_pos_F', 'ward_subject_pos_M', 'ward_subject_out_of_F', 'ward_subject_out_of_M',
+    'ward_subject_pos_gvt_F', 'ward_subject_pos_gvt_M', 'ward_subject_out_of_gvt_F', 'ward_subject_out_of_gvt_M',
+    'ward_subject_pos_pvt_F', 'ward_subject_pos_pvt_M', 'ward_subject_out_of_pvt_F', 'ward_subject_out_of_pvt_M',
+    'council_subject_pos_F', 'council_subject_pos_M', 'council_subject_out_of_F', 'council_subject_out_of_M',
+    'council_subject_pos_gvt_F', 'council_subject_pos_gvt_M', 'council_subject_out_of_gvt_F', 'council_subject_out_of_gvt_M',
+    'council_subject_pos_pvt_F', 'council_subject_pos_pvt_M', 'council_subject_out_of_pvt_F', 'council_subject_out_of_pvt_M',
+    'region_subject_pos_F', 'region_subject_pos_M', 'region_subject_out_of_F', 'region_subject_out_of_M',
+    'region_subject_pos_gvt_F', 'region_subject_pos_gvt_M', 'region_subject_out_of_gvt_F', 'region_subject_out_of_gvt_M',
+    'region_subject_pos_pvt_F', 'region_subject_pos_pvt_M', 'region_subject_out_of_pvt_F', 'region_subject_out_of_pvt_M'
+]
+
 class SubjectRanker:
-    def __init__(self, settings: Settings, exam_id: str):
-        self.engine = create_async_engine(settings.DATABASE_URL, echo=False)
+    WRITE_MODES = ('bulk', 'row')
+
+    def __init__(self, settings: Settings, exam_id: str, write_mode: str = 'bulk'):
+        if write_mode not in self.WRITE_MODES:
+            raise ValueError(f"Invalid write_mode {write_mode}, expected one of {self.WRITE_MODES}")
+        self.engine = async_engine
         self.exam_id = exam_id
-        self.ranking_columns = [
-            'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M',
-            'ward_subject_pos_F', 'ward_subject_pos_M', 'ward_subject_out_of_F', 'ward_subject_out_of_M',
-            'ward_subject_pos_gvt_F', 'ward_subject_pos_gvt_M', 'ward_subject_out_of_gvt_F', 'ward_subject_out_of_gvt_M',
-            'ward_subject_pos_pvt_F', 'ward_subject_pos_pvt_M', 'ward_subject_out_of_pvt_F', 'ward_subject_out_of_pvt_M',
-            'council_subject_pos_F', 'council_subject_pos_M', 'council_subject_out_of_F', 'council_subject_out_of_M',
-            'council_subject_pos_gvt_F', 'council_subject_pos_gvt_M', 'council_subject_out_of_gvt_F', 'council_subject_out_of_gvt_M',
-            'council_subject_pos_pvt_F', 'council_subject_pos_pvt_M', 'council_subject_out_of_pvt_F', 'council_subject_out_of_pvt_M',
-            'region_subject_pos_F', 'region_subject_pos_M', 'region_subject_out_of_F', 'region_subject_out_of_M',
-            'region_subject_pos_gvt_F', 'region_subject_pos_gvt_M', 'region_subject_out_of_gvt_F', 'region_subject_out_of_gvt_M',
-            'region_subject_pos_pvt_F', 'region_subject_pos_pvt_M', 'region_subject_out_of_pvt_F', 'region_subject_out_of_pvt_M'
-        ]
+        self.write_mode = write_mode
+        self.ranking_columns = list(SUBJECT_SEX_RANK_COLUMNS)
 
     def _format_duration(self, seconds):
         if seconds >= 60:
@@ -58,13 +86,31 @@ class SubjectRanker:
         FROM student_subjects ss
         JOIN students s ON ss.student_global_id = s.student_global_id
         LEFT JOIN schools sch ON ss.centre_number = sch.centre_number
-        WHERE ss.exam_id = :exam_id
+        WHERE ss.exam_id = %s
         """
         try:
-            async with AsyncSession(self.engine) as session:
-                async with session.begin():
-                    result = await session.execute(text(query), {'exam_id': self.exam_id})
-                    df = pd.DataFrame(result.fetchall(), columns=result.keys())
+            # The local snapshot replaces the query when it is available and current; the
+            # ranking columns are recomputed, so they are not read back
+            cached = await exam_snapshots.load(self.exam_id)
+            if cached is not None:
+                df = cached['student_subjects'][
+                    ['id', 'student_global_id', 'centre_number', 'subject_code', 'overall_marks']
+                ].merge(cached['students'][['student_global_id', 'sex']], on='student_global_id', how='inner')
+                df = df.merge(
+                    cached['schools'][['centre_number', 'ward_name', 'council_name', 'region_name', 'school_type']],
+                    on='centre_number', how='left'
+                )
+                df = df.reindex(columns=['id', 'student_global_id', 'centre_number', 'subject_code', 'overall_marks', 'sex']
+                                + self.ranking_columns + ['ward_name', 'council_name', 'region_name', 'school_type'])
+            else:
+                kinds = {'id': 'text', 'student_global_id': 'str', 'centre_number': 'str', 'subject_code': 'str',
+                         'overall_marks': 'float', 'sex': 'str'}
+                kinds.update({col: 'float' for col in self.ranking_columns})
+                kinds.update({col: 'str' for col in ('ward_name', 'council_name', 'region_name', 'school_type')})
+                async with db_pools.acquire() as conn:
+                    df = await read_frame(conn, query, (self.exam_id,), kinds)
+            # Rankings run on dictionary-encoded text and float32 marks
+            df = encode_frame(df, categorical=TEXT_COLUMNS, marks=('overall_marks',))
             duration = time.time() - start_time
             logger.info(f"Fetched {len(df)} records in {self._format_duration(duration)}")
             logger.info(f"Initial Data Sample:\n{df[['id', 'student_global_id', 'centre_number', 'subject_code', 'overall_marks', 'sex', 'school_pos_F', 'school_pos_M', 'ward_name', 'council_name', 'region_name', 'school_type']].iloc[0].to_string()}")
@@ -92,20 +138,21 @@ class SubjectRanker:
             logger.error(f"Error clearing rankings: {str(e)}")
             raise
 
+    def _rank(self, df, columns):
+        """Rank overall_marks for the given declarative ranking columns."""
+        marks = pd.to_numeric(df['overall_marks'], errors='coerce')
+        valid = marks.notnull() & (marks >= 0) & np.isfinite(marks)
+        df[columns] = rank_partitions(df, 'overall_marks', SUBJECT_RANK_LEVELS, columns, valid=valid, sentinel=RANK_SENTINEL)
+        return df
+
     async def compute_school_rankings(self, df):
         start_time = time.time()
         logger.info("Computing school subject rankings")
         try:
-            df_valid = df[df['overall_marks'].notnull() & (df['overall_marks'] >= 0) & 
-                          df['overall_marks'].apply(lambda x: not pd.isna(x) and x != float('inf') and x != -float('inf'))].copy()
-            df[['school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M']] = pd.NA
-            df_valid.loc[df_valid['sex'] == 'F', 'school_pos_F'] = df_valid[df_valid['sex'] == 'F'].groupby(['centre_number', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid.loc[df_valid['sex'] == 'M', 'school_pos_M'] = df_valid[df_valid['sex'] == 'M'].groupby(['centre_number', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid.loc[df_valid['sex'] == 'F', 'school_out_of_F'] = df_valid[df_valid['sex'] == 'F'].groupby(['centre_number', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid.loc[df_valid['sex'] == 'M', 'school_out_of_M'] = df_valid[df_valid['sex'] == 'M'].groupby(['centre_number', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df.update(df_valid[['id', 'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M']])
+            df = self._rank(df, [col for col in self.ranking_columns if col.startswith('school_')])
             duration = time.time() - start_time
-            sample_row = df[df['school_pos_F'].notna() | df['school_pos_M'].notna()].iloc[0] if not df[df['school_pos_F'].notna() | df['school_pos_M'].notna()].empty else df.iloc[0]
+            ranked = (df['school_pos_F'] != RANK_SENTINEL) | (df['school_pos_M'] != RANK_SENTINEL)
+            sample_row = df[ranked].iloc[0] if ranked.any() else df.iloc[0]
             logger.info(f"Computed school rankings in {self._format_duration(duration)}")
             logger.info(f"School Rankings Sample:\n{sample_row[['id', 'student_global_id', 'centre_number', 'subject_code', 'sex', 'overall_marks', 'school_pos_F', 'school_pos_M', 'school_out_of_F', 'school_out_of_M']].to_string()}")
             return df, duration
@@ -117,60 +164,10 @@ class SubjectRanker:
         start_time = time.time()
         logger.info("Computing location subject rankings")
         try:
-            df[self.ranking_columns] = pd.NA
-            df_valid = df[df['overall_marks'].notnull() & (df['overall_marks'] >= 0) & 
-                          df['overall_marks'].apply(lambda x: not pd.isna(x) and x != float('inf') and x != -float('inf'))].copy()
-            df_valid_region = df_valid[df_valid['region_name'].notnull()]
-            df_valid_council = df_valid[df_valid['council_name'].notnull() & df_valid['region_name'].notnull()]
-            df_valid_ward = df_valid[df_valid['ward_name'].notnull() & df_valid['council_name'].notnull() & df_valid['region_name'].notnull()]
-
-            # Ward rankings
-            df_valid_ward.loc[df_valid_ward['sex'] == 'F', 'ward_subject_pos_F'] = df_valid_ward[df_valid_ward['sex'] == 'F'].groupby(['ward_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_ward.loc[df_valid_ward['sex'] == 'M', 'ward_subject_pos_M'] = df_valid_ward[df_valid_ward['sex'] == 'M'].groupby(['ward_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_ward.loc[df_valid_ward['sex'] == 'F', 'ward_subject_out_of_F'] = df_valid_ward[df_valid_ward['sex'] == 'F'].groupby(['ward_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_ward.loc[df_valid_ward['sex'] == 'M', 'ward_subject_out_of_M'] = df_valid_ward[df_valid_ward['sex'] == 'M'].groupby(['ward_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'GOVERNMENT'), 'ward_subject_pos_gvt_F'] = df_valid_ward[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'GOVERNMENT')].groupby(['ward_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'GOVERNMENT'), 'ward_subject_pos_gvt_M'] = df_valid_ward[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'GOVERNMENT')].groupby(['ward_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'PRIVATE'), 'ward_subject_pos_pvt_F'] = df_valid_ward[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'PRIVATE')].groupby(['ward_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'PRIVATE'), 'ward_subject_pos_pvt_M'] = df_valid_ward[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'PRIVATE')].groupby(['ward_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'GOVERNMENT'), 'ward_subject_out_of_gvt_F'] = df_valid_ward[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'GOVERNMENT')].groupby(['ward_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'GOVERNMENT'), 'ward_subject_out_of_gvt_M'] = df_valid_ward[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'GOVERNMENT')].groupby(['ward_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'PRIVATE'), 'ward_subject_out_of_pvt_F'] = df_valid_ward[(df_valid_ward['sex'] == 'F') & (df_valid_ward['school_type'] == 'PRIVATE')].groupby(['ward_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_ward.loc[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'PRIVATE'), 'ward_subject_out_of_pvt_M'] = df_valid_ward[(df_valid_ward['sex'] == 'M') & (df_valid_ward['school_type'] == 'PRIVATE')].groupby(['ward_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-
-            # Council rankings
-            df_valid_council.loc[df_valid_council['sex'] == 'F', 'council_subject_pos_F'] = df_valid_council[df_valid_council['sex'] == 'F'].groupby(['council_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_council.loc[df_valid_council['sex'] == 'M', 'council_subject_pos_M'] = df_valid_council[df_valid_council['sex'] == 'M'].groupby(['council_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_council.loc[df_valid_council['sex'] == 'F', 'council_subject_out_of_F'] = df_valid_council[df_valid_council['sex'] == 'F'].groupby(['council_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_council.loc[df_valid_council['sex'] == 'M', 'council_subject_out_of_M'] = df_valid_council[df_valid_council['sex'] == 'M'].groupby(['council_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'GOVERNMENT'), 'council_subject_pos_gvt_F'] = df_valid_council[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'GOVERNMENT')].groupby(['council_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'GOVERNMENT'), 'council_subject_pos_gvt_M'] = df_valid_council[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'GOVERNMENT')].groupby(['council_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'PRIVATE'), 'council_subject_pos_pvt_F'] = df_valid_council[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'PRIVATE')].groupby(['council_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'PRIVATE'), 'council_subject_pos_pvt_M'] = df_valid_council[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'PRIVATE')].groupby(['council_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'GOVERNMENT'), 'council_subject_out_of_gvt_F'] = df_valid_council[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'GOVERNMENT')].groupby(['council_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'GOVERNMENT'), 'council_subject_out_of_gvt_M'] = df_valid_council[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'GOVERNMENT')].groupby(['council_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'PRIVATE'), 'council_subject_out_of_pvt_F'] = df_valid_council[(df_valid_council['sex'] == 'F') & (df_valid_council['school_type'] == 'PRIVATE')].groupby(['council_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_council.loc[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'PRIVATE'), 'council_subject_out_of_pvt_M'] = df_valid_council[(df_valid_council['sex'] == 'M') & (df_valid_council['school_type'] == 'PRIVATE')].groupby(['council_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-
-            # Region rankings
-            df_valid_region.loc[df_valid_region['sex'] == 'F', 'region_subject_pos_F'] = df_valid_region[df_valid_region['sex'] == 'F'].groupby(['region_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_region.loc[df_valid_region['sex'] == 'M', 'region_subject_pos_M'] = df_valid_region[df_valid_region['sex'] == 'M'].groupby(['region_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_region.loc[df_valid_region['sex'] == 'F', 'region_subject_out_of_F'] = df_valid_region[df_valid_region['sex'] == 'F'].groupby(['region_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_region.loc[df_valid_region['sex'] == 'M', 'region_subject_out_of_M'] = df_valid_region[df_valid_region['sex'] == 'M'].groupby(['region_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'GOVERNMENT'), 'region_subject_pos_gvt_F'] = df_valid_region[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'GOVERNMENT')].groupby(['region_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'GOVERNMENT'), 'region_subject_pos_gvt_M'] = df_valid_region[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'GOVERNMENT')].groupby(['region_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'PRIVATE'), 'region_subject_pos_pvt_F'] = df_valid_region[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'PRIVATE')].groupby(['region_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'PRIVATE'), 'region_subject_pos_pvt_M'] = df_valid_region[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'PRIVATE')].groupby(['region_name', 'subject_code'])['overall_marks'].rank(ascending=False, method='min').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'GOVERNMENT'), 'region_subject_out_of_gvt_F'] = df_valid_region[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'GOVERNMENT')].groupby(['region_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'GOVERNMENT'), 'region_subject_out_of_gvt_M'] = df_valid_region[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'GOVERNMENT')].groupby(['region_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'PRIVATE'), 'region_subject_out_of_pvt_F'] = df_valid_region[(df_valid_region['sex'] == 'F') & (df_valid_region['school_type'] == 'PRIVATE')].groupby(['region_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-            df_valid_region.loc[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'PRIVATE'), 'region_subject_out_of_pvt_M'] = df_valid_region[(df_valid_region['sex'] == 'M') & (df_valid_region['school_type'] == 'PRIVATE')].groupby(['region_name', 'subject_code'])['overall_marks'].transform('count').astype('Int64')
-
-            df.update(df_valid_ward[[c for c in df_valid_ward.columns if c.startswith('ward_')]])
-            df.update(df_valid_council[[c for c in df_valid_council.columns if c.startswith('council_')]])
-            df.update(df_valid_region[[c for c in df_valid_region.columns if c.startswith('region_')]])
+            df = self._rank(df, [col for col in self.ranking_columns if not col.startswith('school_')])
             duration = time.time() - start_time
-            sample_row = df[df['ward_subject_pos_F'].notna() | df['ward_subject_pos_M'].notna()].iloc[0] if not df[df['ward_subject_pos_F'].notna() | df['ward_subject_pos_M'].notna()].empty else df.iloc[0]
+            ranked = (df['ward_subject_pos_F'] != RANK_SENTINEL) | (df['ward_subject_pos_M'] != RANK_SENTINEL)
+            sample_row = df[ranked].iloc[0] if ranked.any() else df.iloc[0]
             logger.info(f"Computed location rankings in {self._format_duration(duration)}")
             logger.info(f"Location Rankings Sample:\n{sample_row[['id', 'student_global_id', 'subject_code', 'sex', 'overall_marks', 'ward_subject_pos_F', 'ward_subject_pos_M', 'council_subject_pos_F', 'council_subject_pos_M', 'region_subject_pos_F', 'region_subject_pos_M']].to_string()}")
             return df, duration
@@ -179,8 +176,29 @@ class SubjectRanker:
             raise
 
     async def update_rankings(self, df):
+        """Write the ranking columns back using the configured write mode."""
+        df = decode_ranks(df, self.ranking_columns)
+        if self.write_mode == 'bulk':
+            return await self.update_rankings_bulk(df)
+        return await self.update_rankings_by_row(df)
+
+    async def update_rankings_bulk(self, df):
+        start_time = time.time()
+        logger.info("Updating database with rankings (bulk staging mode)")
+        writer = BulkColumnWriter('student_subjects', self.ranking_columns)
+        try:
+            async with db_pools.acquire() as conn:
+                stats = await writer.write(conn, df)
+            duration = time.time() - start_time
+            logger.info(f"Updated {stats['rows']} records in {self._format_duration(duration)} ({stats['rows_per_second']:,.0f} rows/s)")
+            return stats['rows'], duration
+        except Exception as e:
+            logger.error(f"Error updating rankings: {str(e)}")
+            raise
+
+    async def update_rankings_by_row(self, df):
         start_time = time.time()
-        logger.info("Updating database with rankings")
+        logger.info("Updating database with rankings (row mode)")
         update_query = """
         UPDATE student_subjects
         SET 
@@ -267,6 +285,7 @@ class SubjectRanker:
         response = {
             'status': 'success',
             'exam_id': self.exam_id,
+            'write_mode': self.write_mode,
             'timings': {},
             'counts': {'fetched_records': 0, 'updated_records': 0},
             'error': None
@@ -294,6 +313,7 @@ class SubjectRanker:
             updated_count, update_duration = await self.update_rankings(df)
             response['timings']['update_rankings'] = self._format_duration(update_duration)
             response['counts']['updated_records'] = updated_count
+            response['counts']['rows_per_second'] = round(updated_count / update_duration, 1) if update_duration > 0 else None
 
             total_duration = time.time() - total_start_time
             response['timings']['total'] = self._format_duration(total_duration)